@@ -1,50 +1,63 @@
 import hashlib
 import math
-import time
 import random
-from typing import List
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from ecdsa import SECP256k1, SigningKey, VerifyingKey
 
+from block import GENESIS_HASH, BaseBlock
+from block_store import MemoryBlockStore
+import opcounts
+from instrumentation import deferred_phases, phase, replay_phases, timed
+from keystore import KeyStore, default_key_store
 from transaction import Transaction
 
+VALIDATION_CHUNK_SIZE = 256  # blocks per signature-verification job
+
+
+class Block(BaseBlock):
+    __slots__ = ("vrf_proof", "proposer_key")
+
+    HEADER_FIELDS = BaseBlock.HEADER_FIELDS | {"vrf_proof", "proposer_key"}
 
-class Block:
     def __init__(
         self,
         txns: List[Transaction],
-        previous_hash: str,
-        vrf_proof,
-        verify_key: VerifyingKey,
+        previous_hash: bytes,
+        vrf_proof: str,
+        proposer_key: bytes,
     ):
-        self.txns = txns
-        self.previous_hash = previous_hash
-        self.timestamp = int(time.time())
+        super().__init__(txns, previous_hash)
         self.vrf_proof = vrf_proof
-        self.verify_key = verify_key
-        self.hash = self.calculate_hash()
-
-    def calculate_hash(self) -> str:
-        block_data = f"{self.txns}{self.previous_hash}{self.timestamp}{self.vrf_proof}{self.verify_key}"
-        return hashlib.sha256(block_data.encode()).hexdigest()
-
-    def is_valid(self, previous_hash: str):
-        return (
-            self.hash == self.calculate_hash() and self.previous_hash == previous_hash
+        self.proposer_key = proposer_key
+
+    def header_bytes(self) -> bytes:
+        return b"".join(
+            (
+                self.txns_digest,
+                self.previous_hash,
+                self.timestamp.to_bytes(8, "big"),
+                self.vrf_proof.encode(),
+                self.proposer_key,
+            )
         )
 
-    def __repr__(self):
-        return f"Block (timestamp={self.timestamp}, hash={self.hash[:8]}, previous_hash={self.previous_hash[:8]}, num_txns={len(self.txns)})"
+    def is_valid(self, previous_hash: bytes):
+        return self.previous_hash == previous_hash
 
 
 class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = []
-
-        self.create_genesis_block()
+    def __init__(self, store=None):
+        # Any block_store store; a reopened store already has its genesis
+        self.chain = store if store is not None else MemoryBlockStore()
+        if not len(self.chain):
+            self.create_genesis_block()
+        # Blocks from earlier runs in a reopened store aren't this run's
+        self.start_height = len(self.chain)
 
     def create_genesis_block(self) -> None:
-        genesis_block = Block([], "0", "0", "0")
+        genesis_block = Block([], GENESIS_HASH, "", b"")
         self.chain.append(genesis_block)
 
     def add_block(self, block: Block) -> None:
@@ -52,52 +65,78 @@ class Blockchain:
             self.chain.append(block)
 
     def get_last_block(self) -> Block:
-        return self.chain[-1]
+        return self.chain.last()
 
     def get_new_block_index(self) -> int:
         return len(self.chain)
 
     def is_valid(self) -> bool:
-        return all(
-            self.chain[i].is_valid(
-                target=self.target_from_difficulty(),
-                previous_hash=self.chain[i - 1].hash,
-            )
-            for i in range(1, len(self.chain))
-        )
+        return self.chain.links_valid()
 
 
 class Account:
-    def __init__(self, stake):
-        self.signing_key = SigningKey.generate(curve=SECP256k1)
-        self.verify_key = self.signing_key.verifying_key
+    __slots__ = ("key_store", "key_index", "stake", "total_rewards")
+
+    def __init__(self, stake, key_store: KeyStore = None):
+        self.key_store = key_store if key_store is not None else default_key_store()
+        self.key_index = self.key_store.allocate()
         self.stake = stake
         self.total_rewards = 0
 
+    @property
+    def signing_key(self) -> SigningKey:
+        return self.key_store.signing_key(self.key_index)
+
+    @property
+    def verify_key(self) -> VerifyingKey:
+        return self.key_store.verifying_key(self.key_index)
+
+    @property
+    def public_key(self) -> bytes:
+        return self.key_store.public_key(self.key_index)
+
     def generate_key_pair(self):
         return self.signing_key.to_string().hex(), self.verify_key.to_string().hex()
 
+    @timed("sign")
     def prove(self, message):
         # Hash the message
         message_hash = hashlib.sha256(message).digest()
+        opcounts.count_hash(len(message))
 
         # Sign the hash
-        signature = self.signing_key.sign(message_hash)
+        signing_key = self.signing_key
+        signature = signing_key.sign(message_hash)
+        opcounts.count(opcounts.SIGNATURES)
 
-        return signature.hex(), self.verify_key
+        return signature.hex(), signing_key.verifying_key
 
-    def verify(self, message: bytes, signature, verify_key):
-        verify_key = VerifyingKey.from_string(
-            bytes.fromhex(verify_key.to_string().hex()), curve=SECP256k1
-        )
+    @timed("verify")
+    def verify(self, message: bytes, signature, public_key: bytes):
+        verify_key = VerifyingKey.from_string(public_key, curve=SECP256k1)
         message_hash = hashlib.sha256(message).digest()
+        opcounts.count_hash(len(message))
+        opcounts.count(opcounts.VERIFICATIONS)
         try:
             return verify_key.verify(bytes.fromhex(signature), message_hash)
         except Exception:
             return False
 
     def __repr__(self):
-        return f"Account(verify_key={self.verify_key.to_string().hex()})"
+        return f"Account(verify_key={self.public_key.hex()})"
+
+
+def verify_proof_chunk(jobs: List[Tuple[int, bytes, str, bytes]]) -> List[int]:
+    """Verify (height, previous_hash, vrf_proof, public_key) jobs; return failed heights."""
+    failed = []
+    for height, previous_hash, vrf_proof, public_key in jobs:
+        verify_key = VerifyingKey.from_string(public_key, curve=SECP256k1)
+        message_hash = hashlib.sha256(previous_hash).digest()
+        try:
+            verify_key.verify(bytes.fromhex(vrf_proof), message_hash)
+        except Exception:
+            failed.append(height)
+    return failed
 
 
 class Algorand(Blockchain):
@@ -106,13 +145,24 @@ class Algorand(Blockchain):
         accounts: List[Account],
         initial_supply: float,
         inflation_rate: float,
+        seed_lookback: int = 1,
+        store=None,
     ):
-        super().__init__()
+        super().__init__(store)
 
         self.accounts = accounts
+        self.accounts_by_key: Dict[bytes, Account] = {}  # filled by account_for
+        self.network = None  # optional network.Network, one node per account
+        self.verifier = None  # optional signatures.SignatureVerifier
         self.total_supply = initial_supply
         self.inflation_rate = inflation_rate
         self.current_round = 0
+
+        # Seed for the block at height h comes from block h - seed_lookback, so
+        # sortition for the next seed_lookback - 1 rounds can run ahead of time
+        self.seed_lookback = max(1, seed_lookback)
+        self.start_sortition_worker()
+        self.pending_sortitions: Dict[bytes, Tuple[int, Future]] = {}
         self.base_reward = (self.total_supply * self.inflation_rate) / (
             365 * 24 * 60
         )  # Per minute
@@ -121,6 +171,46 @@ class Algorand(Blockchain):
         self.proposer_threshold = 20 / len(accounts)
         self.committee_threshold = self.committee_size / len(accounts)
 
+    def start_sortition_worker(self) -> None:
+        self.sortition_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="sortition")
+            if self.seed_lookback > 1
+            else None
+        )
+
+    def __getstate__(self) -> dict:
+        # Sortitions still running are redone by the restored engine
+        state = self.__dict__.copy()
+        state["sortition_executor"] = None
+        state["pending_sortitions"] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.start_sortition_worker()
+
+    def before_fork(self) -> None:
+        """Let running sortitions finish and stop the worker thread."""
+        if self.sortition_executor:
+            self.sortition_executor.shutdown(wait=True)
+
+    def after_fork(self) -> None:
+        """In the parent and in each forked child: start the worker again."""
+        self.start_sortition_worker()
+        self.pending_sortitions = {
+            seed: pending
+            for seed, pending in self.pending_sortitions.items()
+            if pending[1].done()
+        }
+
+    def account_for(self, public_key: bytes) -> Optional[Account]:
+        # Built once rather than scanning, which reads every account's key
+        if len(self.accounts_by_key) != len(self.accounts):
+            self.accounts_by_key = {
+                account.public_key: account for account in self.accounts
+            }
+        return self.accounts_by_key.get(public_key)
+
     @property
     def total_stake(self):
         return sum(account.stake for account in self.accounts)
@@ -138,8 +228,13 @@ class Algorand(Blockchain):
         seed: bytes,
         threshold: float,
         is_select_proposers: bool,
+        stakes: Optional[List[float]] = None,
     ) -> List[Account]:
-        weights = [account.stake for account in self.accounts]
+        # May run on the sortition worker: the stakes are a snapshot taken
+        # when the job was submitted, and randomness comes from the seed
+        # rather than the global stream the round is drawing from
+        weights = stakes or [account.stake for account in self.accounts]
+        rng = random.Random(seed)
         total_weight = sum(weights)
 
         # Normalize weights
@@ -156,7 +251,7 @@ class Algorand(Blockchain):
         # If not enough eligible accounts, add more based on stake weight
         size = self.proposers_size if is_select_proposers else self.committee_size
         if len(eligible_accounts) < size:
-            additional_accounts = random.choices(
+            additional_accounts = rng.choices(
                 self.accounts,
                 weights=weights,
                 k=size - len(eligible_accounts),
@@ -165,33 +260,38 @@ class Algorand(Blockchain):
 
         # If more than needed, randomly select the required number
         if len(eligible_accounts) > size:
-            eligible_accounts = random.sample(eligible_accounts, size)
+            eligible_accounts = rng.sample(eligible_accounts, size)
 
         return eligible_accounts
 
+    @timed("propose")
     def propose_block(
         self,
         proposer: Account,
         txns: List[Transaction],
     ) -> Block:
         previous_hash = self.get_last_block().hash
-        vrf_proof, verify_key = proposer.prove(previous_hash.encode())
-        return Block(txns, previous_hash, vrf_proof, verify_key)
+        vrf_proof, _ = proposer.prove(previous_hash)
+        return Block(txns, previous_hash, vrf_proof, proposer.public_key)
 
+    @timed("validate")
     def validate_block(
         self, block: Block, proposer: Account, previous_block: Block
     ) -> bool:
         if block.previous_hash != previous_block.hash:
             return False
         if not proposer.verify(
-            block.previous_hash.encode(),
+            block.previous_hash,
             block.vrf_proof,
-            block.verify_key,
+            block.proposer_key,
         ):
             return False
 
+        if self.verifier is not None:
+            return self.verifier.all_valid(block.txns, "validation")
         return True
 
+    @timed("agreement")
     def byzantine_agreement(
         self,
         proposed_blocks: List[Block],
@@ -203,13 +303,16 @@ class Algorand(Blockchain):
         total_stake = sum(member.stake for member in committee)
         threshold = total_stake * 2 / 3
 
+        # Every committee member sends a soft vote and a certify vote
+        opcounts.count(opcounts.MESSAGES, 2 * len(committee))
+
         # Step 1: Soft Vote
         votes = {block.hash: 0 for block in proposed_blocks}
 
         for member in committee:
             chosen_block = max(
                 proposed_blocks,
-                key=lambda b: hash(b.hash + str(member.stake)),
+                key=lambda b: hash(b.hash + str(member.stake).encode()),
             )
             votes[chosen_block.hash] += member.stake
 
@@ -226,16 +329,13 @@ class Algorand(Blockchain):
 
         return None
 
+    @timed("reward")
     def distribute_rewards(self, block: Block, committee: List[Account]):
         total_reward = self.base_reward
         proposer_reward = total_reward * 0.8  # 80% to proposer
         committee_reward = total_reward * 0.2  # 20% split among committee
 
-        proposer = next(
-            account
-            for account in self.accounts
-            if account.verify_key == block.verify_key
-        )
+        proposer = self.account_for(block.proposer_key)
         proposer.stake += proposer_reward
         proposer.total_rewards += proposer_reward
 
@@ -246,35 +346,119 @@ class Algorand(Blockchain):
 
         self.total_supply += total_reward
 
-    def mine_block(self, transactions: List[Transaction]) -> Block:
-        seed = hashlib.sha256(
-            f"{self.get_last_block().hash}{self.current_round}".encode()
-        ).digest()
+    def round_seed(self, height: int, round_number: int) -> bytes:
+        seed_hash = self.chain.hash_at(max(0, height - self.seed_lookback))
+        seed_data = seed_hash + str(round_number).encode()
+        opcounts.count_hash(len(seed_data))
+        return hashlib.sha256(seed_data).digest()
 
+    @timed("sortition")
+    def sortition(
+        self, seed: bytes, stakes: Optional[List[float]] = None
+    ) -> Tuple[List[Account], List[Account]]:
         proposers = self.select_accounts(
-            seed + b"proposer", self.proposer_threshold, True
+            seed + b"proposer", self.proposer_threshold, True, stakes
         )
         committee = self.select_accounts(
-            seed + b"committee", self.committee_threshold, False
+            seed + b"committee", self.committee_threshold, False, stakes
         )
+        return proposers, committee
+
+    def sortition_job(
+        self, seed: bytes, stakes: List[float]
+    ) -> Tuple[Tuple[List[Account], List[Account]], dict, list]:
+        # On the worker, ahead of its round: the operations and timings go
+        # with the result and are charged by get_sortition, if it's used
+        with opcounts.deferred() as counts, deferred_phases() as samples:
+            selection = self.sortition(seed, stakes)
+        return selection, counts, samples
+
+    def precompute_sortitions(self) -> None:
+        """Schedule sortition for the upcoming rounds whose seed block is known."""
+        if not self.sortition_executor:
+            return
+
+        # Drop selections for rounds that have already passed
+        self.pending_sortitions = {
+            seed: (round_number, future)
+            for seed, (round_number, future) in self.pending_sortitions.items()
+            if round_number > self.current_round
+        }
+
+        # Assumes every round appends a block; a failed round simply misses
+        stakes = [account.stake for account in self.accounts]
+        for offset in range(1, self.seed_lookback):
+            seed = self.round_seed(
+                self.get_new_block_index() + offset, self.current_round + offset
+            )
+            if seed not in self.pending_sortitions:
+                self.pending_sortitions[seed] = (
+                    self.current_round + offset,
+                    self.sortition_executor.submit(self.sortition_job, seed, stakes),
+                )
+
+    def get_sortition(self, seed: bytes) -> Tuple[List[Account], List[Account]]:
+        pending = self.pending_sortitions.pop(seed, None)
+        if pending:
+            with phase("sortition_wait"):
+                selection, counts, samples = pending[1].result()
+            opcounts.add(counts)
+            replay_phases(samples)
+            return selection
+        return self.sortition(seed)
+
+    def shutdown(self) -> None:
+        if self.sortition_executor:
+            self.sortition_executor.shutdown(wait=True, cancel_futures=True)
+            self.sortition_executor = None
+            self.pending_sortitions.clear()
+
+    def mine_block(self, transactions: List[Transaction]) -> Block:
+        seed = self.round_seed(self.get_new_block_index(), self.current_round)
+        proposers, committee = self.get_sortition(seed)
+
+        # Overlap the next rounds' sortition with this round's proposal and agreement
+        self.precompute_sortitions()
+
+        if self.verifier is not None:
+            transactions = self.verifier.admit(transactions, "proposal")
 
         proposed_blocks = []
         for proposer in proposers:
             block = self.propose_block(proposer, transactions)
             if self.validate_block(block, proposer, self.get_last_block()):
                 proposed_blocks.append(block)
+        opcounts.count(opcounts.MESSAGES, len(proposed_blocks))
 
         self.current_round += 1
 
         winner = self.byzantine_agreement(proposed_blocks, committee)
 
         if winner:
+            if self.network is not None:
+                self.gossip_agreement(winner, committee)
             self.add_block(winner)
             self.distribute_rewards(winner, committee)
             return winner
 
         return None
 
+    def gossip_agreement(self, block: Block, committee: List[Account]) -> None:
+        """Propagate the winning proposal and the soft and certify votes.
+
+        Nodes only relay the highest-priority proposal they have seen, so only
+        the winner floods the whole network.
+        """
+        proposer = self.account_for(block.proposer_key)
+        self.network.vote_round(
+            self.network.node(proposer),
+            block,
+            [self.network.node(member) for member in committee],
+            [member.stake for member in committee],
+            2 / 3,
+            steps=2,
+        )
+
     def simulate_51_percent_attack(self, attacker: Account):
         print("Simulating 51% attack...")
         attacker_stake = attacker.stake
@@ -342,8 +526,8 @@ class Algorand(Blockchain):
         )
 
         if attacker in proposers:
-            block1 = self.propose_block(attacker, [Transaction("main", "chain", 1)])
-            block2 = self.propose_block(attacker, [Transaction("fork", "chain", 1)])
+            block1 = self.propose_block(attacker, [Transaction("main", "chain", 1, 0)])
+            block2 = self.propose_block(attacker, [Transaction("fork", "chain", 1, 0)])
 
             winner = self.byzantine_agreement([block1, block2], committee)
 
@@ -363,15 +547,17 @@ class Algorand(Blockchain):
     def simulate_long_range_attack(self, attacker: Account):
         print("Simulating Long-Range attack...")
         fork_point = max(0, len(self.chain) - 100)  # Try to fork from 1000 blocks ago
-        honest_chain = self.chain[:]
-        attacker_chain = self.chain[:fork_point]
+        honest_length = len(self.chain)
 
-        if not attacker_chain:
+        if fork_point == 0:
             print("Not enough blocks in the chain to perform a long-range attack.")
             return False
 
-        for i in range(fork_point, len(honest_chain)):
-            seed = hashlib.sha256(f"{attacker_chain[-1].hash}{i}".encode()).digest()
+        # Only the attacker's own blocks are held; the shared prefix stays stored
+        attacker_blocks = []
+        attacker_tip = self.chain.hash_at(fork_point - 1)
+        for i in range(fork_point, honest_length):
+            seed = hashlib.sha256(attacker_tip + str(i).encode()).digest()
             proposers = self.select_accounts(
                 seed + b"proposer",
                 self.proposer_threshold,
@@ -388,7 +574,8 @@ class Algorand(Blockchain):
                     attacker, [Transaction("fake", "transaction", 1)]
                 )
                 if self.byzantine_agreement([fake_block], committee):
-                    attacker_chain.append(fake_block)
+                    attacker_blocks.append(fake_block)
+                    attacker_tip = fake_block.hash
                 else:
                     print(f"Failed to reach consensus on attacker's block at round {i}")
                     break
@@ -396,7 +583,7 @@ class Algorand(Blockchain):
                 print(f"Attacker not selected as proposer for round {i}")
                 break
 
-        if len(attacker_chain) > len(honest_chain):
+        if fork_point + len(attacker_blocks) > honest_length:
             print("In a longest-chain protocol, this attack might succeed.")
 
         print("In Algorand:")
@@ -411,7 +598,9 @@ class Algorand(Blockchain):
     def simulate_sybil_attack(self, attacker: Account):
         print("Simulating Sybil attack...")
         original_stake = attacker.stake
-        sybil_accounts = [Account(original_stake / 10) for _ in range(10)]
+        sybil_accounts = [
+            Account(original_stake / 10, attacker.key_store) for _ in range(10)
+        ]
 
         def measure_influence(accounts):
             proposer_selections = 0
@@ -467,33 +656,50 @@ class Algorand(Blockchain):
         attack(attacker)
         print()
 
-    def validate_chain(self) -> bool:
-        # Start from the second block (index 1) since the genesis block has no previous hash
+    def find_invalid_blocks(
+        self, max_workers: int = None, chunk_size: int = VALIDATION_CHUNK_SIZE
+    ) -> List[Tuple[int, str]]:
+        """Return (height, reason) for every block that fails validation."""
+        invalid = []
+
+        # Phase 1: cheap serial pass over the hash links, straight from the index
         for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i - 1]
-
-            # Check if the current block's previous hash matches the hash of the previous block
-            if current_block.previous_hash != previous_block.hash:
-                print(f"Invalid previous hash in block {i}")
-                return False
-
-            # Validate the block's integrity
-            proposer = next(
-                (
-                    account
-                    for account in self.accounts
-                    if account.verify_key == current_block.verify_key
-                ),
-                None,
-            )
-            if not proposer:
-                print(f"Proposer not found for block {i}")
-                return False
+            if self.chain.previous_hash_at(i) != self.chain.hash_at(i - 1):
+                invalid.append((i, "invalid previous hash"))
+
+        # Phase 2: signature checks, fanned out over a process pool
+        jobs = []
+        for i, block in enumerate(self.chain):
+            if i == 0:
+                continue
+            if self.account_for(block.proposer_key) is None:
+                invalid.append((i, "proposer not found"))
+            else:
+                jobs.append(
+                    (i, block.previous_hash, block.vrf_proof, block.proposer_key)
+                )
+
+        chunks = [jobs[i : i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        if len(chunks) <= 1 or max_workers == 1:
+            failed_chunks = map(verify_proof_chunk, chunks)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                failed_chunks = list(executor.map(verify_proof_chunk, chunks))
+
+        for failed in failed_chunks:
+            invalid.extend((i, "invalid VRF proof") for i in failed)
+
+        return sorted(invalid)
 
-            if not self.validate_block(current_block, proposer, previous_block):
-                print(f"Block {i} failed validation")
-                return False
+    def validate_chain(
+        self, max_workers: int = None, chunk_size: int = VALIDATION_CHUNK_SIZE
+    ) -> bool:
+        invalid = self.find_invalid_blocks(max_workers, chunk_size)
+        for height, reason in invalid:
+            print(f"Block {height} failed validation: {reason}")
+
+        if invalid:
+            return False
 
         print("Blockchain is valid")
         return True
@@ -3,44 +3,50 @@ import random
 import time
 from typing import List
 
+from block import GENESIS_HASH, BaseBlock
+from block_store import MemoryBlockStore
+import opcounts
+from instrumentation import timed
 from transaction import Transaction
 
 
-class Block:
-    def __init__(self, validator: str, txns: List[Transaction], previous_hash: str):
-        self.validator = validator
-        self.txns = txns
-        self.previous_hash = previous_hash
-        self.timestamp = int(time.time())
-        self.hash = self.calculate_hash()
-        self.total_fees = sum(tx.fee for tx in txns)
-        self.votes = {}  # To store votes from validators
-
-    def calculate_hash(self) -> str:
-        block_data = (
-            str(self.validator)
-            + "".join(tx.to_bytes().decode() for tx in self.txns)
-            + str(self.previous_hash)
-            + str(self.timestamp)
-        )
-        return hashlib.sha256(block_data.encode()).hexdigest()
+class Block(BaseBlock):
+    __slots__ = ("validator", "total_fees", "votes")
+
+    HEADER_FIELDS = BaseBlock.HEADER_FIELDS | {"validator"}
+    TRANSIENT_FIELDS = frozenset({"votes"})
 
-    def is_valid(self, previous_hash: str) -> bool:
-        return (
-            self.previous_hash == previous_hash and self.hash == self.calculate_hash()
+    def __init__(self, validator: str, txns: List[Transaction], previous_hash: bytes):
+        super().__init__(txns, previous_hash)
+        self.validator = validator
+        self.total_fees = sum(tx.fee for tx in self.txns)
+        self.votes = ()  # (validator, stake) pairs, kept until rewards are paid
+
+    def header_bytes(self) -> bytes:
+        return b"".join(
+            (
+                self.validator.encode(),
+                self.txns_digest,
+                self.previous_hash,
+                self.timestamp.to_bytes(8, "big"),
+            )
         )
 
-    def __repr__(self) -> str:
-        return f"Block (timestamp={self.timestamp}, hash={self.hash[:8]}, previous_hash={self.previous_hash[:8]}, num_txns={len(self.txns)})"
+    def is_valid(self, previous_hash: bytes) -> bool:
+        return self.previous_hash == previous_hash
 
 
 class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = []
-        self.create_genesis_block()
+    def __init__(self, store=None):
+        # Any block_store store; a reopened store already has its genesis
+        self.chain = store if store is not None else MemoryBlockStore()
+        if not len(self.chain):
+            self.create_genesis_block()
+        # Blocks from earlier runs in a reopened store aren't this run's
+        self.start_height = len(self.chain)
 
     def create_genesis_block(self) -> None:
-        genesis_block = Block("0", [], "0")
+        genesis_block = Block("0", [], GENESIS_HASH)
         self.chain.append(genesis_block)
 
     def add_block(self, block: Block) -> None:
@@ -48,16 +54,13 @@ class Blockchain:
             self.chain.append(block)
 
     def get_last_block(self) -> Block:
-        return self.chain[-1]
+        return self.chain.last()
 
     def get_new_block_index(self) -> int:
         return len(self.chain)
 
     def is_valid(self) -> bool:
-        return all(
-            self.chain[i].is_valid(previous_hash=self.chain[i - 1].hash)
-            for i in range(1, len(self.chain))
-        )
+        return self.chain.links_valid()
 
 
 class Validator:
@@ -68,14 +71,14 @@ class Validator:
         self.is_active = True
         self.consecutive_misses = 0
 
-    def propose_block(self, txns: List[Transaction], previous_hash: str) -> Block:
+    def propose_block(self, txns: List[Transaction], previous_hash: bytes) -> Block:
         return Block(
             validator=self.address,
             txns=txns,
             previous_hash=previous_hash,
         )
 
-    def validate_block(self, block: Block, previous_hash: str) -> bool:
+    def validate_block(self, block: Block, previous_hash: bytes) -> bool:
         return block.is_valid(previous_hash)
 
 
@@ -85,9 +88,12 @@ class ProofOfStake(Blockchain):
         validators: List[Validator],
         initial_supply: float,
         inflation_rate: float,
+        store=None,
     ):
-        super().__init__()
+        super().__init__(store)
         self.validators = validators
+        self.network = None  # optional network.Network, one node per validator
+        self.verifier = None  # optional signatures.SignatureVerifier
         self.total_supply = initial_supply
         self.inflation_rate = inflation_rate
         self.last_finalized_block = 0
@@ -106,6 +112,7 @@ class ProofOfStake(Blockchain):
         """Calculate the block reward based on inflation rate."""
         return (self.total_supply * self.inflation_rate) / (365 * 24 * 60 * 60)
 
+    @timed("select")
     def select_validator(self) -> Validator:
         active_validators = [
             v for v in self.validators if v.is_active and v.stake >= self.min_stake
@@ -131,10 +138,13 @@ class ProofOfStake(Blockchain):
         if proposed_block and self.finalize_block(proposed_block):
             return proposed_block
 
+    @timed("propose")
     def propose_block(self, txns: List[Transaction]) -> Block:
         proposer = self.select_validator()
         if not proposer:
             return None
+        if self.verifier is not None:
+            txns = self.verifier.admit(txns, "proposal")
 
         previous_block = self.get_last_block()
         new_block = Block(
@@ -144,26 +154,43 @@ class ProofOfStake(Blockchain):
         )
 
         if self.validate_block(new_block, previous_block):
+            opcounts.count(opcounts.MESSAGES)
             return new_block
 
         return None
 
+    @timed("vote")
     def vote_on_block(self, block: Block) -> bool:
+        votes = []
         total_votes = 0
         for validator in self.validators:
             if validator.is_active:
                 # In a real system, validators would check the block's validity here
                 if random.random() < 0.99:  # 99% chance to vote yes if active
-                    block.votes[validator.address] = validator.stake
+                    votes.append((validator, validator.stake))
                     total_votes += validator.stake
 
+        block.votes = tuple(votes)
+        opcounts.count(opcounts.MESSAGES, len(votes))
+        if self.network is not None:
+            self.gossip_votes(block)
         return total_votes / self.total_stake >= self.consensus_threshold
 
+    def gossip_votes(self, block: Block) -> None:
+        """Send the block out and its votes back through the network."""
+        proposer = next(v for v in self.validators if v.address == block.validator)
+        self.network.vote_round(
+            self.network.node(proposer),
+            block,
+            [self.network.node(validator) for validator, _ in block.votes],
+            [stake for _, stake in block.votes],
+            self.consensus_threshold,
+        )
+
+    @timed("validate")
     def validate_block(self, block: Block, previous_block: Block) -> bool:
         if len(self.chain) > 0 and block.previous_hash != previous_block.hash:
             return False
-        if block.hash != block.calculate_hash():
-            return False
 
         proposer = next(
             (v for v in self.validators if v.address == block.validator), None
@@ -171,8 +198,11 @@ class ProofOfStake(Blockchain):
         if not proposer or not proposer.is_active or proposer.stake < self.min_stake:
             return False
 
+        if self.verifier is not None:
+            return self.verifier.all_valid(block.txns, "validation")
         return True
 
+    @timed("reward")
     def distribute_rewards(self, proposer: Validator, block: Block) -> None:
         base_reward = self.block_reward
         fee_reward = sum(tx.fee for tx in block.txns)
@@ -184,13 +214,15 @@ class ProofOfStake(Blockchain):
         proposer.stake += proposer_reward
         proposer.total_rewards += proposer_reward
 
-        for voter, stake in block.votes.items():
-            voter_validator = next(v for v in self.validators if v.address == voter)
-            vote_share = stake / sum(block.votes.values())
+        total_votes = sum(stake for _, stake in block.votes)
+        for voter_validator, stake in block.votes:
+            vote_share = stake / total_votes
             reward = voter_reward * vote_share
             voter_validator.stake += reward
             voter_validator.total_rewards += reward
 
+        # Votes are only needed to split the rewards
+        block.votes = ()
         self.total_supply += base_reward
 
     def update_validator_set(self) -> None:
@@ -237,6 +269,7 @@ class ProofOfStake(Blockchain):
 
         return False
 
+    @timed("reconfigure")
     def epoch_based_reconfiguration(self) -> None:
         if len(self.chain) % self.epoch_length == 0:
             self.update_validator_set()
@@ -247,9 +280,10 @@ class ProofOfStake(Blockchain):
         """Simulate a Nothing-at-Stake attack."""
         if random.random() < 0.1:  # 10% chance of a fork occurring
             print(f"Nothing-at-Stake attack attempted by {attacker.address[:8]}!")
-            fork_chain = self.chain[:-1]  # Create a fork from the previous block
-            fork_block = attacker.propose_block([], fork_chain[-1].hash)
-            if self.validate_block(fork_block):
+            # Fork from the block before the tip
+            fork_parent = self.chain[-2]
+            fork_block = attacker.propose_block([], fork_parent.hash)
+            if self.validate_block(fork_block, fork_parent):
                 print("Fork created successfully!")
                 return True
         return False
@@ -260,15 +294,20 @@ class ProofOfStake(Blockchain):
             len(self.chain) - self.last_finalized_block > 100
         ):  # If there's a long unfinalized chain
             print(f"Long-Range attack attempted by {attacker.address[:8]}!")
-            fork_point = random.randint(self.last_finalized_block, len(self.chain) - 1)
-            fork_chain = self.chain[:fork_point]
+            fork_point = random.randint(
+                max(1, self.last_finalized_block), len(self.chain) - 1
+            )
+            # Only the fork's own blocks are held; the shared prefix stays stored
+            fork_blocks = []
+            fork_parent = self.chain[fork_point - 1]
             for _ in range(len(self.chain) - fork_point):
-                fork_block = attacker.propose_block([], fork_chain[-1].hash)
-                if self.validate_block(fork_block):
-                    fork_chain.append(fork_block)
-            if len(fork_chain) > len(self.chain):
+                fork_block = attacker.propose_block([], fork_parent.hash)
+                if self.validate_block(fork_block, fork_parent):
+                    fork_blocks.append(fork_block)
+                    fork_parent = fork_block
+            if fork_point + len(fork_blocks) > len(self.chain):
                 print("Long-Range attack successful! Longer chain created.")
-                self.chain = fork_chain
+                self.chain.replace_from(fork_point, fork_blocks)
                 return True
         return False
 
@@ -4,55 +4,60 @@ import time
 from typing import List
 import asyncio
 
+from block import GENESIS_HASH, BaseBlock, meets_difficulty
+from block_store import MemoryBlockStore
+import opcounts
+from instrumentation import phase, timed
 from transaction import Transaction
 
 
-class Block:
+class Block(BaseBlock):
+    __slots__ = ("proposer", "nonce", "total_fees")
+
+    HEADER_FIELDS = BaseBlock.HEADER_FIELDS | {"proposer", "nonce"}
+
     def __init__(
         self,
         nonce: int,
         proposer: str,
         txns: List[Transaction],
-        previous_hash: str,
+        previous_hash: bytes,
     ):
+        super().__init__(txns, previous_hash)
         self.proposer = proposer
-        self.txns = txns
-        self.previous_hash = previous_hash
-        self.timestamp = int(time.time())
         self.nonce = nonce
-        self.hash = self.calculate_hash()
-        self.total_fees = sum(tx.fee for tx in txns)
-
-    def calculate_hash(self) -> str:
-        block_data = (
-            str(self.proposer)
-            + "".join(tx.to_bytes().decode() for tx in self.txns)
-            + str(self.previous_hash)
-            + str(self.nonce)
-            + str(self.timestamp)
+        self.total_fees = sum(tx.fee for tx in self.txns)
+
+    def header_bytes(self) -> bytes:
+        return b"".join(
+            (
+                self.proposer.encode(),
+                self.txns_digest,
+                self.previous_hash,
+                self.nonce.to_bytes(8, "big"),
+                self.timestamp.to_bytes(8, "big"),
+            )
         )
-        return hashlib.sha256(block_data.encode()).hexdigest()
 
-    def is_valid(self, previous_hash: str, difficulty: int) -> bool:
-        return (
-            self.previous_hash == previous_hash
-            and self.hash == self.calculate_hash()
-            and self.hash.startswith("0" * difficulty)
+    def is_valid(self, previous_hash: bytes, difficulty: int) -> bool:
+        return self.previous_hash == previous_hash and meets_difficulty(
+            self.hash, difficulty
         )
 
-    def __repr__(self) -> str:
-        return f"Block (timestamp={self.timestamp}, hash={self.hash[:8]}, previous_hash={self.previous_hash[:8]}, num_txns={len(self.txns)})"
-
 
 class Blockchain:
-    def __init__(self, initial_difficulty: int, target_block_time: int):
-        self.chain: List[Block] = []
+    def __init__(self, initial_difficulty: int, target_block_time: int, store=None):
+        # Any block_store store; a reopened store already has its genesis
+        self.chain = store if store is not None else MemoryBlockStore()
         self.difficulty = initial_difficulty
         self.target_block_time = target_block_time
-        self.create_genesis_block()
+        if not len(self.chain):
+            self.create_genesis_block()
+        # Blocks from earlier runs in a reopened store aren't this run's
+        self.start_height = len(self.chain)
 
     def create_genesis_block(self) -> None:
-        genesis_block = Block(0, "0", [], "0")
+        genesis_block = Block(0, "0", [], GENESIS_HASH)
         self.chain.append(genesis_block)
 
     def add_block(self, block: Block) -> None:
@@ -63,22 +68,21 @@ class Blockchain:
             self.adjust_difficulty()
 
     def get_last_block(self) -> Block:
-        return self.chain[-1]
+        return self.chain.last()
 
     def get_new_block_index(self) -> int:
         return len(self.chain)
 
     def is_valid(self) -> bool:
-        return all(
-            self.chain[i].is_valid(
-                difficulty=self.difficulty, previous_hash=self.chain[i - 1].hash
-            )
-            for i in range(1, len(self.chain))
+        return self.chain.links_valid() and all(
+            meets_difficulty(block_hash, self.difficulty)
+            for block_hash in self.chain.iter_hashes(1)
         )
 
+    @timed("reconfigure")
     def adjust_difficulty(self):
         if len(self.chain) % 5 == 0:
-            last_five_blocks = self.chain[-5:]
+            last_five_blocks = self.chain.recent(5)
             average_time = (
                 last_five_blocks[-1].timestamp - last_five_blocks[0].timestamp
             ) / 5
@@ -100,27 +104,28 @@ class Miner:
         self,
         stop_event: asyncio.Event,
         transactions: list,
-        previous_hash: str,
-        target: str,
+        previous_hash: bytes,
+        target: int,
         start_nonce=0,
     ):
-        nonce = start_nonce
+        # Only the nonce changes between attempts, so the transactions digest
+        # is computed once and each attempt re-hashes just the header
+        new_block = Block(
+            nonce=start_nonce,
+            proposer=self.address,
+            txns=transactions,
+            previous_hash=previous_hash,
+        )
         while not stop_event.is_set():
-            new_block = Block(
-                nonce=nonce,
-                proposer=self.address,
-                txns=transactions,
-                previous_hash=previous_hash,
-            )
-            if new_block.hash.startswith(target * "0"):
+            if meets_difficulty(new_block.hash, target):
                 stop_event.set()
                 return new_block
-            nonce += 1
+            new_block.nonce += 1
 
             # Simulate hash rate
             time.sleep(1 / self.hash_rate)
 
-    def validate_block(self, block: Block, previous_hash: str, difficulty: int):
+    def validate_block(self, block: Block, previous_hash: bytes, difficulty: int):
         return block.is_valid(previous_hash, difficulty=difficulty)
 
 
@@ -131,18 +136,24 @@ class ProofOfWork(Blockchain):
         initial_difficulty: int,
         target_block_time: int,
         initial_reward: float = 50,
+        store=None,
     ):
         self.miners = miners
+        self.network = None  # optional network.Network, one node per miner
+        self.verifier = None  # optional signatures.SignatureVerifier
         self.block_reward = initial_reward
         self.halving_interval = 210000
         super().__init__(
             initial_difficulty=initial_difficulty,
             target_block_time=target_block_time,
+            store=store,
         )
 
     async def mine_block(self, transactions: List[Transaction]):
         previous_hash = self.get_last_block().hash
         start_nonce = 0
+        if self.verifier is not None:
+            transactions = self.verifier.admit(transactions, "proposal")
 
         stop_event = asyncio.Event()
 
@@ -151,22 +162,32 @@ class ProofOfWork(Blockchain):
                 stop_event, transactions, previous_hash, self.difficulty, start_nonce
             )
 
-        tasks = [asyncio.create_task(mine(miner)) for miner in self.miners]
-
-        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        with phase("propose"):
+            tasks = [asyncio.create_task(mine(miner)) for miner in self.miners]
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
 
         for task in done:
             block = task.result()
             if block:
-                valid_count = sum(
-                    1
-                    for miner in self.miners
-                    if miner.validate_block(
-                        block=block,
-                        previous_hash=previous_hash,
-                        difficulty=self.difficulty,
+                # The winner broadcasts its block for the others to validate
+                opcounts.count(opcounts.MESSAGES)
+                if self.network is not None:
+                    # Accepted once a majority of miners have received it
+                    self.network.propagate_block(tasks.index(task), block, 0.5)
+                with phase("validate"):
+                    valid_count = sum(
+                        1
+                        for miner in self.miners
+                        if miner.validate_block(
+                            block=block,
+                            previous_hash=previous_hash,
+                            difficulty=self.difficulty,
+                        )
                     )
-                )
+                    if self.verifier is not None and not self.verifier.all_valid(
+                        block.txns, "validation"
+                    ):
+                        valid_count = 0
                 if valid_count > len(self.miners) / 2:
                     self.add_block(block)
                     self.reward_miner(block.proposer, block.total_fees)
@@ -177,6 +198,7 @@ class ProofOfWork(Blockchain):
         stop_event.set()
         return None
 
+    @timed("reward")
     def reward_miner(self, miner_address: str, transaction_fees: float):
         miner = next(m for m in self.miners if m.address == miner_address)
         reward = self.block_reward + transaction_fees
@@ -199,16 +221,19 @@ class ProofOfWork(Blockchain):
                 return False
 
             honest_chain_length = len(self.chain)
-            attacker_chain = self.chain[:-10]
+            fork_point = honest_chain_length - 10
+            attacker_blocks = []
+            tip = self.chain.hash_at(fork_point - 1)
 
             # Attacker mines faster than the rest of the network
             for _ in range(11):
-                new_block = Block(0, attacker.address, [], attacker_chain[-1].hash)
-                attacker_chain.append(new_block)
+                new_block = Block(0, attacker.address, [], tip)
+                attacker_blocks.append(new_block)
+                tip = new_block.hash
 
-            if len(attacker_chain) > honest_chain_length:
+            if fork_point + len(attacker_blocks) > honest_chain_length:
                 print("51% attack successful! Longer chain created.")
-                self.chain = attacker_chain
+                self.chain.replace_from(fork_point, attacker_blocks)
                 return True
 
         return False
@@ -217,7 +242,7 @@ class ProofOfWork(Blockchain):
         """Simulate selfish mining."""
         if attacker.hash_rate > 0.3 * sum(m.hash_rate for m in self.miners):
             print(f"Selfish mining attempted by {attacker.address[:8]}!")
-            private_chain = [self.chain[-1]]
+            private_chain = [self.chain.last()]
             public_chain_length = len(self.chain)
 
             while len(private_chain) <= public_chain_length:
@@ -226,7 +251,8 @@ class ProofOfWork(Blockchain):
 
             if len(private_chain) > public_chain_length:
                 print("Selfish mining successful! Private chain released.")
-                self.chain = private_chain
+                # The private blocks extend the current tip
+                self.chain.replace_from(len(self.chain), private_chain[1:])
                 return True
 
         return False
@@ -244,20 +270,23 @@ class ProofOfWork(Blockchain):
             self.mine_block([honest_transaction])
 
             # Attacker creates a parallel chain with conflicting transaction
-            attacker_chain = self.chain[:-1]
+            fork_point = len(self.chain) - 1
             new_block = Block(
-                0, attacker.address, [conflicting_transaction], attacker_chain[-1].hash
+                0,
+                attacker.address,
+                [conflicting_transaction],
+                self.chain.hash_at(fork_point - 1),
             )
-            attacker_chain.append(new_block)
+            attacker_blocks = [new_block]
 
             # Attacker tries to extend their chain to be longer
-            while len(attacker_chain) <= len(self.chain):
-                new_block = Block(0, attacker.address, [], attacker_chain[-1].hash)
-                attacker_chain.append(new_block)
+            while fork_point + len(attacker_blocks) <= len(self.chain):
+                new_block = Block(0, attacker.address, [], attacker_blocks[-1].hash)
+                attacker_blocks.append(new_block)
 
-            if len(attacker_chain) > len(self.chain):
+            if fork_point + len(attacker_blocks) > len(self.chain):
                 print("Double spending successful! Conflicting chain is longer.")
-                self.chain = attacker_chain
+                self.chain.replace_from(fork_point, attacker_blocks)
                 return True
         return False
 
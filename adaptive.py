@@ -0,0 +1,263 @@
+"""Adaptive sweep: run each configuration until its estimates are tight enough.
+
+Every (engine, num_entities) cell repeats short runs with independent seeds
+until the confidence intervals on mean TPS and mean block time are narrower
+than the target (relative to the mean), or it hits MAX_RUNS. Where two
+engines' curves cross between neighbouring entity counts, the bracketing cells
+get a tighter target and the gap is bisected, since that is where the ranking
+is decided.
+
+    python adaptive.py --target-width 0.1 --blocks-per-run 10
+"""
+
+import argparse
+import math
+import statistics
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from tabulate import tabulate
+
+import metrics
+from app import CACHE_DIRECTORY, ENGINES, RESULTS_DIRECTORY, print_result
+from result_cache import ResultCache
+from results_store import ResultsStore
+from sweep import SweepJob, iter_sweep, job_seed
+
+METRICS = ("avg_tps", "avg_time")
+TARGET_RELATIVE_WIDTH = 0.1  # full CI width as a fraction of the mean
+BLOCKS_PER_RUN = 10
+MIN_RUNS = 3
+MAX_RUNS = 30
+MAX_REFINEMENTS = 8  # entity counts added between crossing points
+CROSSING_TIGHTENING = 0.5  # target multiplier for cells bracketing a crossing
+
+# Two-sided 95% Student t quantiles by degrees of freedom
+T_QUANTILES = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    15: 2.131,
+    20: 2.086,
+    30: 2.042,
+}
+Z_QUANTILE = 1.96
+
+
+def t_quantile(df: int) -> float:
+    if df > max(T_QUANTILES):
+        return Z_QUANTILE
+    # Round df down to the nearest tabulated value, which errs on the wide side
+    return T_QUANTILES[max(d for d in T_QUANTILES if d <= df)]
+
+
+def confidence_interval(samples: List[float]) -> Tuple[float, float]:
+    """Mean and 95% half-width; the half-width is infinite below two samples."""
+    mean = statistics.fmean(samples) if samples else math.nan
+    if len(samples) < 2:
+        return mean, math.inf
+    half_width = t_quantile(len(samples) - 1) * statistics.stdev(samples)
+    return mean, half_width / math.sqrt(len(samples))
+
+
+class Cell:
+    """Per-run means for one (engine, num_entities) configuration.
+
+    Each run is an independent replication, so its mean is one sample; the
+    blocks inside a run are autocorrelated (difficulty, stake and rewards carry
+    over) and aren't treated as separate samples.
+    """
+
+    def __init__(self, engine: str, num_entities: int, target_width: float):
+        self.engine = engine
+        self.num_entities = num_entities
+        self.target_width = target_width
+        self.samples: Dict[str, List[float]] = {metric: [] for metric in METRICS}
+        self.submitted = 0
+
+    @property
+    def runs(self) -> int:
+        return len(self.samples[METRICS[0]])
+
+    def add(self, result: dict) -> None:
+        for metric in METRICS:
+            self.samples[metric].append(result[metric])
+
+    def interval(self, metric: str) -> Tuple[float, float]:
+        return confidence_interval(self.samples[metric])
+
+    def relative_width(self, metric: str) -> float:
+        mean, half_width = self.interval(metric)
+        return 2 * half_width / abs(mean) if mean else math.inf
+
+    @property
+    def converged(self) -> bool:
+        return all(
+            self.relative_width(metric) <= self.target_width for metric in METRICS
+        )
+
+    def runs_needed(self, max_runs: int) -> int:
+        if self.runs < MIN_RUNS:
+            return MIN_RUNS - self.runs
+        if self.runs >= max_runs or self.converged:
+            return 0
+        return 1
+
+    def next_jobs(self, count: int, blocks_per_run: int, base_seed: int):
+        jobs = []
+        for repetition in range(self.submitted, self.submitted + count):
+            seed = job_seed(
+                base_seed, self.engine, self.num_entities, blocks_per_run, repetition
+            )
+            jobs.append(SweepJob(self.engine, self.num_entities, blocks_per_run, seed))
+        self.submitted += count
+        return jobs
+
+
+def find_crossings(cells: Dict[Tuple[str, int], Cell], engines: Iterable[str]):
+    """Adjacent entity counts between which two engines swap order on a metric."""
+    engines = list(engines)
+    entity_counts = sorted({num_entities for _, num_entities in cells})
+    crossings = set()
+    for metric in METRICS:
+        for i, first in enumerate(engines):
+            for second in engines[i + 1 :]:
+                differences = [
+                    cells[first, n].interval(metric)[0]
+                    - cells[second, n].interval(metric)[0]
+                    for n in entity_counts
+                ]
+                for j in range(len(entity_counts) - 1):
+                    if np.sign(differences[j]) * np.sign(differences[j + 1]) < 0:
+                        crossings.add((entity_counts[j], entity_counts[j + 1]))
+    return sorted(crossings)
+
+
+def refine(
+    cells: Dict[Tuple[str, int], Cell],
+    engines: Iterable[str],
+    target_width: float,
+    refinements: int,
+) -> int:
+    """Tighten and bisect around crossings; returns the refinements used."""
+    engines = list(engines)
+    for low, high in find_crossings(cells, engines):
+        for engine in engines:
+            for n in (low, high):
+                cells[engine, n].target_width = target_width * CROSSING_TIGHTENING
+
+        middle = round(math.sqrt(low * high))
+        if refinements < MAX_REFINEMENTS and low < middle < high:
+            refinements += 1
+            for engine in engines:
+                cells[engine, middle] = Cell(
+                    engine, middle, target_width * CROSSING_TIGHTENING
+                )
+    return refinements
+
+
+def adaptive_sweep(
+    entity_counts: Iterable[int],
+    engines: Iterable[str] = tuple(ENGINES),
+    target_width: float = TARGET_RELATIVE_WIDTH,
+    blocks_per_run: int = BLOCKS_PER_RUN,
+    max_runs: int = MAX_RUNS,
+    base_seed: int = 0,
+    max_workers: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+    store: Optional[ResultsStore] = None,
+) -> Dict[Tuple[str, int], Cell]:
+    engines = list(engines)
+    cells = {
+        (engine, num_entities): Cell(engine, num_entities, target_width)
+        for num_entities in sorted(set(entity_counts))
+        for engine in engines
+    }
+    refinements = 0
+
+    while True:
+        jobs = [
+            job
+            for cell in cells.values()
+            for job in cell.next_jobs(
+                cell.runs_needed(max_runs), blocks_per_run, base_seed
+            )
+        ]
+        if not jobs:
+            # Every cell is settled; look for crossings to spend more runs on.
+            # Tightening only ever happens once per cell and bisection is
+            # bounded, so this terminates
+            cell_count = len(cells)
+            refinements = refine(cells, engines, target_width, refinements)
+            if len(cells) == cell_count and not any(
+                cell.runs_needed(max_runs) for cell in cells.values()
+            ):
+                break
+            continue
+
+        # Each round runs in parallel on the shared pool (and cache)
+        for job, result in iter_sweep(jobs, max_workers, cache):
+            cells[job.engine, job.num_entities].add(result)
+            if store:
+                store.append(job, result)
+            print_result(job, result)
+
+    return cells
+
+
+def print_cells(cells: Dict[Tuple[str, int], Cell]) -> None:
+    rows = []
+    for (engine, num_entities), cell in sorted(cells.items()):
+        tps, tps_half = cell.interval("avg_tps")
+        block_time, time_half = cell.interval("avg_time")
+        rows.append(
+            [
+                engine,
+                num_entities,
+                cell.runs,
+                f"{tps:.1f} ± {tps_half:.1f}",
+                f"{block_time:.4f} ± {time_half:.4f}",
+                "yes" if cell.converged else "no",
+            ]
+        )
+    headers = ["Consensus", "Miners", "Runs", "TPS", "Block time (s)", "Converged"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Adaptive consensus sweep")
+    parser.add_argument("--target-width", type=float, default=TARGET_RELATIVE_WIDTH)
+    parser.add_argument("--blocks-per-run", type=int, default=BLOCKS_PER_RUN)
+    parser.add_argument("--max-runs", type=int, default=MAX_RUNS)
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if metrics.ENABLED:
+        metrics.start_server()
+    store = ResultsStore(RESULTS_DIRECTORY)
+    store.reset()
+    cells = adaptive_sweep(
+        np.logspace(0, 2, num=10, dtype=int).tolist(),
+        engines=args.engines or tuple(ENGINES),
+        target_width=args.target_width,
+        blocks_per_run=args.blocks_per_run,
+        max_runs=args.max_runs,
+        base_seed=args.seed,
+        cache=ResultCache(CACHE_DIRECTORY),
+        store=store,
+    )
+    print_cells(cells)
+    total_blocks = sum(cell.runs for cell in cells.values()) * args.blocks_per_run
+    print(f"{total_blocks} blocks simulated across {len(cells)} configurations")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,215 +2,421 @@ import asyncio
 import random
 import time
 
-from tqdm import tqdm
-from tabulate import tabulate
-from plotting import plot
-from Algorand import Account, Algorand
-from PoS import ProofOfStake, Validator
-from PoW import Miner, ProofOfWork
+import metrics
+import opcounts
 from transaction import generate_transactions
-import numpy as np
 
-ALGORAND_ENERGY_PER_TRANSACTION = (
-    0.000000539  # kWh per transaction (source: Algorand Foundation)
-)
-POS_ENERGY_PER_VALIDATION = 0.000001  # kWh per validation (estimated)
-POW_ENERGY_PER_HASH = 0.000000001  # kWh per hash (estimated for modern ASIC miners)
-NETWORK_OVERHEAD_FACTOR = 1.1  # 10% additional energy for network overhead
+# Engines, plotting (pandas/seaborn), numpy, tqdm and tabulate are imported in
+# the functions that need them, so a worker running one engine loads only that
+# engine and startup stays cheap
 
+ALGORAND_SEED_LOOKBACK = 4  # rounds between a seed block and the round it seeds
+PROGRESS_INTERVAL = 0.5  # seconds between progress bar description refreshes
+RESULTS_DIRECTORY = "results"
+CACHE_DIRECTORY = ".sweep_cache"
+
+
+class NullProgress:
+    """Stands in for tqdm when progress is off, without importing it."""
+
+    def update(self, n=1):
+        pass
+
+    def close(self):
+        pass
+
+
+def progress_bar(total, progress):
+    if not progress:
+        return NullProgress()
+    from tqdm import tqdm
+
+    return tqdm(total=total)
+
+
+def attach_network(engine, participants, config):
+    """Route the engine's blocks and votes through a simulated network."""
+    if config is None:
+        return
+    from network import Network
+
+    engine.network = Network.for_participants(participants, **config)
+
+
+def pop_network_delay(engine):
+    return engine.network.pop_delay() if engine.network is not None else 0.0
+
+
+def attach_verifier(engine, config):
+    """Sign every transaction and check it wherever the engine sees it.
+
+    Returns the wallets that sign the transactions.
+    """
+    if config is None:
+        return None
+    from signatures import SignatureVerifier, Wallets
+
+    engine.verifier = SignatureVerifier(processes=config.get("processes"))
+    return Wallets(config["wallets"], random.getrandbits(256).to_bytes(32, "big"))
+
+
+def admit_to_mempool(engine, txns):
+    if engine.verifier is None:
+        return txns
+    return engine.verifier.admit(txns, "mempool")
+
+
+def finish_verifier(engine):
+    if engine.verifier is not None:
+        engine.authentication = engine.verifier.close()
+        engine.verifier = None
+
+
+class SerialPipeline:
+    """Stands in for pipeline.Pipeline when pipelining is off."""
+
+    def __init__(self, source=generate_transactions):
+        self.source = source
+
+    def next_transactions(self):
+        return self.source()
+
+    def submit(self, block):
+        pass
+
+    def close(self):
+        return None
+
+
+def start_pipeline(name, engine, depth, wallets=None):
+    """Overlap transaction generation and validation with consensus."""
+    source = wallets.generate_transactions if wallets else generate_transactions
+    if not depth:
+        return SerialPipeline(source)
+    from pipeline import Pipeline
+
+    return Pipeline(name, engine, depth, source=source)
+
+
+def finish_pipeline(engine, stages):
+    summary = stages.close()
+    if summary is not None:
+        engine.pipeline = summary
+
+
+def make_pos(num_validators, store=None):
+    from PoS import ProofOfStake, Validator
 
-async def run_pos(num_validators, num_blocks):
     # Create validators for PoS
     validators = [
         Validator(stake=random.randint(64000, 200000000)) for _ in range(num_validators)
     ]
-    pos = ProofOfStake(validators, initial_supply=1_000_000, inflation_rate=0.02)
+    pos = ProofOfStake(
+        validators, initial_supply=1_000_000, inflation_rate=0.02, store=store
+    )
+    return pos, validators
+
+
+def make_algorand(num_miners, store=None):
+    from Algorand import Account, Algorand
+    from keystore import KeyStore
+
+    # Create accounts for miners; keys are derived from one seed on first use
+    key_store = KeyStore(master_seed=random.randbytes(32))
+    accounts = [
+        Account(stake=random.randint(64000, 200000000), key_store=key_store)
+        for _ in range(num_miners)
+    ]
+    algorand = Algorand(
+        accounts,
+        initial_supply=1_000_000,
+        inflation_rate=0.02,
+        seed_lookback=ALGORAND_SEED_LOOKBACK,
+        store=store,
+    )
+    return algorand, accounts
 
-    total_stake = sum(validator.stake for validator in validators)
 
-    # Lists to store time, tps, and energy consumption for each block
+def make_pow(num_miners, store=None):
+    from PoW import Miner, ProofOfWork
+
+    # Create miners with random hash rates
+    miners = [Miner(hash_rate=random.uniform(30e12, 1e18)) for _ in range(num_miners)]
+    pow = ProofOfWork(
+        miners,
+        initial_difficulty=1,
+        target_block_time=1,
+        store=store,
+    )
+    return pow, miners
+
+
+def update_progress(pbar, label, block, block_index, time_consumption, block_ops):
+    pbar.set_description(f"{label} {block}")
+    pbar.set_postfix(
+        {
+            "Block_Index": block_index,
+            "Time": f"{time_consumption:.2f}s",
+            "SHA-256": block_ops[opcounts.SHA256],
+        }
+    )
+
+
+async def run_pos(
+    num_validators,
+    num_blocks,
+    progress=True,
+    network=None,
+    pipeline=0,
+    store=None,
+    auth=None,
+):
+    pos, validators = make_pos(num_validators, store)
+    metrics.set_engine("pos")
+    attach_network(pos, validators, network)
+    wallets = attach_verifier(pos, auth)
+    stages = start_pipeline("pos", pos, pipeline, wallets)
+
+    # Lists to store time, tps, operation counts and txn count for each block
     times = []
     tps = []
-    energy_consumptions = []
+    op_counts = []
+    txn_counts = []
 
-    # Progress bar
-    pbar = tqdm(total=num_blocks)
+    # Progress bar; its description is only refreshed every PROGRESS_INTERVAL
+    pbar = progress_bar(num_blocks, progress)
+    next_refresh = 0.0
 
     for block_index in range(num_blocks):
-        # Generate transactions for the block
-        txns = generate_transactions()
+        # Transactions for the block, prepared ahead of time when pipelined
+        txns = stages.next_transactions()
 
-        # Measure time to propose block
+        # Measure time and operations to propose block
+        ops_before = opcounts.snapshot()
         start = time.time()
+        # Signature checks count against the block's time
+        txns = admit_to_mempool(pos, txns)
         block = pos.mine_block(txns)
         end = time.time()
-        time_consumption = end - start
+        stages.submit(block)
+        # Simulated propagation delay, if a network is attached
+        time_consumption = end - start + pop_network_delay(pos)
+        block_ops = opcounts.since(ops_before)
 
-        # Calculate TPS and energy consumption
+        # Calculate TPS; energy is derived from the operation counts afterwards
         times.append(time_consumption)
         tps.append(len(txns) / time_consumption)
-
-        # Energy consumption for PoS: each validator consumes energy to validate
-        block_energy = (
-            sum(
-                validator.stake / total_stake * POS_ENERGY_PER_VALIDATION
-                for validator in validators
-            )
-            * NETWORK_OVERHEAD_FACTOR
-        )
-        energy_consumptions.append(block_energy)
+        txn_counts.append(len(txns))
+        op_counts.append(block_ops)
 
         # Update progress bar
+        metrics.record_block("pos", len(pos.chain) - 1, time_consumption, len(txns))
         pbar.update(1)
-        pbar.set_description(f"PoS {block}")
-        pbar.set_postfix(
-            {
-                "Block Index": block_index,
-                "Time": f"{time_consumption:.2f}s",
-                "Energy": f"{block_energy:.6f}kWh",
-            }
-        )
+        if progress and time.monotonic() >= next_refresh:
+            next_refresh = time.monotonic() + PROGRESS_INTERVAL
+            update_progress(
+                pbar, "PoS", block, block_index, time_consumption, block_ops
+            )
 
-    # Close progress bar
+    # Close progress bar and drain the pipeline
     pbar.close()
+    finish_pipeline(pos, stages)
+    finish_verifier(pos)
 
     # Return results
-    return "pos", times, tps, energy_consumptions, pos, validators
-
-
-async def run_algorand(num_miners, num_blocks):
-    # Create accounts for miners
-    accounts = [
-        Account(stake=random.randint(64000, 200000000)) for _ in range(num_miners)
-    ]
-    algorand = Algorand(accounts, initial_supply=1_000_000, inflation_rate=0.02)
-
-    # Lists to store time, tps, and energy consumption for each block
+    return "pos", times, op_counts, tps, txn_counts, pos, validators
+
+
+async def run_algorand(
+    num_miners,
+    num_blocks,
+    progress=True,
+    network=None,
+    pipeline=0,
+    store=None,
+    auth=None,
+):
+    algorand, accounts = make_algorand(num_miners, store)
+    metrics.set_engine("algorand")
+    attach_network(algorand, accounts, network)
+    wallets = attach_verifier(algorand, auth)
+    stages = start_pipeline("algorand", algorand, pipeline, wallets)
+
+    # Lists to store time, tps, operation counts and txn count for each block
     times = []
     tps = []
-    energy_consumptions = []
+    op_counts = []
+    txn_counts = []
 
-    # Progress bar
-    pbar = tqdm(total=num_blocks)
+    # Progress bar; its description is only refreshed every PROGRESS_INTERVAL
+    pbar = progress_bar(num_blocks, progress)
+    next_refresh = 0.0
 
     for block_index in range(num_blocks):
-        # Generate transactions for the block
-        txns = generate_transactions()
+        # Transactions for the block, prepared ahead of time when pipelined
+        txns = stages.next_transactions()
 
-        # Mine block and measure time
+        # Mine block and measure time and operations
+        ops_before = opcounts.snapshot()
         start = time.time()
+        # Signature checks count against the block's time
+        txns = admit_to_mempool(algorand, txns)
         block = algorand.mine_block(txns)  # Mine the block
         end = time.time()
-        time_consumption = end - start
+        stages.submit(block)
+        # Simulated propagation delay, if a network is attached
+        time_consumption = end - start + pop_network_delay(algorand)
+        block_ops = opcounts.since(ops_before)
 
-        # Calculate TPS and energy consumption
+        # Calculate TPS; energy is derived from the operation counts afterwards
         times.append(time_consumption)
         tps.append(len(txns) / time_consumption)
-
-        # Energy consumption for Algorand: based on number of transactions
-        block_energy = len(txns) * ALGORAND_ENERGY_PER_TRANSACTION
-        energy_consumptions.append(block_energy)
+        txn_counts.append(len(txns))
+        op_counts.append(block_ops)
 
         # Update progress bar
-        pbar.update(1)
-        pbar.set_description(f"Algorand {block}")
-        pbar.set_postfix(
-            {
-                "Block_Index": block_index,
-                "Time": f"{time_consumption:.2f}s",
-                "Energy": f"{block_energy:.6f}kWh",
-            }
+        metrics.record_block(
+            "algorand", len(algorand.chain) - 1, time_consumption, len(txns)
         )
+        pbar.update(1)
+        if progress and time.monotonic() >= next_refresh:
+            next_refresh = time.monotonic() + PROGRESS_INTERVAL
+            update_progress(
+                pbar, "Algorand", block, block_index, time_consumption, block_ops
+            )
 
-    # Close progress bar
+    # Close progress bar, drain the pipeline and stop the sortition worker
     pbar.close()
+    finish_pipeline(algorand, stages)
+    finish_verifier(algorand)
+    algorand.shutdown()
 
     # Return results
-    return "algorand", times, tps, energy_consumptions, algorand, accounts
-
-
-async def run_pow(num_miners, num_blocks):
-    # Create miners with random hash rates
-    miners = [Miner(hash_rate=random.uniform(30e12, 1e18)) for _ in range(num_miners)]
-    pow = ProofOfWork(
-        miners,
-        initial_difficulty=1,
-        target_block_time=1,
-    )
-
-    # Lists to store time, tps, and energy consumption for each block
+    return "algorand", times, op_counts, tps, txn_counts, algorand, accounts
+
+
+async def run_pow(
+    num_miners,
+    num_blocks,
+    progress=True,
+    network=None,
+    pipeline=0,
+    store=None,
+    auth=None,
+):
+    pow, miners = make_pow(num_miners, store)
+    metrics.set_engine("pow")
+    attach_network(pow, miners, network)
+    wallets = attach_verifier(pow, auth)
+    stages = start_pipeline("pow", pow, pipeline, wallets)
+
+    # Lists to store time, tps, operation counts and txn count for each block
     times = []
     tps = []
-    energy_consumptions = []
+    op_counts = []
+    txn_counts = []
 
-    # Create progress bar
-    pbar = tqdm(total=num_blocks)
+    # Create progress bar; its description is only refreshed every PROGRESS_INTERVAL
+    pbar = progress_bar(num_blocks, progress)
+    next_refresh = 0.0
 
     for block_index in range(num_blocks):
-        # Generate transactions for the block
-        txns = generate_transactions()
+        # Transactions for the block, prepared ahead of time when pipelined
+        txns = stages.next_transactions()
 
-        # Measure time
+        # Measure time and operations
+        ops_before = opcounts.snapshot()
         start = time.time()
+        # Signature checks count against the block's time
+        txns = admit_to_mempool(pow, txns)
         block = await pow.mine_block(txns)
         end = time.time()
-        time_consumption = end - start
+        stages.submit(block)
+        # Simulated propagation delay, if a network is attached
+        time_consumption = end - start + pop_network_delay(pow)
+        block_ops = opcounts.since(ops_before)
 
-        # Calculate TPS and energy consumption
+        # Calculate TPS; energy is derived from the operation counts afterwards
         times.append(time_consumption)
         tps.append(len(txns) / time_consumption)
-
-        # Energy consumption for PoW: based on total hash rate and time
-        total_hash_rate = sum(miner.hash_rate for miner in miners)
-        hashes_performed = total_hash_rate * time_consumption
-        block_energy = hashes_performed * POW_ENERGY_PER_HASH * NETWORK_OVERHEAD_FACTOR
-        energy_consumptions.append(block_energy)
+        txn_counts.append(len(txns))
+        op_counts.append(block_ops)
 
         # Update progress bar
+        metrics.record_block("pow", len(pow.chain) - 1, time_consumption, len(txns))
         pbar.update(1)
-        pbar.set_description(f"PoW {block}")
-        pbar.set_postfix(
-            {
-                "Block_Index": block_index,
-                "Time": f"{time_consumption:.2f}s",
-                "Energy": f"{block_energy:.6f}kWh",
-            }
-        )
+        if progress and time.monotonic() >= next_refresh:
+            next_refresh = time.monotonic() + PROGRESS_INTERVAL
+            update_progress(
+                pbar, "PoW", block, block_index, time_consumption, block_ops
+            )
 
-    # Close the progress bar
+    # Close the progress bar and drain the pipeline
     pbar.close()
+    finish_pipeline(pow, stages)
+    finish_verifier(pow)
 
     # Return results
-    return "pow", times, energy_consumptions, tps, pow, miners
+    return "pow", times, op_counts, tps, txn_counts, pow, miners
 
 
-def gather_result(task_complete, num_entities: int, num_blocks: int):
-    consensus_type, times, energy_consumptions, tps, chain, users = (
-        task_complete.result()
-    )
+ENGINES = {
+    "pow": run_pow,
+    "pos": run_pos,
+    "algorand": run_algorand,
+}
+
+ENGINE_FACTORIES = {
+    "pow": make_pow,
+    "pos": make_pos,
+    "algorand": make_algorand,
+}
 
-    total_time = sum(times)
-    total_energy = sum(energy_consumptions)
 
+def summarize_run(run_result, num_entities: int, num_blocks: int):
+    consensus_type, times, op_counts, tps, txn_counts, chain, users = run_result
+
+    total_time = sum(times)
     avg_time = total_time / num_blocks
-    avg_energy = total_energy / num_blocks
-    avg_tps = sum(len(block.txns) for block in chain.chain) / avg_time
+    run_txns = chain.chain.total_txns() - chain.chain.total_txns(chain.start_height)
+    avg_tps = run_txns / avg_time
 
-    return {
+    result = {
         "consensus": consensus_type,
         "num_miners": num_entities,
         "num_blocks": num_blocks,
         "times": times,
         "total_time": total_time,
         "avg_time": avg_time,
-        "energy": energy_consumptions,
-        "total_energy": total_energy,
-        "avg_energy": avg_energy,
         "tps": tps,
         "avg_tps": avg_tps,
-        "chain": chain,
-        "users": users,
+        "txns": txn_counts,
+        # Per-block primitive operation counts; energy comes from cost_model
+        "ops": {
+            operation: [block_ops[operation] for block_ops in op_counts]
+            for operation in opcounts.OPERATIONS
+        },
+        # Hash rate (PoW) or stake (PoS, Algorand) against rewards per participant
+        "weights": [
+            user.hash_rate if consensus_type == "pow" else user.stake
+            for user in users
+        ],
+        "rewards": [user.total_rewards for user in users],
     }
+    if chain.network is not None:
+        result["network"] = chain.network.summary()
+    if getattr(chain, "pipeline", None) is not None:
+        result["pipeline"] = chain.pipeline
+    if getattr(chain, "authentication", None) is not None:
+        result["authentication"] = chain.authentication
+    return result
+
+
+def gather_result(task_complete, num_entities: int, num_blocks: int):
+    from cost_model import apply_cost_model
+
+    result = summarize_run(task_complete.result(), num_entities, num_blocks)
+    return apply_cost_model([result])[0]
 
 
 async def compare_consensus_mechanisms(num_entities: int, num_blocks: int):
@@ -226,6 +432,14 @@ async def compare_consensus_mechanisms(num_entities: int, num_blocks: int):
         gather_result(algorand_task, num_entities, num_blocks),
     ]
 
+    print_results(results_list)
+
+    return results_list
+
+
+def print_results(results_list):
+    from tabulate import tabulate
+
     print_results_lists = [
         {
             k: v
@@ -246,28 +460,54 @@ async def compare_consensus_mechanisms(num_entities: int, num_blocks: int):
     ]
     print(tabulate(print_results_lists, headers="keys"))
 
-    return results_list
 
+def main():
+    import numpy as np
+    from tabulate import tabulate
 
-async def main():
-    results = []
+    from cost_model import apply_cost_model
+    from plotting import plot
+    from result_cache import ResultCache
+    from results_store import ResultsStore
+    from sweep import iter_sweep, make_jobs
 
     configurations = [
-        (num_entities, num_blocks)
+        (int(num_entities), int(num_blocks))
         for num_entities in np.logspace(0, 2, num=10, dtype=int)
         for num_blocks in np.logspace(0, 2, num=10, dtype=int)
     ]
 
-    for num_entities, num_blocks in configurations:
-        print(f"Running comparison with {num_entities} miners and {num_blocks} blocks")
-        result = await compare_consensus_mechanisms(
-            num_entities=num_entities, num_blocks=num_blocks
-        )
-        results.extend(result)
-        print()
+    if metrics.ENABLED:
+        metrics.start_server()
 
+    store = ResultsStore(RESULTS_DIRECTORY)
+    store.reset()
+    cache = ResultCache(CACHE_DIRECTORY)
+
+    # Every (engine, configuration) pair runs as its own job on a process pool;
+    # results go straight to disk so the sweep's memory stays flat, and jobs
+    # finished by an earlier (possibly interrupted) sweep come from the cache
+    jobs = make_jobs(configurations, ENGINES)
+    for job, result in iter_sweep(jobs, cache=cache):
+        store.append(job, result)
+        print_result(job, result)
+
+    # Energy is costed once over the whole sweep from the stored operation counts
+    results = apply_cost_model(list(store.iter_results()))
+
+    print_results(results)
+    for table in (store.load_phases(), store.load_memory()):
+        if table:
+            print(tabulate(table, headers="keys"))
     plot(results)
 
 
+def print_result(job, result):
+    print(
+        f"{job.engine}: {job.num_entities} miners, {job.num_blocks} blocks, "
+        f"avg_time={result['avg_time']:.4f}s, avg_tps={result['avg_tps']:.1f}"
+    )
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,295 @@
+"""Microbenchmarks for the consensus hot paths.
+
+    python bench.py                                # run, save benchmarks/latest.json
+    python bench.py --output benchmarks/baseline.json
+    python bench.py --compare benchmarks/baseline.json --threshold 0.1
+
+Compare mode exits with status 1 if any benchmark is slower than the baseline
+by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import Algorand
+import PoS
+import PoW
+from keystore import KeyStore
+from transaction import Transaction, generate_transactions
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "latest.json")
+DEFAULT_THRESHOLD = 0.10  # 10% slower than baseline counts as a regression
+MIN_REPEAT_TIME = 0.05  # seconds per repeat after calibration
+REPEATS = 5
+
+# Each benchmark is (name, setup); setup returns the zero-argument callable to time
+Benchmark = Tuple[str, Callable[[], Callable[[], object]]]
+
+
+def make_txns(count: int) -> List[Transaction]:
+    return [
+        Transaction(f"sender-{i}", f"receiver-{i}", random.uniform(1, 1000), 0.05)
+        for i in range(count)
+    ]
+
+
+def bench_block_hash(engine: str, num_txns: int):
+    def setup():
+        txns = make_txns(num_txns)
+        if engine == "pow":
+            block = PoW.Block(0, "miner", txns, bytes(32))
+        elif engine == "pos":
+            block = PoS.Block("validator", txns, bytes(32))
+        else:
+            block = Algorand.Block(txns, bytes(32), "00" * 64, bytes(64))
+
+        def run():
+            # Reassigning txns drops the cached digest, so every call hashes fully
+            block.txns = block.txns
+            return block.calculate_hash()
+
+        return run
+
+    return setup
+
+
+def bench_generate_transactions():
+    random.seed(0)
+    return generate_transactions
+
+
+def make_pos(num_validators: int) -> PoS.ProofOfStake:
+    validators = [
+        PoS.Validator(stake=random.randint(64000, 200000000))
+        for _ in range(num_validators)
+    ]
+    pos = PoS.ProofOfStake(validators, initial_supply=1_000_000, inflation_rate=0.02)
+    pos.max_validators = num_validators
+    return pos
+
+
+def bench_select_validator(num_validators: int):
+    def setup():
+        return make_pos(num_validators).select_validator
+
+    return setup
+
+
+def bench_vote_on_block(num_validators: int):
+    def setup():
+        pos = make_pos(num_validators)
+        block = PoS.Block("validator", make_txns(100), bytes(32))
+        return lambda: pos.vote_on_block(block)
+
+    return setup
+
+
+def bench_distribute_rewards(num_validators: int):
+    def setup():
+        pos = make_pos(num_validators)
+        block = PoS.Block("validator", make_txns(100), bytes(32))
+        pos.vote_on_block(block)
+        votes = block.votes
+        proposer = pos.validators[0]
+
+        def run():
+            block.votes = votes
+            pos.distribute_rewards(proposer, block)
+
+        return run
+
+    return setup
+
+
+def make_algorand(num_accounts: int) -> Algorand.Algorand:
+    key_store = KeyStore(master_seed=bytes(32))
+    accounts = [
+        Algorand.Account(random.randint(64000, 200000000), key_store)
+        for _ in range(num_accounts)
+    ]
+    return Algorand.Algorand(accounts, initial_supply=1_000_000, inflation_rate=0.02)
+
+
+def bench_select_accounts(num_accounts: int):
+    def setup():
+        algorand = make_algorand(num_accounts)
+        return lambda: algorand.select_accounts(
+            b"seed", algorand.committee_threshold, False
+        )
+
+    return setup
+
+
+def bench_prove():
+    account = make_algorand(1).accounts[0]
+    return lambda: account.prove(b"message")
+
+
+def bench_verify():
+    account = make_algorand(1).accounts[0]
+    signature, _ = account.prove(b"message")
+    public_key = account.public_key
+    return lambda: account.verify(b"message", signature, public_key)
+
+
+def bench_mine_block(difficulty: int):
+    def setup():
+        random.seed(0)
+        miners = [PoW.Miner(hash_rate=1e18) for _ in range(4)]
+        pow = PoW.ProofOfWork(
+            miners, initial_difficulty=difficulty, target_block_time=1
+        )
+        txns = make_txns(100)
+        loop = asyncio.new_event_loop()
+
+        def run():
+            # Back to genesis, so every call mines the same height, and pin
+            # the difficulty, which add_block would otherwise retarget
+            del pow.chain[1:]
+            pow.difficulty = difficulty
+            return loop.run_until_complete(pow.mine_block(txns))
+
+        return run
+
+    return setup
+
+
+def benchmarks(quick: bool = False) -> List[Benchmark]:
+    sizes = (10, 1000) if quick else (10, 1000, 100_000)
+    suite: List[Benchmark] = []
+    for engine in ("pow", "pos", "algorand"):
+        for num_txns in (1, 100, 1000):
+            suite.append(
+                (f"block_hash/{engine}/{num_txns}", bench_block_hash(engine, num_txns))
+            )
+    suite.append(("generate_transactions", bench_generate_transactions))
+    for size in sizes:
+        suite.append((f"pos/select_validator/{size}", bench_select_validator(size)))
+        suite.append((f"pos/vote_on_block/{size}", bench_vote_on_block(size)))
+        suite.append((f"pos/distribute_rewards/{size}", bench_distribute_rewards(size)))
+    for size in (10, 100):
+        suite.append((f"algorand/select_accounts/{size}", bench_select_accounts(size)))
+    suite.append(("algorand/prove", bench_prove))
+    suite.append(("algorand/verify", bench_verify))
+    suite.append(("pow/mine_block/difficulty=2", bench_mine_block(2)))
+    return suite
+
+
+def measure(func: Callable[[], object], repeats: int = REPEATS) -> Dict[str, float]:
+    # Calibrate the loop count so each repeat runs for at least MIN_REPEAT_TIME
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= MIN_REPEAT_TIME * 1e9:
+            break
+        loops *= 10 if elapsed < MIN_REPEAT_TIME * 1e8 else 2
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter_ns() - start) / loops)
+
+    return {
+        "ns_per_op": statistics.median(samples),
+        "min_ns": min(samples),
+        "max_ns": max(samples),
+        "loops": loops,
+        "repeats": repeats,
+    }
+
+
+def run_benchmarks(name_filter: str = "", quick: bool = False) -> dict:
+    results = {}
+    for name, setup in benchmarks(quick):
+        if name_filter not in name:
+            continue
+        random.seed(0)
+        results[name] = measure(setup())
+        print(f"{name:45s} {format_ns(results[name]['ns_per_op']):>12s}")
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f}{unit}"
+    return f"{ns:.0f}ns"
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':45s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:45s} {'-':>12s} {format_ns(result['ns_per_op']):>12s}")
+            continue
+
+        change = result["ns_per_op"] / base["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:45s} {format_ns(base['ns_per_op']):>12s} "
+            f"{format_ns(result['ns_per_op']):>12s} {change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Consensus hot-path microbenchmarks")
+    parser.add_argument(
+        "--output", default=DEFAULT_OUTPUT, help="where to save results"
+    )
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="baseline JSON to compare"
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--filter", default="", help="only run matching benchmarks")
+    parser.add_argument("--quick", action="store_true", help="skip 100k validators")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.filter, args.quick)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}"
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import hashlib
+import time
+from typing import FrozenSet, Iterable
+
+import opcounts
+from instrumentation import timed
+from transaction import Transaction
+
+GENESIS_HASH = bytes(32)
+
+
+# Its own phase: calculate_hash, timed as "hash", calls it on a cold digest
+@timed("txns_digest")
+def transactions_digest(txns: Iterable[Transaction]) -> bytes:
+    data = b"".join(tx.to_bytes() for tx in txns)
+    opcounts.count_hash(len(data))
+    return hashlib.sha256(data).digest()
+
+
+class TransactionBatch(tuple):
+    """Transactions whose digest was computed ahead of time, off the block path.
+
+    A block built from a batch reuses the digest but still counts the hash
+    against itself, so operation counts match blocks built from a list.
+    """
+
+    def __new__(cls, txns: Iterable[Transaction]):
+        batch = super().__new__(cls, txns)
+        data = b"".join(tx.to_bytes() for tx in batch)
+        batch.digest = hashlib.sha256(data).digest()
+        batch.digest_bytes = len(data)
+        return batch
+
+
+def meets_difficulty(digest: bytes, difficulty: int) -> bool:
+    """True if the first `difficulty` hex digits of the digest are zero."""
+    return int.from_bytes(digest, "big") >> (256 - 4 * difficulty) == 0
+
+
+class BaseBlock:
+    """Slotted block with a memoized header hash.
+
+    Subclasses list their header fields in HEADER_FIELDS and serialize them in
+    header_bytes(). Assigning any header field drops the cached hash, so the
+    hash is only recomputed after the header actually changes.
+    """
+
+    __slots__ = ("txns", "previous_hash", "timestamp", "_hash", "_txns_digest")
+
+    HEADER_FIELDS: FrozenSet[str] = frozenset({"txns", "previous_hash", "timestamp"})
+    # Fields only needed while the block is produced; not pickled, and
+    # restored empty
+    TRANSIENT_FIELDS: FrozenSet[str] = frozenset()
+
+    def __init__(self, txns: Iterable[Transaction], previous_hash: bytes):
+        self.txns = txns if isinstance(txns, TransactionBatch) else tuple(txns)
+        self.previous_hash = previous_hash
+        self.timestamp = int(time.time())
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.HEADER_FIELDS:
+            object.__setattr__(self, "_hash", None)
+            if name == "txns":
+                object.__setattr__(self, "_txns_digest", None)
+
+    def __getstate__(self) -> dict:
+        state = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name not in self.TRANSIENT_FIELDS and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        # A batch would recompute its digest on unpickling; the digest is
+        # already memoized in _txns_digest
+        state["txns"] = tuple(state["txns"])
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        for name in self.TRANSIENT_FIELDS:
+            object.__setattr__(self, name, ())
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    @property
+    def txns_digest(self) -> bytes:
+        if self._txns_digest is None:
+            if isinstance(self.txns, TransactionBatch):
+                opcounts.count_hash(self.txns.digest_bytes)
+                digest = self.txns.digest
+            else:
+                digest = transactions_digest(self.txns)
+            object.__setattr__(self, "_txns_digest", digest)
+        return self._txns_digest
+
+    @property
+    def hash(self) -> bytes:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", self.calculate_hash())
+        return self._hash
+
+    @property
+    def hash_hex(self) -> str:
+        return self.hash.hex()
+
+    def header_bytes(self) -> bytes:
+        raise NotImplementedError
+
+    @timed("hash")
+    def calculate_hash(self) -> bytes:
+        header = self.header_bytes()
+        opcounts.count_hash(len(header))
+        return hashlib.sha256(header).digest()
+
+    def __repr__(self) -> str:
+        return f"Block (timestamp={self.timestamp}, hash={self.hash.hex()[:8]}, previous_hash={self.previous_hash.hex()[:8]}, num_txns={len(self.txns)})"
@@ -0,0 +1,413 @@
+"""Block storage behind every engine's `chain`.
+
+MemoryBlockStore keeps blocks in a list, as the engines always have.
+DiskBlockStore appends pickled blocks to a segment file and indexes them by
+height and by hash in memory-mapped files. Only the most recent blocks stay
+deserialized, in an LRU, so memory stays flat however long a run is, and the
+chain can be reopened for analysis after the process exits:
+
+    store = DiskBlockStore("runs/pow")
+    store[1234].txns, store.height_of(block_hash)
+
+Engines only use the methods both stores share (last, hash_at, recent,
+links_valid, replace_from, ...), so either can back any engine.
+
+OverlayBlockStore puts in-memory blocks on top of a read-only prefix of
+another store. Snapshots and forked branches (see snapshot) use it to share
+one honest prefix on disk while keeping their own blocks private. Pickling a
+DiskBlockStore therefore records only its directory and height; unpickling
+reopens the directory under an overlay.
+
+A store directory holds:
+    blocks.seg  pickled blocks, back to back
+    index.bin   header (magic, count), then one fixed-width record per height:
+                segment offset, length, txn count, hash, previous hash
+    hashes.bin  open-addressing hash table, one uint64 (height + 1) per slot
+"""
+
+import mmap
+import os
+import pickle
+import struct
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterator, Optional
+
+import numpy as np
+
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+HOT_BLOCKS = 256
+INITIAL_CAPACITY = 1024  # index records; doubled as needed
+INITIAL_TABLE_SLOTS = 2048  # kept at least twice the number of entries
+
+INDEX_MAGIC = b"BLKIDX01"
+INDEX_HEADER = struct.Struct("<8sQ")
+INDEX_RECORD = struct.Struct("<QII32s32s")
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("txns", "<u4"),
+        ("hash", "V32"),
+        ("previous_hash", "V32"),
+    ]
+)
+TABLE_SLOT = struct.Struct("<Q")
+
+
+class MemoryBlockStore(list):
+    """Every block in a list; the default."""
+
+    def last(self):
+        return self[-1]
+
+    def hash_at(self, height: int) -> bytes:
+        return self[height].hash
+
+    def previous_hash_at(self, height: int) -> bytes:
+        return self[height].previous_hash
+
+    def iter_hashes(self, start: int = 0) -> Iterator[bytes]:
+        return (block.hash for block in self[start:])
+
+    def height_of(self, block_hash: bytes) -> Optional[int]:
+        for height in range(len(self) - 1, -1, -1):
+            if self[height].hash == block_hash:
+                return height
+        return None
+
+    def recent(self, count: int) -> list:
+        return self[-count:] if count else []
+
+    def total_txns(self, count: Optional[int] = None) -> int:
+        """Transactions in the first `count` blocks (all by default)."""
+        return sum(len(block.txns) for block in self[:count])
+
+    def links_valid(self, count: Optional[int] = None) -> bool:
+        count = len(self) if count is None else count
+        return all(self[i].previous_hash == self[i - 1].hash for i in range(1, count))
+
+    def replace_from(self, height: int, blocks) -> None:
+        """Reorganize: drop the blocks from `height` on and append `blocks`."""
+        del self[height:]
+        self.extend(blocks)
+
+    def close(self) -> None:
+        pass
+
+
+class DiskBlockStore:
+    def __init__(self, directory: str, hot_blocks: int = HOT_BLOCKS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.hot_blocks = hot_blocks
+        self.hot: "OrderedDict[int, object]" = OrderedDict()
+
+        index_path = os.path.join(directory, "index.bin")
+        if not os.path.exists(index_path):
+            with open(index_path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+                f.truncate(INDEX_HEADER.size + INITIAL_CAPACITY * INDEX_RECORD.size)
+        self.index_file = open(index_path, "r+b")
+        self.index = mmap.mmap(self.index_file.fileno(), 0)
+        magic, self.count = INDEX_HEADER.unpack_from(self.index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path} is not a block index")
+
+        # Unbuffered, so reads never need a flush first
+        self.segment = open(os.path.join(directory, "blocks.seg"), "a+b", buffering=0)
+        # Bytes past the last indexed block are from an interrupted append
+        self.segment_size = self.end_offset(self.count)
+        self.segment.truncate(self.segment_size)
+
+        table_path = os.path.join(directory, "hashes.bin")
+        if not os.path.exists(table_path):
+            with open(table_path, "wb") as f:
+                f.truncate(INITIAL_TABLE_SLOTS * TABLE_SLOT.size)
+        self.table_file = open(table_path, "r+b")
+        self.table = mmap.mmap(self.table_file.fileno(), 0)
+        self.table_entries = int(
+            np.count_nonzero(np.frombuffer(self.table, dtype="<u8"))
+        )
+
+    @property
+    def capacity(self) -> int:
+        return (len(self.index) - INDEX_HEADER.size) // INDEX_RECORD.size
+
+    @property
+    def table_slots(self) -> int:
+        return len(self.table) // TABLE_SLOT.size
+
+    def record(self, height: int) -> tuple:
+        if not 0 <= height < self.count:
+            raise IndexError(height)
+        return INDEX_RECORD.unpack_from(
+            self.index, INDEX_HEADER.size + height * INDEX_RECORD.size
+        )
+
+    def end_offset(self, count: int) -> int:
+        if count == 0:
+            return 0
+        offset, length, _, _, _ = self.record(count - 1)
+        return offset + length
+
+    def __len__(self) -> int:
+        return self.count
+
+    def normalize(self, height: int) -> int:
+        return height + self.count if height < 0 else height
+
+    def load(self, height: int):
+        offset, length, _, _, _ = self.record(height)
+        return pickle.loads(os.pread(self.segment.fileno(), length, offset))
+
+    def __getitem__(self, height: int):
+        height = self.normalize(height)
+        block = self.hot.get(height)
+        if block is not None:
+            self.hot.move_to_end(height)
+            return block
+        block = self.load(height)
+        self.cache(height, block)
+        return block
+
+    def __iter__(self):
+        # Streams from the segment without churning the hot cache
+        for height in range(self.count):
+            block = self.hot.get(height)
+            yield block if block is not None else self.load(height)
+
+    def cache(self, height: int, block) -> None:
+        self.hot[height] = block
+        self.hot.move_to_end(height)
+        while len(self.hot) > self.hot_blocks:
+            self.hot.popitem(last=False)
+
+    def append(self, block) -> None:
+        data = pickle.dumps(block, PICKLE_PROTOCOL)
+        self.segment.write(data)
+        if self.count == self.capacity:
+            self.index = self.remap(self.index, self.index_file, 2 * len(self.index))
+        INDEX_RECORD.pack_into(
+            self.index,
+            INDEX_HEADER.size + self.count * INDEX_RECORD.size,
+            self.segment_size,
+            len(data),
+            len(block.txns),
+            block.hash,
+            block.previous_hash,
+        )
+        self.segment_size += len(data)
+        self.count += 1
+        INDEX_HEADER.pack_into(self.index, 0, INDEX_MAGIC, self.count)
+        self.insert_hash(block.hash, self.count - 1)
+        self.cache(self.count - 1, block)
+
+    @staticmethod
+    def remap(old: mmap.mmap, file, size: int) -> mmap.mmap:
+        old.close()
+        file.truncate(size)
+        return mmap.mmap(file.fileno(), 0)
+
+    def last(self):
+        return self[-1]
+
+    def hash_at(self, height: int) -> bytes:
+        return self.record(self.normalize(height))[3]
+
+    def previous_hash_at(self, height: int) -> bytes:
+        return self.record(self.normalize(height))[4]
+
+    def iter_hashes(self, start: int = 0) -> Iterator[bytes]:
+        return (self.hash_at(height) for height in range(start, self.count))
+
+    def recent(self, count: int) -> list:
+        return [
+            self[height] for height in range(max(0, self.count - count), self.count)
+        ]
+
+    def records(self, count: Optional[int] = None) -> np.ndarray:
+        """The first `count` index records as a structured array over the mmap.
+
+        Don't keep it around: the mmap can't be resized or closed while a
+        view of it exists.
+        """
+        count = self.count if count is None else min(count, self.count)
+        return np.frombuffer(
+            self.index, INDEX_DTYPE, count=count, offset=INDEX_HEADER.size
+        )
+
+    def total_txns(self, count: Optional[int] = None) -> int:
+        return int(self.records(count)["txns"].sum())
+
+    def links_valid(self, count: Optional[int] = None) -> bool:
+        records = self.records(count)
+        return bool(np.all(records["previous_hash"][1:] == records["hash"][:-1]))
+
+    def insert_hash(self, block_hash: bytes, height: int) -> None:
+        if 2 * (self.table_entries + 1) > self.table_slots:
+            self.rebuild_table(2 * self.table_slots)
+        mask = self.table_slots - 1
+        slot = int.from_bytes(block_hash[:8], "little") & mask
+        while TABLE_SLOT.unpack_from(self.table, slot * TABLE_SLOT.size)[0]:
+            slot = (slot + 1) & mask
+        TABLE_SLOT.pack_into(self.table, slot * TABLE_SLOT.size, height + 1)
+        self.table_entries += 1
+
+    def rebuild_table(self, slots: int) -> None:
+        """Re-insert every live block; also clears entries left by reorgs."""
+        self.table.close()
+        self.table_file.truncate(0)
+        self.table_file.truncate(slots * TABLE_SLOT.size)
+        self.table = mmap.mmap(self.table_file.fileno(), 0)
+        self.table_entries = 0
+        for height in range(self.count):
+            self.insert_hash(self.hash_at(height), height)
+
+    def height_of(self, block_hash: bytes) -> Optional[int]:
+        mask = self.table_slots - 1
+        slot = int.from_bytes(block_hash[:8], "little") & mask
+        while True:
+            value = TABLE_SLOT.unpack_from(self.table, slot * TABLE_SLOT.size)[0]
+            if value == 0:
+                return None
+            # Entries for blocks dropped by a reorg fail this check and are
+            # skipped until the next rebuild
+            height = value - 1
+            if height < self.count and self.hash_at(height) == block_hash:
+                return height
+            slot = (slot + 1) & mask
+
+    def replace_from(self, height: int, blocks) -> None:
+        """Reorganize: drop the blocks from `height` on and append `blocks`."""
+        if height < self.count:
+            self.segment_size = self.end_offset(height)
+            self.segment.truncate(self.segment_size)
+            self.count = height
+            INDEX_HEADER.pack_into(self.index, 0, INDEX_MAGIC, self.count)
+            for stale in [h for h in self.hot if h >= height]:
+                del self.hot[stale]
+        for block in blocks:
+            self.append(block)
+
+    def close(self) -> None:
+        self.index.flush()
+        self.table.flush()
+        self.index.close()
+        self.table.close()
+        self.index_file.close()
+        self.table_file.close()
+        self.segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __reduce__(self):
+        tip = self.hash_at(self.count - 1) if self.count else None
+        return open_overlay, (self.directory, self.count, tip)
+
+
+class OverlayBlockStore:
+    """The first `base_count` blocks of `base`, read-only, with more on top.
+
+    Appends and reorgs only touch the blocks on top; a reorg below the prefix
+    shortens the prefix instead of rewriting `base`.
+    """
+
+    def __init__(self, base, base_count: Optional[int] = None):
+        self.base = base
+        self.base_count = len(base) if base_count is None else base_count
+        self.top = MemoryBlockStore()
+
+    def __len__(self) -> int:
+        return self.base_count + len(self.top)
+
+    def normalize(self, height: int) -> int:
+        height = height + len(self) if height < 0 else height
+        if height < 0:
+            raise IndexError(height)
+        return height
+
+    def __getitem__(self, height: int):
+        height = self.normalize(height)
+        if height < self.base_count:
+            return self.base[height]
+        return self.top[height - self.base_count]
+
+    def __iter__(self):
+        yield from islice(self.base, self.base_count)
+        yield from self.top
+
+    def append(self, block) -> None:
+        self.top.append(block)
+
+    def last(self):
+        return self[-1]
+
+    def hash_at(self, height: int) -> bytes:
+        height = self.normalize(height)
+        if height < self.base_count:
+            return self.base.hash_at(height)
+        return self.top[height - self.base_count].hash
+
+    def previous_hash_at(self, height: int) -> bytes:
+        height = self.normalize(height)
+        if height < self.base_count:
+            return self.base.previous_hash_at(height)
+        return self.top[height - self.base_count].previous_hash
+
+    def iter_hashes(self, start: int = 0) -> Iterator[bytes]:
+        return (self.hash_at(height) for height in range(start, len(self)))
+
+    def height_of(self, block_hash: bytes) -> Optional[int]:
+        height = self.top.height_of(block_hash)
+        if height is not None:
+            return self.base_count + height
+        height = self.base.height_of(block_hash)
+        return height if height is not None and height < self.base_count else None
+
+    def recent(self, count: int) -> list:
+        return [self[height] for height in range(max(0, len(self) - count), len(self))]
+
+    def total_txns(self, count: Optional[int] = None) -> int:
+        count = len(self) if count is None else count
+        prefix = min(count, self.base_count)
+        return self.base.total_txns(prefix) + self.top.total_txns(count - prefix)
+
+    def links_valid(self, count: Optional[int] = None) -> bool:
+        count = len(self) if count is None else count
+        prefix = min(count, self.base_count)
+        joined = (
+            count <= prefix
+            or not prefix
+            or self.top[0].previous_hash == self.base.hash_at(prefix - 1)
+        )
+        return (
+            joined
+            and self.base.links_valid(prefix)
+            and self.top.links_valid(count - prefix)
+        )
+
+    def replace_from(self, height: int, blocks) -> None:
+        """Reorganize: drop the blocks from `height` on and append `blocks`."""
+        if height < self.base_count:
+            self.base_count = height
+            self.top.clear()
+        else:
+            del self.top[height - self.base_count :]
+        self.top.extend(blocks)
+
+    def close(self) -> None:
+        self.base.close()
+
+
+def open_overlay(directory: str, count: int, tip: Optional[bytes]):
+    """Reopen a pickled DiskBlockStore at the height it was pickled at."""
+    base = DiskBlockStore(directory)
+    if count > len(base) or (count and base.hash_at(count - 1) != tip):
+        base.close()
+        raise ValueError(f"{directory} no longer holds the chain it was saved with")
+    return OverlayBlockStore(base, count)
@@ -0,0 +1,258 @@
+"""Command-line entry point.
+
+    python cli.py run pow --entities 10 --blocks 20
+    python cli.py run pos --signed --verify-processes 8
+    python cli.py sweep [--adaptive ...]
+    python cli.py plot
+    python cli.py bench [--compare benchmarks/baseline.json ...]
+    python cli.py load --engine pos --rates 100 1000
+    python cli.py nodes algorand --entities 1000 --processes 8
+    python cli.py shard --engine pos --shards 1 2 4 8
+    python cli.py branch --engine pow --blocks 20 --branches 8 --save pow.snap
+    python cli.py execute --skews 0 1 2 --workers 4
+
+Each subcommand imports what it needs when it runs, so `run pow` never loads
+ecdsa, pandas or matplotlib.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+
+ENGINE_NAMES = ("pow", "pos", "algorand")
+
+
+def run_command(args) -> int:
+    from app import ENGINES, print_results, summarize_run
+    from cost_model import apply_cost_model
+
+    network = None
+    if args.topology:
+        network = {
+            "topology": args.topology,
+            "degree": args.degree,
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+        }
+
+    auth = None
+    if args.signed:
+        auth = {"wallets": args.wallets, "processes": args.verify_processes}
+
+    store = None
+    if args.store:
+        from block_store import DiskBlockStore
+
+        store = DiskBlockStore(args.store)
+
+    random.seed(args.seed)
+    run_result = asyncio.run(
+        ENGINES[args.engine](
+            args.entities,
+            args.blocks,
+            progress=not args.quiet,
+            network=network,
+            pipeline=args.pipeline,
+            store=store,
+            auth=auth,
+        )
+    )
+    result = summarize_run(run_result, args.entities, args.blocks)
+    if store is not None:
+        store.close()
+    print_results(apply_cost_model([result]))
+    for section in ("network", "pipeline", "authentication"):
+        if section in result:
+            from tabulate import tabulate
+
+            print(tabulate(result[section].items(), headers=[section, "value"]))
+    return 0
+
+
+def nodes_command(args) -> int:
+    from tabulate import tabulate
+
+    from app import print_results, summarize_run
+    from cost_model import apply_cost_model
+    from nodes import run_nodes
+
+    random.seed(args.seed)
+    run_result, traffic = asyncio.run(
+        run_nodes(
+            args.engine,
+            args.entities,
+            args.blocks,
+            processes=args.processes,
+            progress=not args.quiet,
+            seed=args.seed,
+        )
+    )
+    result = summarize_run(run_result, args.entities, args.blocks)
+    print_results(apply_cost_model([result]))
+    print(tabulate(traffic.items(), headers=["nodes", "value"]))
+    return 0
+
+
+def sweep_command(args) -> int:
+    if args.adaptive:
+        import adaptive
+
+        adaptive.main(args.args)
+    else:
+        import app
+
+        app.main()
+    return 0
+
+
+def plot_command(args) -> int:
+    from app import RESULTS_DIRECTORY
+    from cost_model import apply_cost_model
+    from plotting import plot
+    from results_store import ResultsStore
+
+    results = apply_cost_model(list(ResultsStore(RESULTS_DIRECTORY).iter_results()))
+    if not results:
+        print(f"No results in {RESULTS_DIRECTORY}/; run a sweep first")
+        return 1
+    rendered = plot(results, draft=args.draft, force=args.force)
+    print(f"Rendered {len(rendered)} figure(s); the rest were up to date")
+    return 0
+
+
+def bench_command(args) -> int:
+    import bench
+
+    return bench.main(args.args)
+
+
+def load_command(args) -> int:
+    import load
+
+    load.main(args.args)
+    return 0
+
+
+def shard_command(args) -> int:
+    import sharding
+
+    sharding.main(args.args)
+    return 0
+
+
+def branch_command(args) -> int:
+    import snapshot
+
+    snapshot.main(args.args)
+    return 0
+
+
+def execute_command(args) -> int:
+    import execution
+
+    execution.main(args.args)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Consensus mechanism simulator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="simulate one engine")
+    run_parser.add_argument("engine", choices=ENGINE_NAMES)
+    run_parser.add_argument("--entities", type=int, default=10)
+    run_parser.add_argument("--blocks", type=int, default=10)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--quiet", action="store_true", help="no progress bar")
+    run_parser.add_argument(
+        "--topology",
+        choices=("random", "ring", "full"),
+        help="send blocks and votes through a simulated gossip network",
+    )
+    run_parser.add_argument("--degree", type=int, default=8)
+    run_parser.add_argument(
+        "--latency", type=float, default=0.05, help="median link latency (s)"
+    )
+    run_parser.add_argument(
+        "--bandwidth", type=float, default=12.5e6, help="median link bytes/s"
+    )
+    run_parser.add_argument(
+        "--pipeline",
+        type=int,
+        default=0,
+        metavar="DEPTH",
+        help="prepare transactions and validate blocks alongside consensus",
+    )
+    run_parser.add_argument(
+        "--store",
+        metavar="DIR",
+        help="keep the chain on disk in DIR (reopened if it exists)",
+    )
+    run_parser.add_argument(
+        "--signed",
+        action="store_true",
+        help="sign transactions and verify them in the mempool, proposal and validation",
+    )
+    run_parser.add_argument(
+        "--wallets", type=int, default=1000, help="signing accounts (with --signed)"
+    )
+    run_parser.add_argument(
+        "--verify-processes",
+        type=int,
+        help="signature verification processes (default: one per core)",
+    )
+    run_parser.set_defaults(handler=run_command)
+
+    nodes_parser = subparsers.add_parser(
+        "nodes", help="simulate one engine with participants in node processes"
+    )
+    nodes_parser.add_argument("engine", choices=("pos", "algorand"))
+    nodes_parser.add_argument("--entities", type=int, default=1000)
+    nodes_parser.add_argument("--blocks", type=int, default=10)
+    nodes_parser.add_argument(
+        "--processes", type=int, help="node processes (default: one per core)"
+    )
+    nodes_parser.add_argument("--seed", type=int, default=0)
+    nodes_parser.add_argument("--quiet", action="store_true", help="no progress bar")
+    nodes_parser.set_defaults(handler=nodes_command)
+
+    sweep_parser = subparsers.add_parser("sweep", help="sweep every engine")
+    sweep_parser.add_argument(
+        "--adaptive", action="store_true", help="stop cells once estimates settle"
+    )
+    sweep_parser.set_defaults(handler=sweep_command, passthrough=True)
+
+    plot_parser = subparsers.add_parser("plot", help="plot the stored sweep")
+    plot_parser.add_argument(
+        "--draft", action="store_true", help="low DPI, rasterized layers"
+    )
+    plot_parser.add_argument(
+        "--force", action="store_true", help="re-render unchanged figures"
+    )
+    plot_parser.set_defaults(handler=plot_command)
+
+    # These keep their own options, as does the adaptive sweep; any arguments
+    # this parser doesn't know are passed through to them
+    for name, handler, help in (
+        ("bench", bench_command, "hot-path microbenchmarks"),
+        ("load", load_command, "sustained-load latency"),
+        ("shard", shard_command, "sharded throughput scaling"),
+        ("branch", branch_command, "fork attack branches from one run"),
+        ("execute", execute_command, "parallel execution against contention"),
+    ):
+        sub = subparsers.add_parser(name, help=help, add_help=False)
+        sub.set_defaults(handler=handler, passthrough=True)
+
+    args, extra = parser.parse_known_args(argv)
+    passthrough = getattr(args, "passthrough", False)
+    if args.command == "sweep":
+        passthrough = args.adaptive
+    if extra and not passthrough:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.args = extra
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Energy as a post-processing stage over operation counts.
+
+A model is any callable mapping a dict of per-block operation arrays (see
+opcounts.OPERATIONS) to a per-block energy array in kWh. apply_cost_model
+stacks the counts of a whole sweep and evaluates the model once.
+"""
+
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from opcounts import (
+    BYTES_HASHED,
+    MESSAGES,
+    OPERATIONS,
+    SHA256,
+    SIGNATURES,
+    VERIFICATIONS,
+)
+
+NETWORK_OVERHEAD_FACTOR = 1.1  # 10% additional energy for network overhead
+
+# kWh per operation (estimated for a ~15 W general-purpose core and NIC)
+DEFAULT_ENERGY_PER_OPERATION = {
+    SHA256: 4e-13,  # fixed cost per invocation
+    BYTES_HASHED: 8e-15,  # per input byte
+    SIGNATURES: 2e-10,  # ECDSA secp256k1 sign
+    VERIFICATIONS: 4e-10,  # ECDSA secp256k1 verify
+    MESSAGES: 5e-9,  # one broadcast
+}
+
+EnergyModel = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+
+class LinearEnergyModel:
+    def __init__(
+        self,
+        energy_per_operation: Dict[str, float] = None,
+        overhead_factor: float = NETWORK_OVERHEAD_FACTOR,
+    ):
+        energy_per_operation = energy_per_operation or DEFAULT_ENERGY_PER_OPERATION
+        self.weights = np.array(
+            [energy_per_operation.get(operation, 0.0) for operation in OPERATIONS]
+        )
+        self.overhead_factor = overhead_factor
+
+    def __call__(self, ops: Dict[str, np.ndarray]) -> np.ndarray:
+        counts = np.column_stack([ops[operation] for operation in OPERATIONS])
+        return counts @ self.weights * self.overhead_factor
+
+
+def apply_cost_model(
+    results: List[dict], model: EnergyModel = None
+) -> List[dict]:
+    """Fill energy, total_energy and avg_energy of every result from its ops."""
+    if not results:
+        return results
+    model = model or LinearEnergyModel()
+
+    # One evaluation over every block of the sweep, then split back per run
+    ops = {
+        operation: np.concatenate(
+            [np.asarray(result["ops"][operation], dtype=np.float64) for result in results]
+        )
+        for operation in OPERATIONS
+    }
+    energy = model(ops)
+    boundaries = np.cumsum([len(result["ops"][SHA256]) for result in results])[:-1]
+
+    for result, run_energy in zip(results, np.split(energy, boundaries)):
+        result["energy"] = run_energy
+        result["total_energy"] = float(run_energy.sum())
+        result["avg_energy"] = result["total_energy"] / result["num_blocks"]
+    return results
@@ -0,0 +1,457 @@
+"""Applying a block's transactions to account balances, serially or in parallel.
+
+execute_serial() is the reference: transactions run one after another against
+a dict of balances. ParallelExecutor follows Block-STM (Gelashvili et al.,
+2022): workers run transactions optimistically against a multi-version
+memory, where each account holds one version per transaction that wrote it.
+After a transaction runs, its read set is validated against the versions now
+visible. A stale read aborts it, its writes become estimates that later
+readers wait on, and it is re-executed. The committed state therefore always
+equals serial execution in block order; contention only costs re-executions.
+
+Contention comes from the workload: senders are drawn Zipf-distributed over a
+fixed set of accounts (skew 0 is uniform), so hot accounts are read and
+written by many transactions of the same block.
+
+    python execution.py --accounts 1000 --txns 1000 --skews 0 0.5 1 1.5 --workers 4
+
+Workers are threads, so under the GIL the wall-clock gain is bounded. The
+table also reports each block's critical path, the longest chain of
+transactions that touch a common account, which bounds the speedup any
+number of cores could reach.
+"""
+
+import argparse
+import bisect
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tabulate import tabulate
+
+from transaction import MAX_BLOCK_TXNS, Transaction
+
+DEFAULT_ACCOUNTS = 1000
+DEFAULT_SKEWS = (0.0, 0.5, 1.0, 1.5, 2.0)
+DEFAULT_WORKERS = 4
+DEFAULT_BLOCKS = 5
+INITIAL_BALANCE = 10_000.0
+
+# Scheduler task kinds and transaction statuses
+EXECUTE, VALIDATE = "execute", "validate"
+READY, EXECUTING, EXECUTED, ABORTING = range(4)
+
+ESTIMATE = object()  # placeholder for the writes of an aborted incarnation
+
+
+def transfer(read: Callable[[str], float], tx: Transaction) -> Optional[dict]:
+    """The ledger's transition function: the balances `tx` writes.
+
+    Returns None, writing nothing, when the sender can't cover amount and fee.
+    """
+    balance = read(tx.sender)
+    if balance < tx.amount + tx.fee:
+        return None
+    if tx.receiver == tx.sender:
+        return {tx.sender: balance - tx.fee}
+    return {
+        tx.sender: balance - tx.amount - tx.fee,
+        tx.receiver: read(tx.receiver) + tx.amount,
+    }
+
+
+def execute_serial(
+    balances: Dict[str, float], txns: List[Transaction]
+) -> Tuple[Dict[str, float], List[bool]]:
+    """Balances after `txns` and which of them applied; `balances` is unchanged."""
+    state = dict(balances)
+    applied = []
+    for tx in txns:
+        writes = transfer(lambda address: state.get(address, 0.0), tx)
+        if writes is not None:
+            state.update(writes)
+        applied.append(writes is not None)
+    return state, applied
+
+
+def critical_path(txns: List[Transaction]) -> int:
+    """Longest chain of transactions each sharing an account with the last."""
+    depth: Dict[str, int] = {}
+    longest = 0
+    for tx in txns:
+        level = 1 + max(depth.get(tx.sender, 0), depth.get(tx.receiver, 0))
+        depth[tx.sender] = depth[tx.receiver] = level
+        longest = max(longest, level)
+    return longest
+
+
+class ReadDependency(Exception):
+    """A read hit an estimate left by an aborted, lower transaction."""
+
+    def __init__(self, blocking: int):
+        super().__init__(blocking)
+        self.blocking = blocking
+
+
+class MultiVersionMemory:
+    def __init__(self, num_txns: int):
+        self.lock = threading.Lock()
+        # account -> {txn index: (incarnation, value) or ESTIMATE}, plus the
+        # written indices in order for the "highest below" lookup
+        self.versions: Dict[str, Dict[int, object]] = {}
+        self.writers: Dict[str, List[int]] = {}
+        self.written: List[frozenset] = [frozenset()] * num_txns
+        self.read_sets: List[list] = [[] for _ in range(num_txns)]
+
+    def read(self, address: str, txn: int):
+        """(version, value) from the highest transaction below `txn` to write
+        `address`; version None means it comes from the block's base state."""
+        with self.lock:
+            writers = self.writers.get(address)
+            if not writers:
+                return None, None
+            position = bisect.bisect_left(writers, txn)
+            if position == 0:
+                return None, None
+            writer = writers[position - 1]
+            entry = self.versions[address][writer]
+        if entry is ESTIMATE:
+            raise ReadDependency(writer)
+        incarnation, value = entry
+        return (writer, incarnation), value
+
+    def record(self, txn: int, incarnation: int, read_set: list, writes: dict) -> bool:
+        """Store one incarnation's reads and writes; True if it wrote an account
+        the previous incarnation didn't."""
+        with self.lock:
+            previous = self.written[txn]
+            for address in previous - writes.keys():
+                del self.versions[address][txn]
+                self.writers[address].remove(txn)
+            for address, value in writes.items():
+                versions = self.versions.setdefault(address, {})
+                if txn not in versions:
+                    bisect.insort(self.writers.setdefault(address, []), txn)
+                versions[txn] = (incarnation, value)
+            self.written[txn] = frozenset(writes)
+            self.read_sets[txn] = read_set
+            return not self.written[txn] <= previous
+
+    def convert_writes_to_estimates(self, txn: int) -> None:
+        with self.lock:
+            for address in self.written[txn]:
+                self.versions[address][txn] = ESTIMATE
+
+    def validate_read_set(self, txn: int) -> bool:
+        for address, version in self.read_sets[txn]:
+            try:
+                current, _ = self.read(address, txn)
+            except ReadDependency:
+                return False
+            if current != version:
+                return False
+        return True
+
+    def final_writes(self) -> Dict[str, float]:
+        return {
+            address: self.versions[address][writers[-1]][1]
+            for address, writers in self.writers.items()
+            if writers
+        }
+
+
+class Scheduler:
+    """Hands out execution and validation tasks, lowest transaction first.
+
+    One condition variable guards all of it; idle workers wait on it until a
+    finishing task lowers an index or the block is done.
+    """
+
+    def __init__(self, num_txns: int):
+        self.num_txns = num_txns
+        self.changed = threading.Condition()
+        self.execution_index = 0
+        self.validation_index = 0
+        self.active_tasks = 0
+        self.done = False
+        self.status = [[0, READY] for _ in range(num_txns)]  # [incarnation, status]
+        self.dependents: List[set] = [set() for _ in range(num_txns)]
+        self.executions = 0
+        self.validations = 0
+
+    def next_task(self) -> Optional[tuple]:
+        with self.changed:
+            while not self.done:
+                if self.validation_index < self.execution_index:
+                    txn = self.validation_index
+                    self.validation_index += 1
+                    incarnation, status = self.status[txn]
+                    if status == EXECUTED:
+                        self.active_tasks += 1
+                        self.validations += 1
+                        return VALIDATE, txn, incarnation
+                elif self.execution_index < self.num_txns:
+                    txn = self.execution_index
+                    self.execution_index += 1
+                    task = self.try_incarnate(txn)
+                    if task:
+                        self.active_tasks += 1
+                        return task
+                elif self.active_tasks == 0:
+                    self.done = True
+                    self.changed.notify_all()
+                else:
+                    self.changed.wait()
+            return None
+
+    def try_incarnate(self, txn: int) -> Optional[tuple]:
+        incarnation, status = self.status[txn]
+        if status != READY:
+            return None
+        self.status[txn][1] = EXECUTING
+        self.executions += 1
+        return EXECUTE, txn, incarnation
+
+    def set_ready(self, txn: int) -> None:
+        self.status[txn][0] += 1
+        self.status[txn][1] = READY
+
+    def add_dependency(self, txn: int, blocking: int) -> bool:
+        """Park `txn` until `blocking` re-executes; False if it already has."""
+        with self.changed:
+            if self.status[blocking][1] == EXECUTED:
+                return False
+            self.status[txn][1] = ABORTING
+            self.dependents[blocking].add(txn)
+            self.active_tasks -= 1
+            self.changed.notify_all()
+            return True
+
+    def finish_execution(self, txn: int, incarnation: int, wrote_new: bool):
+        with self.changed:
+            self.status[txn] = [incarnation, EXECUTED]
+            dependents, self.dependents[txn] = self.dependents[txn], set()
+            for dependent in dependents:
+                self.set_ready(dependent)
+            if dependents:
+                self.execution_index = min(self.execution_index, min(dependents))
+            task = None
+            if self.validation_index > txn:
+                if wrote_new:
+                    # Higher transactions may have missed the new account
+                    self.validation_index = txn
+                else:
+                    self.validations += 1
+                    task = VALIDATE, txn, incarnation
+            if task is None:
+                self.active_tasks -= 1
+            self.changed.notify_all()
+            return task
+
+    def try_validation_abort(self, txn: int, incarnation: int) -> bool:
+        with self.changed:
+            if self.status[txn] == [incarnation, EXECUTED]:
+                self.status[txn][1] = ABORTING
+                return True
+            return False
+
+    def finish_validation(self, txn: int, aborted: bool):
+        with self.changed:
+            task = None
+            if aborted:
+                self.set_ready(txn)
+                self.validation_index = min(self.validation_index, txn + 1)
+                if self.execution_index > txn:
+                    task = self.try_incarnate(txn)
+            if task is None:
+                self.active_tasks -= 1
+            self.changed.notify_all()
+            return task
+
+
+class ParallelExecutor:
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stm")
+        self.last_stats: Dict[str, int] = {}
+
+    def execute(
+        self, balances: Dict[str, float], txns: List[Transaction]
+    ) -> Tuple[Dict[str, float], List[bool]]:
+        """Same result as execute_serial(balances, txns)."""
+        memory = MultiVersionMemory(len(txns))
+        scheduler = Scheduler(len(txns))
+        applied = [False] * len(txns)
+
+        def read(txn: int, read_set: list, address: str) -> float:
+            version, value = memory.read(address, txn)
+            read_set.append((address, version))
+            return balances.get(address, 0.0) if version is None else value
+
+        def run(txn: int, incarnation: int):
+            while True:
+                read_set: list = []
+                try:
+                    writes = transfer(
+                        lambda address: read(txn, read_set, address), txns[txn]
+                    )
+                except ReadDependency as dependency:
+                    if scheduler.add_dependency(txn, dependency.blocking):
+                        return None
+                    continue  # the blocker finished meanwhile; read again
+                applied[txn] = writes is not None
+                wrote_new = memory.record(txn, incarnation, read_set, writes or {})
+                return scheduler.finish_execution(txn, incarnation, wrote_new)
+
+        def validate(txn: int, incarnation: int):
+            aborted = not memory.validate_read_set(
+                txn
+            ) and scheduler.try_validation_abort(txn, incarnation)
+            if aborted:
+                memory.convert_writes_to_estimates(txn)
+            return scheduler.finish_validation(txn, aborted)
+
+        def work() -> None:
+            task = None
+            while True:
+                if task is None:
+                    task = scheduler.next_task()
+                    if task is None:
+                        return
+                kind, txn, incarnation = task
+                task = (run if kind == EXECUTE else validate)(txn, incarnation)
+
+        for future in [self.pool.submit(work) for _ in range(self.workers)]:
+            future.result()
+
+        self.last_stats = {
+            "executions": scheduler.executions,
+            "validations": scheduler.validations,
+        }
+        state = dict(balances)
+        state.update(memory.final_writes())
+        return state, applied
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+
+def account_addresses(count: int) -> List[str]:
+    return [hashlib.sha256(f"account-{i}".encode()).hexdigest() for i in range(count)]
+
+
+def contended_transactions(
+    addresses: List[str], count: int, skew: float, rng=random
+) -> List[Transaction]:
+    """`count` transfers whose senders follow a Zipf law with exponent `skew`
+    over `addresses` (0 is uniform); receivers are uniform."""
+    cum_weights = list(
+        accumulate(1 / rank**skew for rank in range(1, len(addresses) + 1))
+    )
+    senders = rng.choices(addresses, cum_weights=cum_weights, k=count)
+    return [
+        Transaction(
+            sender, rng.choice(addresses), rng.uniform(1, 1000), rng.uniform(0.01, 0.1)
+        )
+        for sender in senders
+    ]
+
+
+def contention_sweep(
+    skews=DEFAULT_SKEWS,
+    num_accounts: int = DEFAULT_ACCOUNTS,
+    num_txns: int = MAX_BLOCK_TXNS,
+    workers: int = DEFAULT_WORKERS,
+    num_blocks: int = DEFAULT_BLOCKS,
+    seed: int = 0,
+) -> List[dict]:
+    addresses = account_addresses(num_accounts)
+    executor = ParallelExecutor(workers)
+    results = []
+    try:
+        for skew in skews:
+            rng = random.Random(seed)
+            serial_state = dict.fromkeys(addresses, INITIAL_BALANCE)
+            parallel_state = dict(serial_state)
+            serial_time = parallel_time = 0.0
+            executions = validations = paths = 0
+            matches = True
+            for _ in range(num_blocks):
+                txns = contended_transactions(addresses, num_txns, skew, rng)
+                paths += critical_path(txns)
+
+                start = time.perf_counter()
+                serial_state, serial_applied = execute_serial(serial_state, txns)
+                serial_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                parallel_state, parallel_applied = executor.execute(
+                    parallel_state, txns
+                )
+                parallel_time += time.perf_counter() - start
+
+                executions += executor.last_stats["executions"]
+                validations += executor.last_stats["validations"]
+                matches &= (
+                    parallel_state == serial_state
+                    and parallel_applied == serial_applied
+                )
+
+            total = num_txns * num_blocks
+            results.append(
+                {
+                    "skew": skew,
+                    "workers": workers,
+                    "serial_tps": total / serial_time,
+                    "parallel_tps": total / parallel_time,
+                    "executions_per_txn": executions / total,
+                    "validations_per_txn": validations / total,
+                    "critical_path": paths / num_blocks,
+                    "max_speedup": min(workers, num_txns * num_blocks / paths),
+                    "matches_serial": matches,
+                }
+            )
+    finally:
+        executor.close()
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Block-STM parallel execution against contention"
+    )
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS)
+    parser.add_argument(
+        "--txns", type=int, default=MAX_BLOCK_TXNS, help="transactions per block"
+    )
+    parser.add_argument(
+        "--skews",
+        type=float,
+        nargs="+",
+        default=list(DEFAULT_SKEWS),
+        help="Zipf exponents for senders (0 is uniform)",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--blocks", type=int, default=DEFAULT_BLOCKS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = contention_sweep(
+        args.skews, args.accounts, args.txns, args.workers, args.blocks, args.seed
+    )
+    columns = tuple(results[0]) if results else ()
+    print(
+        tabulate(
+            [[result[column] for column in columns] for result in results],
+            headers=columns,
+            floatfmt=".3f",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Per-phase timers for the consensus engines.
+
+Set CONSENSUS_INSTRUMENT=1 before the engines are imported to switch timing
+on. When it is off, `timed` returns the function unchanged and `phase`
+returns a shared no-op context manager, so the hot paths pay nothing.
+Live metrics (see metrics) need the timers too, so they switch them on.
+"""
+
+import functools
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from time import perf_counter_ns
+from typing import Dict, Iterator, List, Tuple
+
+import metrics
+
+ENABLED = os.environ.get("CONSENSUS_INSTRUMENT", "") not in ("", "0") or metrics.ENABLED
+
+# Log-linear buckets: exact below 8ns, then 4 sub-buckets per power of two
+SUB_BUCKETS = 4
+NUM_BUCKETS = 8 + (64 - 3) * SUB_BUCKETS
+
+
+def bucket_index(value: int) -> int:
+    if value < 8:
+        return max(0, value)
+    bits = value.bit_length()
+    top = value >> (bits - 3)  # 3 most significant bits, in [4, 7]
+    return 8 + (bits - 4) * SUB_BUCKETS + (top - 4)
+
+
+def bucket_midpoint(index: int) -> int:
+    if index < 8:
+        return index
+    bits = (index - 8) // SUB_BUCKETS + 4
+    top = (index - 8) % SUB_BUCKETS + 4
+    low = top << (bits - 3)
+    high = (top + 1) << (bits - 3)
+    return (low + high) // 2
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(max(bucket_midpoint(index), self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ns": self.total,
+            "p50_ns": self.percentile(0.5),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.max,
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_lock = threading.Lock()  # Algorand's sortition worker records from its own thread
+_deferred = threading.local()
+
+
+def record(name: str, elapsed_ns: int) -> None:
+    samples = getattr(_deferred, "samples", None)
+    if samples is not None:
+        samples.append((name, elapsed_ns))
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(elapsed_ns)
+    metrics.record_phase(name, elapsed_ns)
+
+
+@contextmanager
+def deferred_phases() -> Iterator[List[Tuple[str, int]]]:
+    """Collect this thread's samples in the yielded list, for replay_phases."""
+    samples = _deferred.samples = []
+    try:
+        yield samples
+    finally:
+        _deferred.samples = None
+
+
+def replay_phases(samples: List[Tuple[str, int]]) -> None:
+    for name, elapsed_ns in samples:
+        record(name, elapsed_ns)
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+
+
+def summary() -> Dict[str, dict]:
+    with _lock:
+        return {name: h.summary() for name, h in sorted(_histograms.items())}
+
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, perf_counter_ns() - self.start)
+        return False
+
+
+_NULL_PHASE = nullcontext()
+
+
+def _timed_phase(name: str) -> _Phase:
+    return _Phase(name)
+
+
+def _null_phase(name: str) -> nullcontext:
+    return _NULL_PHASE
+
+
+phase = _timed_phase if ENABLED else _null_phase
+
+
+def timed(name: str):
+    """Decorator recording every call of the function under `name`."""
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from ecdsa import SECP256k1, SigningKey, VerifyingKey
+
+SECRET_SIZE = 32  # bytes per SECP256k1 secret exponent
+PUBLIC_KEY_SIZE = 64  # bytes per raw (x || y) public key
+DEFAULT_CACHE_SIZE = 4096  # materialized SigningKey objects kept alive
+
+
+class KeyStore:
+    """Compact key material for many accounts.
+
+    Secrets are derived deterministically from a master seed and kept as raw
+    bytes in one contiguous buffer. Public keys are computed on first use and
+    cached the same way; ``ecdsa`` key objects only exist for the most
+    recently used accounts.
+    """
+
+    def __init__(
+        self,
+        master_seed: Optional[bytes] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        self.master_seed = master_seed if master_seed is not None else os.urandom(32)
+        self.cache_size = cache_size
+        self.secrets = bytearray()
+        self.public_keys = bytearray()
+        self.has_public_key = bytearray()
+        self.signing_keys: "OrderedDict[int, SigningKey]" = OrderedDict()
+        # Sortition may run on a worker thread while the round proceeds
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.has_public_key)
+
+    def __getstate__(self) -> dict:
+        # Key objects are rebuilt on use, and locks can't be pickled
+        state = self.__dict__.copy()
+        del state["signing_keys"], state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.signing_keys = OrderedDict()
+        self.lock = threading.RLock()
+
+    def derive_secret(self, index: int) -> bytes:
+        counter = 0
+        while True:
+            digest = hashlib.sha256(
+                self.master_seed + index.to_bytes(8, "big") + counter.to_bytes(4, "big")
+            ).digest()
+            # Reject the (astronomically rare) values outside [1, n - 1]
+            if 0 < int.from_bytes(digest, "big") < SECP256k1.order:
+                return digest
+            counter += 1
+
+    def allocate(self) -> int:
+        with self.lock:
+            index = len(self)
+            self.secrets += self.derive_secret(index)
+            self.public_keys += bytes(PUBLIC_KEY_SIZE)
+            self.has_public_key.append(0)
+            return index
+
+    def allocate_many(self, count: int) -> range:
+        start = len(self)
+        for _ in range(count):
+            self.allocate()
+        return range(start, start + count)
+
+    def secret(self, index: int) -> bytes:
+        return bytes(self.secrets[index * SECRET_SIZE : (index + 1) * SECRET_SIZE])
+
+    def signing_key(self, index: int) -> SigningKey:
+        with self.lock:
+            signing_key = self.signing_keys.get(index)
+            if signing_key is not None:
+                self.signing_keys.move_to_end(index)
+                return signing_key
+
+        signing_key = SigningKey.from_string(self.secret(index), curve=SECP256k1)
+
+        with self.lock:
+            if not self.has_public_key[index]:
+                self.store_public_key(index, signing_key.verifying_key.to_string())
+            self.signing_keys[index] = signing_key
+            if len(self.signing_keys) > self.cache_size:
+                self.signing_keys.popitem(last=False)
+        return signing_key
+
+    def store_public_key(self, index: int, public_key: bytes) -> None:
+        start = index * PUBLIC_KEY_SIZE
+        self.public_keys[start : start + PUBLIC_KEY_SIZE] = public_key
+        self.has_public_key[index] = 1
+
+    def public_key(self, index: int) -> bytes:
+        if not self.has_public_key[index]:
+            self.signing_key(index)
+        start = index * PUBLIC_KEY_SIZE
+        return bytes(self.public_keys[start : start + PUBLIC_KEY_SIZE])
+
+    def verifying_key(self, index: int) -> VerifyingKey:
+        with self.lock:
+            signing_key = self.signing_keys.get(index)
+        if signing_key is not None:
+            return signing_key.verifying_key
+        return VerifyingKey.from_string(self.public_key(index), curve=SECP256k1)
+
+
+_default_key_store: Optional[KeyStore] = None
+
+
+def default_key_store() -> KeyStore:
+    global _default_key_store
+    if _default_key_store is None:
+        _default_key_store = KeyStore()
+    return _default_key_store
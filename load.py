@@ -0,0 +1,251 @@
+"""Sustained-load mode: transactions arrive over time and wait to be included.
+
+    python load.py --engine pos --entities 10 --rates 100 1000 10000
+    python load.py --engine pow --trace arrivals.txt
+
+Arrivals follow a Poisson process at each given rate (or replay a trace file
+of submit times in seconds, one per line). The engine mines back to back from
+a FIFO mempool, and the simulated clock advances by each block's measured wall
+time, so latency reflects how fast the engine actually drains the backlog.
+"""
+
+import argparse
+import asyncio
+import inspect
+import random
+import time
+from collections import deque
+from typing import Iterator, List, Optional
+
+import numpy as np
+from tabulate import tabulate
+from tqdm import tqdm
+
+import metrics
+from app import ENGINE_FACTORIES
+from transaction import MAX_BLOCK_TXNS, random_transaction
+
+DEFAULT_RATES = (10, 100, 1000, 10000)
+DEFAULT_NUM_BLOCKS = 100
+PERCENTILES = (50, 95, 99)
+# Blocks a PoW transaction needs on top of it before it counts as final;
+# PoS finalizes on the 2/3 vote and Algorand on agreement, so depth 0
+FINALITY_DEPTH = {"pow": 6, "pos": 0, "algorand": 0}
+# Saturated once the backlog grows by more than this fraction of the arrival rate
+SATURATION_GROWTH = 0.05
+
+
+def poisson_arrivals(rate: float, rng: random.Random) -> Iterator[float]:
+    clock = 0.0
+    while True:
+        clock += rng.expovariate(rate)
+        yield clock
+
+
+def trace_arrivals(path: str) -> Iterator[float]:
+    """Submit times from a trace file, shifted so the first arrival is at 0."""
+    with open(path) as f:
+        times = sorted(float(line) for line in f if line.strip())
+    start = times[0] if times else 0.0
+    for submit_time in times:
+        yield submit_time - start
+
+
+def latency_percentiles(latencies, prefix: str) -> dict:
+    if len(latencies) == 0:
+        return {f"{prefix}_p{p}": float("nan") for p in PERCENTILES}
+    values = np.percentile(np.asarray(latencies), PERCENTILES)
+    return {f"{prefix}_p{p}": float(v) for p, v in zip(PERCENTILES, values)}
+
+
+def backlog_growth(clock: np.ndarray, backlog: np.ndarray) -> float:
+    """Backlog growth in txns per second over the second half of the run."""
+    half = len(clock) // 2
+    clock, backlog = clock[half:], backlog[half:]
+    if len(clock) < 2 or clock[-1] == clock[0]:
+        return 0.0
+    return float(np.polyfit(clock, backlog, 1)[0])
+
+
+async def run_load(
+    engine_name: str,
+    num_entities: int,
+    arrivals: Iterator[float],
+    num_blocks: int = DEFAULT_NUM_BLOCKS,
+    rate: Optional[float] = None,
+    progress: bool = True,
+) -> dict:
+    engine, _ = ENGINE_FACTORIES[engine_name](num_entities)
+    metrics.set_engine(engine_name)
+    depth = FINALITY_DEPTH[engine_name]
+
+    # Submit times only; transactions are built when a block takes them, so a
+    # saturated run doesn't hold millions of txn objects
+    mempool = deque()
+    next_arrival = next(arrivals, None)
+    clock = 0.0
+
+    inclusion = []
+    finality = []
+    unconfirmed = deque()  # submit times per block awaiting finality depth
+    block_clock = []
+    backlog = []
+    submitted = 0
+
+    pbar = tqdm(total=num_blocks, disable=not progress, desc=f"{engine_name} load")
+    for _ in range(num_blocks):
+        # Idle until something is waiting, then admit everything submitted so far
+        if not mempool and next_arrival is not None:
+            clock = max(clock, next_arrival)
+        while next_arrival is not None and next_arrival <= clock:
+            mempool.append(next_arrival)
+            submitted += 1
+            next_arrival = next(arrivals, None)
+        if not mempool:
+            break  # trace exhausted and drained
+
+        batch = [mempool.popleft() for _ in range(min(MAX_BLOCK_TXNS, len(mempool)))]
+        txns = [random_transaction() for _ in batch]
+
+        start = time.perf_counter()
+        block = engine.mine_block(txns)
+        if inspect.isawaitable(block):
+            block = await block
+        elapsed = time.perf_counter() - start
+        clock += elapsed
+
+        if block is None:
+            # Not included; put the batch back at the head of the queue
+            mempool.extendleft(reversed(batch))
+        else:
+            inclusion.extend(clock - submit_time for submit_time in batch)
+            unconfirmed.append(batch)
+            while len(unconfirmed) > depth:
+                finality.extend(clock - t for t in unconfirmed.popleft())
+            metrics.record_block(engine_name, len(engine.chain) - 1, elapsed, len(txns))
+
+        block_clock.append(clock)
+        backlog.append(len(mempool))
+        metrics.set_queue_depth(engine_name, len(mempool))
+        pbar.update(1)
+    pbar.close()
+
+    if hasattr(engine, "shutdown"):
+        engine.shutdown()
+
+    block_clock = np.asarray(block_clock)
+    backlog = np.asarray(backlog)
+    growth = backlog_growth(block_clock, backlog)
+    offered = rate if rate is not None else submitted / max(clock, 1e-9)
+
+    return {
+        "consensus": engine_name,
+        "num_miners": num_entities,
+        "rate": offered,
+        "blocks": len(block_clock),
+        "elapsed": clock,
+        "submitted": submitted,
+        "included": len(inclusion),
+        "finalized": len(finality),
+        "throughput": len(inclusion) / clock if clock else 0.0,
+        "final_backlog": int(backlog[-1]) if len(backlog) else 0,
+        "backlog_growth": growth,
+        "saturated": growth > SATURATION_GROWTH * offered,
+        **latency_percentiles(inclusion, "inclusion"),
+        **latency_percentiles(finality, "finality"),
+    }
+
+
+async def sweep_rates(
+    engine_name: str,
+    num_entities: int,
+    rates,
+    num_blocks: int = DEFAULT_NUM_BLOCKS,
+    seed: int = 0,
+    progress: bool = True,
+) -> List[dict]:
+    results = []
+    for rate in sorted(rates):
+        random.seed(seed)
+        results.append(
+            await run_load(
+                engine_name,
+                num_entities,
+                poisson_arrivals(rate, random.Random(seed)),
+                num_blocks,
+                rate=rate,
+                progress=progress,
+            )
+        )
+    return results
+
+
+def saturation_point(results: List[dict]) -> Optional[float]:
+    """Lowest offered rate at which the backlog grows without bound."""
+    saturated = [result["rate"] for result in results if result["saturated"]]
+    return min(saturated) if saturated else None
+
+
+def print_load_results(results: List[dict]) -> None:
+    headers = [
+        "Consensus",
+        "Rate (tx/s)",
+        "Throughput (tx/s)",
+        "Inclusion p50/p95/p99 (s)",
+        "Finality p50/p95/p99 (s)",
+        "Backlog",
+        "Saturated",
+    ]
+    rows = [
+        [
+            result["consensus"],
+            f"{result['rate']:.1f}",
+            f"{result['throughput']:.1f}",
+            "/".join(f"{result[f'inclusion_p{p}']:.3f}" for p in PERCENTILES),
+            "/".join(f"{result[f'finality_p{p}']:.3f}" for p in PERCENTILES),
+            result["final_backlog"],
+            "yes" if result["saturated"] else "no",
+        ]
+        for result in results
+    ]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Sustained-load latency benchmark")
+    parser.add_argument("--engine", choices=sorted(ENGINE_FACTORIES), default="pos")
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--blocks", type=int, default=DEFAULT_NUM_BLOCKS)
+    parser.add_argument(
+        "--rates", type=float, nargs="+", default=DEFAULT_RATES, help="tx/s"
+    )
+    parser.add_argument("--trace", help="replay submit times from this file instead")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if metrics.ENABLED:
+        metrics.start_server()
+    if args.trace:
+        random.seed(args.seed)
+        results = [
+            asyncio.run(
+                run_load(
+                    args.engine, args.entities, trace_arrivals(args.trace), args.blocks
+                )
+            )
+        ]
+    else:
+        results = asyncio.run(
+            sweep_rates(args.engine, args.entities, args.rates, args.blocks, args.seed)
+        )
+
+    print_load_results(results)
+    point = saturation_point(results)
+    if point is None:
+        print("No saturation within the tested rates")
+    else:
+        print(f"Saturation point: {point:.1f} tx/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Live simulation metrics in the Prometheus text exposition format.
+
+Set CONSENSUS_METRICS_PORT=<port> to serve http://127.0.0.1:<port>/metrics
+while a simulation runs. Sweep workers serve from the next free ports above
+it, so scrape the range. When the variable is unset the update functions
+are no-ops chosen at import time, like instrumentation's timers.
+"""
+
+import bisect
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+PORT = int(os.environ.get("CONSENSUS_METRICS_PORT") or 0)
+ENABLED = PORT > 0
+MAX_WORKER_PORTS = 256
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BLOCK_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (1e-5, 1e-4, 1e-3, 0.01, 0.1, 1.0, 10.0)
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.labels, label_values)} {value}"
+            for label_values, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *label_values, value: float) -> None:
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts (last is +Inf), sum, count]
+        self.values: Dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, *label_values, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = sorted(
+                (key, [list(s[0]), s[1], s[2]]) for key, s in self.values.items()
+            )
+        lines = []
+        for label_values, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = format_labels(
+                    self.labels + ("le",), label_values + (str(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+BLOCKS = REGISTRY.register(
+    Counter("consensus_blocks_total", "Blocks produced", ("engine",))
+)
+TRANSACTIONS = REGISTRY.register(
+    Counter("consensus_transactions_total", "Transactions included", ("engine",))
+)
+BLOCK_HEIGHT = REGISTRY.register(
+    Gauge("consensus_block_height", "Height of the latest block", ("engine",))
+)
+TPS = REGISTRY.register(
+    Gauge("consensus_tps", "Transactions per second of the latest block", ("engine",))
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("consensus_queue_depth", "Transactions waiting for inclusion", ("engine",))
+)
+BLOCK_TIME = REGISTRY.register(
+    Histogram(
+        "consensus_block_time_seconds",
+        "Wall time to produce a block",
+        ("engine",),
+        BLOCK_TIME_BUCKETS,
+    )
+)
+PHASE_TIME = REGISTRY.register(
+    Histogram(
+        "consensus_phase_seconds",
+        "Wall time per engine phase (sortition, vote, ...)",
+        ("engine", "phase"),
+        PHASE_BUCKETS,
+    )
+)
+SWEEP_JOBS = REGISTRY.register(
+    Counter("consensus_sweep_jobs_total", "Sweep jobs finished", ("source",))
+)
+SWEEP_IN_FLIGHT = REGISTRY.register(
+    Gauge("consensus_sweep_jobs_in_flight", "Sweep jobs submitted to workers")
+)
+
+# Phases are recorded deep inside the engines, which don't know their own name
+_current_engine = ""
+
+
+def _set_engine(engine: str) -> None:
+    global _current_engine
+    _current_engine = engine
+
+
+def _record_block(engine: str, height: int, seconds: float, num_txns: int) -> None:
+    BLOCKS.inc(engine)
+    TRANSACTIONS.inc(engine, amount=num_txns)
+    BLOCK_HEIGHT.set(engine, value=height)
+    TPS.set(engine, value=num_txns / seconds if seconds else 0.0)
+    BLOCK_TIME.observe(engine, value=seconds)
+
+
+def _record_phase(name: str, elapsed_ns: int) -> None:
+    PHASE_TIME.observe(_current_engine, name, value=elapsed_ns / 1e9)
+
+
+def _set_queue_depth(engine: str, depth: int) -> None:
+    QUEUE_DEPTH.set(engine, value=depth)
+
+
+def _ignore(*args, **kwargs) -> None:
+    pass
+
+
+set_engine = _set_engine if ENABLED else _ignore
+record_block = _record_block if ENABLED else _ignore
+record_phase = _record_phase if ENABLED else _ignore
+set_queue_depth = _set_queue_depth if ENABLED else _ignore
+
+
+_server = None
+_server_pid = None  # a forked child inherits _server but not its thread
+
+
+def start_server(port: int = PORT, attempts: int = 1) -> Optional[int]:
+    """Serve /metrics from a daemon thread on the first free port tried."""
+    global _server, _server_pid
+    if _server is not None:
+        if _server_pid == os.getpid():
+            return _server.server_address[1]
+        # Drop this process's copy of the parent's listening socket
+        _server.socket.close()
+        _server = None
+
+    # http.server pulls in email and html; only load it when serving
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    for candidate in range(port, port + attempts):
+        try:
+            _server = ThreadingHTTPServer(("127.0.0.1", candidate), MetricsHandler)
+        except OSError:
+            continue
+        _server_pid = os.getpid()
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return candidate
+    return None
+
+
+def start_worker_server() -> None:
+    """Process pool initializer: each worker serves on a port above PORT."""
+    start_server(PORT + 1, MAX_WORKER_PORTS)
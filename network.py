@@ -0,0 +1,250 @@
+"""Simulated gossip network between participants.
+
+Nodes sit on a configurable topology whose links each draw a latency and a
+bandwidth. A broadcast floods the network: every node relays a message to
+its other neighbours the first time it receives it and drops duplicates.
+Delivery is simulated with one heap of arrival events rather than a task per
+message, so a block reaching 10k nodes costs a few hundred milliseconds.
+
+Engines with a network attached send their blocks and votes through it and
+add the simulated propagation delay to each block's time.
+"""
+
+import heapq
+import random
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+TOPOLOGIES = ("random", "ring", "full")
+DEFAULT_DEGREE = 8
+DEFAULT_LATENCY = 0.05  # seconds, median one-way link latency
+DEFAULT_BANDWIDTH = 12.5e6  # bytes/s, median link bandwidth (100 Mbit/s)
+LINK_SIGMA = 0.5  # lognormal spread of latency and bandwidth across links
+RELAY_DELAY = 0.001  # seconds a node spends checking a message before relaying
+
+# Approximate wire sizes
+HEADER_BYTES = 80
+TXN_BYTES = 250
+VOTE_BYTES = 100
+
+
+def block_size(block) -> int:
+    return HEADER_BYTES + TXN_BYTES * len(block.txns)
+
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, fraction: float):
+    """Smallest value by which `fraction` of the total weight is covered."""
+    order = np.argsort(values)
+    covered = np.cumsum(weights[order])
+    index = np.searchsorted(covered, fraction * covered[-1])
+    return float(values[order][min(index, len(order) - 1)])
+
+
+class Propagation:
+    """Outcome of one broadcast from `origin`."""
+
+    def __init__(self, origin, arrival, return_time, hops):
+        self.origin = origin
+        self.arrival = arrival  # first-arrival time per node (inf if unreached)
+        # Time for a reply from each node to travel back along its arrival path
+        self.return_time = return_time
+        self.hops = hops  # links on each node's arrival path
+
+    def time_to_reach(self, fraction: float) -> float:
+        return float(np.quantile(self.arrival, fraction))
+
+
+class Network:
+    def __init__(
+        self,
+        num_nodes: int,
+        topology: str = "random",
+        degree: int = DEFAULT_DEGREE,
+        latency: float = DEFAULT_LATENCY,
+        bandwidth: float = DEFAULT_BANDWIDTH,
+        relay_delay: float = RELAY_DELAY,
+        seed: Optional[int] = None,
+    ):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown topology {topology!r}")
+        self.num_nodes = num_nodes
+        self.relay_delay = relay_delay
+        rng = np.random.default_rng(
+            seed if seed is not None else random.getrandbits(64)
+        )
+
+        # Undirected edges, then mirrored into a CSR adjacency so each node's
+        # neighbours and link properties are contiguous slices
+        src, dst = self.build_edges(topology, num_nodes, degree, rng)
+        link_latency = latency * rng.lognormal(0, LINK_SIGMA, len(src))
+        link_bandwidth = bandwidth * rng.lognormal(0, LINK_SIGMA, len(src))
+
+        src, dst = np.r_[src, dst], np.r_[dst, src]
+        order = np.argsort(src, kind="stable")
+        self.neighbors = dst[order]
+        self.latency = np.r_[link_latency, link_latency][order]
+        self.inverse_bandwidth = 1 / np.r_[link_bandwidth, link_bandwidth][order]
+        self.offsets = np.searchsorted(src[order], np.arange(num_nodes + 1))
+
+        self.participant_nodes: Dict[int, int] = {}
+        self.bytes_sent = 0
+        self.messages = 0
+        self.duplicates = 0
+        self.arrivals: Dict[str, List[np.ndarray]] = {}
+        self.delay = 0.0  # simulated seconds not yet claimed by pop_delay
+
+    @staticmethod
+    def build_edges(topology: str, num_nodes: int, degree: int, rng):
+        nodes = np.arange(num_nodes)
+        if topology == "full":
+            src, dst = np.triu_indices(num_nodes, k=1)
+            return src, dst
+
+        # A ring keeps every topology connected
+        src, dst = nodes, (nodes + 1) % num_nodes
+        if topology == "random" and num_nodes > 2:
+            extra = max(0, degree // 2 - 1)
+            random_src = np.repeat(nodes, extra)
+            # Offsets in [1, n) never pick the node itself
+            random_dst = (random_src + rng.integers(1, num_nodes, len(random_src))) % (
+                num_nodes
+            )
+            src, dst = np.r_[src, random_src], np.r_[dst, random_dst]
+
+        edges = np.unique(np.sort(np.column_stack([src, dst]), axis=1), axis=0)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        return edges[:, 0], edges[:, 1]
+
+    @classmethod
+    def for_participants(cls, participants: Sequence, **config) -> "Network":
+        """One node per participant, in the order of `participants`."""
+        network = cls(len(participants), **config)
+        network.participant_nodes = {id(p): i for i, p in enumerate(participants)}
+        return network
+
+    def node(self, participant) -> int:
+        return self.participant_nodes[id(participant)]
+
+    def broadcast(self, origin: int, size: int, kind: str) -> Propagation:
+        n = self.num_nodes
+        arrival = np.full(n, np.inf)
+        path_latency = np.zeros(n)
+        path_inverse_bandwidth = np.zeros(n)
+        hops = np.zeros(n, dtype=np.int64)
+        delivered = np.zeros(n, dtype=bool)
+
+        # (arrival time, node, sender, path latency, path 1/bandwidth, hops)
+        events = [(0.0, origin, -1, 0.0, 0.0, 0)]
+        while events:
+            time, node, sender, latency, inverse_bandwidth, hop = heapq.heappop(events)
+            if delivered[node]:
+                self.duplicates += 1
+                continue
+            delivered[node] = True
+            arrival[node] = time
+            path_latency[node] = latency
+            path_inverse_bandwidth[node] = inverse_bandwidth
+            hops[node] = hop
+
+            start, end = self.offsets[node], self.offsets[node + 1]
+            neighbors = self.neighbors[start:end]
+            relay = neighbors != sender
+            self.messages += int(relay.sum())
+            self.bytes_sent += size * int(relay.sum())
+
+            # Only undelivered neighbours need an event; copies sent to nodes
+            # that already have the message are counted as duplicates here
+            pending = relay & ~delivered[neighbors]
+            self.duplicates += int(relay.sum() - pending.sum())
+            link_latency = self.latency[start:end][pending]
+            link_inverse_bandwidth = self.inverse_bandwidth[start:end][pending]
+            arrivals = (
+                time + self.relay_delay + link_latency + size * link_inverse_bandwidth
+            )
+            for neighbor, arrive, hop_latency, hop_inverse_bandwidth in zip(
+                neighbors[pending].tolist(),
+                arrivals.tolist(),
+                link_latency.tolist(),
+                link_inverse_bandwidth.tolist(),
+            ):
+                heapq.heappush(
+                    events,
+                    (
+                        arrive,
+                        neighbor,
+                        node,
+                        latency + hop_latency + self.relay_delay,
+                        inverse_bandwidth + hop_inverse_bandwidth,
+                        hop + 1,
+                    ),
+                )
+
+        self.arrivals.setdefault(kind, []).append(arrival)
+        return Propagation(
+            origin, arrival, path_latency + VOTE_BYTES * path_inverse_bandwidth, hops
+        )
+
+    def propagate_block(self, origin: int, block, quorum: float) -> float:
+        """Broadcast a block; delay until `quorum` of all nodes have it."""
+        propagation = self.broadcast(origin, block_size(block), "block")
+        delay = propagation.time_to_reach(quorum)
+        self.delay += delay
+        return delay
+
+    def vote_round(
+        self,
+        origin: int,
+        block,
+        voters: Sequence[int],
+        weights: Sequence[float],
+        threshold: float,
+        steps: int = 1,
+    ) -> float:
+        """Broadcast a block and collect votes on it back at the origin.
+
+        Each voter votes once the block reaches it, and each of its `steps`
+        vote messages travels back along the path the block arrived on. The
+        delay lasts until votes carrying `threshold` of the voters' weight
+        are in.
+        """
+        propagation = self.broadcast(origin, block_size(block), "block")
+        voters = np.asarray(voters, dtype=np.int64)
+        if len(voters) == 0:
+            return 0.0
+        vote_times = (
+            propagation.arrival[voters] + steps * propagation.return_time[voters]
+        )
+        self.arrivals.setdefault("vote", []).append(vote_times)
+        # Votes are relayed hop by hop back to the origin
+        vote_hops = steps * int(propagation.hops[voters].sum())
+        self.messages += vote_hops
+        self.bytes_sent += VOTE_BYTES * vote_hops
+
+        delay = weighted_quantile(
+            vote_times, np.asarray(weights, dtype=np.float64), threshold
+        )
+        self.delay += delay
+        return delay
+
+    def pop_delay(self) -> float:
+        """Simulated propagation delay accumulated since the last call."""
+        delay, self.delay = self.delay, 0.0
+        return delay
+
+    def summary(self) -> dict:
+        summary = {
+            "nodes": self.num_nodes,
+            "links": len(self.neighbors) // 2,
+            "bytes_sent": self.bytes_sent,
+            "messages": self.messages,
+            "duplicates": self.duplicates,
+        }
+        for kind, arrays in sorted(self.arrivals.items()):
+            times = np.concatenate(arrays)
+            times = times[np.isfinite(times)]
+            for percentile in (50, 90, 99):
+                summary[f"{kind}_p{percentile}"] = (
+                    float(np.percentile(times, percentile)) if len(times) else 0.0
+                )
+        return summary
@@ -0,0 +1,610 @@
+"""Multi-process node simulation.
+
+Participants are split into contiguous groups, one group per node process.
+Nodes talk to a coordinator (the calling process) over multiprocessing
+queues, and every message crosses as explicitly pickled bytes. A block is
+serialized once per broadcast and decoded, re-hashed and checked by every
+node, so encoding and decoding costs show up the way they would on a real
+network.
+
+The coordinator keeps the authoritative engine (chain, stakes, rewards and
+the validator set) and drives the rounds. For each phase it sends a request
+to the nodes and then waits for their replies until ROUND_TIMEOUT. A node
+that misses the deadline simply doesn't count for that phase. The work done
+per participant runs in the nodes and spreads over every core: PoS votes,
+and Algorand's VRF sortition, proposals, proposal checks and votes.
+
+    python cli.py nodes algorand --entities 1000 --processes 8
+"""
+
+import hashlib
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+import opcounts
+from transaction import Transaction, generate_transactions
+
+ROUND_TIMEOUT = 30.0  # seconds the coordinator waits for a phase's replies
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def txn_records(txns) -> List[tuple]:
+    return [(tx.sender, tx.receiver, tx.amount, tx.fee) for tx in txns]
+
+
+def txns_from_records(records) -> List[Transaction]:
+    return [Transaction(*record) for record in records]
+
+
+def encode_pos_block(block) -> bytes:
+    return pickle.dumps(
+        (
+            block.validator,
+            block.previous_hash,
+            block.timestamp,
+            txn_records(block.txns),
+            block.hash,
+        ),
+        PICKLE_PROTOCOL,
+    )
+
+
+def decode_pos_block(data: bytes):
+    from PoS import Block
+
+    validator, previous_hash, timestamp, txns, claimed_hash = pickle.loads(data)
+    block = Block(validator, txns_from_records(txns), previous_hash)
+    block.timestamp = timestamp
+    return block, claimed_hash
+
+
+def encode_algorand_block(block) -> bytes:
+    return pickle.dumps(
+        (
+            block.previous_hash,
+            block.timestamp,
+            block.vrf_proof,
+            block.proposer_key,
+            txn_records(block.txns),
+            block.hash,
+        ),
+        PICKLE_PROTOCOL,
+    )
+
+
+def decode_algorand_block(data: bytes):
+    from Algorand import Block
+
+    previous_hash, timestamp, vrf_proof, proposer_key, txns, claimed_hash = (
+        pickle.loads(data)
+    )
+    block = Block(txns_from_records(txns), previous_hash, vrf_proof, proposer_key)
+    block.timestamp = timestamp
+    return block, claimed_hash
+
+
+class Codec:
+    """Pickles messages and keeps count of the bytes and time it costs."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.encode_ns = 0
+        self.decode_ns = 0
+
+    def encode(self, message) -> bytes:
+        start = time.perf_counter_ns()
+        data = pickle.dumps(message, PICKLE_PROTOCOL)
+        self.encode_ns += time.perf_counter_ns() - start
+        self.bytes_sent += len(data)
+        self.messages_sent += 1
+        return data
+
+    def decode(self, data: bytes):
+        start = time.perf_counter_ns()
+        message = pickle.loads(data)
+        self.decode_ns += time.perf_counter_ns() - start
+        self.bytes_received += len(data)
+        self.messages_received += 1
+        return message
+
+    def encode_block(self, encoder, block) -> bytes:
+        start = time.perf_counter_ns()
+        data = encoder(block)
+        self.encode_ns += time.perf_counter_ns() - start
+        return data
+
+    def decode_block(self, decoder, data: bytes):
+        """Decode a block and recompute its hash; None if it doesn't match."""
+        start = time.perf_counter_ns()
+        block, claimed_hash = decoder(data)
+        self.decode_ns += time.perf_counter_ns() - start
+        return block if block.hash == claimed_hash else None
+
+    def summary(self) -> dict:
+        return {
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "messages_sent": self.messages_sent,
+            "messages_received": self.messages_received,
+            "encode_s": self.encode_ns / 1e9,
+            "decode_s": self.decode_ns / 1e9,
+        }
+
+
+class PoSNode:
+    """Validators [start, end) of a PoS network."""
+
+    def __init__(self, start: int, end: int, config: dict):
+        self.start = start
+        self.addresses = config["addresses"][start:end]
+        self.vote_probability = config["vote_probability"]
+
+    def on_propose(self, codec: Codec, payload):
+        from PoS import Block
+
+        index, previous_hash, txns = payload
+        block = Block(
+            self.addresses[index - self.start], txns_from_records(txns), previous_hash
+        )
+        return codec.encode_block(encode_pos_block, block)
+
+    def on_vote(self, codec: Codec, payload) -> List[int]:
+        block_data, previous_hash, active = payload
+        block = codec.decode_block(decode_pos_block, block_data)
+        if block is None or not block.is_valid(previous_hash):
+            return []
+        return [
+            self.start + i
+            for i, is_active in enumerate(active)
+            if is_active and random.random() < self.vote_probability
+        ]
+
+
+class AlgorandNode:
+    """Accounts [start, end) of an Algorand network.
+
+    Keys come from the coordinator's master seed, so a node derives the same
+    keys for its accounts without any secrets crossing the queues.
+    """
+
+    def __init__(self, start: int, end: int, config: dict):
+        from Algorand import Account
+        from keystore import KeyStore
+
+        key_store = KeyStore(master_seed=config["master_seed"])
+        key_store.allocate_many(start)
+        self.start = start
+        self.accounts = [Account(0, key_store) for _ in range(start, end)]
+        self.certify_probability = config["certify_probability"]
+
+    def account(self, index: int):
+        return self.accounts[index - self.start]
+
+    def on_sortition(self, codec: Codec, payload) -> Tuple[List[int], List[int]]:
+        """Eligible proposers and committee members among this node's accounts."""
+        seed, stakes, total_stake, proposer_threshold, committee_threshold = payload
+        proposers, committee = [], []
+        for i, (account, stake) in enumerate(zip(self.accounts, stakes)):
+            account.stake = stake
+            weight = stake / total_stake
+            for suffix, threshold, eligible in (
+                (b"proposer", proposer_threshold, proposers),
+                (b"committee", committee_threshold, committee),
+            ):
+                signature, _ = account.prove(seed + suffix)
+                if int(signature, 16) / 2**256 < weight * threshold:
+                    eligible.append(self.start + i)
+        return proposers, committee
+
+    def on_propose(self, codec: Codec, payload) -> List[bytes]:
+        from Algorand import Block
+
+        indices, previous_hash, records = payload
+        txns = txns_from_records(records)
+        blocks = []
+        for index in indices:
+            account = self.account(index)
+            vrf_proof, _ = account.prove(previous_hash)
+            block = Block(txns, previous_hash, vrf_proof, account.public_key)
+            blocks.append(codec.encode_block(encode_algorand_block, block))
+        return blocks
+
+    def on_vote(self, codec: Codec, payload) -> List[Tuple[int, bytes]]:
+        """Soft votes from this node's committee seats for valid proposals."""
+        proposals, previous_hash, seats = payload
+        blocks = []
+        for data in proposals:
+            block = codec.decode_block(decode_algorand_block, data)
+            if block is None or block.previous_hash != previous_hash:
+                continue
+            if self.accounts[0].verify(
+                block.previous_hash, block.vrf_proof, block.proposer_key
+            ):
+                blocks.append(block)
+        if not blocks:
+            return []
+
+        votes = []
+        for index in seats:
+            stake = str(self.account(index).stake).encode()
+            # Same choice on every node; Python's hash() is salted per process
+            chosen = max(blocks, key=lambda b: hashlib.sha256(b.hash + stake).digest())
+            votes.append((index, chosen.hash))
+        return votes
+
+    def on_certify(self, codec: Codec, payload) -> List[int]:
+        return [
+            index for index in payload if random.random() < self.certify_probability
+        ]
+
+
+def node_main(node_type, node_id, start, end, config, inbox, outbox) -> None:
+    """Node process: answer coordinator requests until a None arrives.
+
+    `node_type` is built with (start, end, config) and handles each request
+    kind in an on_<kind>(codec, payload) method; an optional close() runs
+    on shutdown.
+    """
+    random.seed(config["seed"] * 1_000_003 + node_id)
+    node = node_type(start, end, config)
+    codec = Codec()
+    while True:
+        data = inbox.get()
+        if data is None:
+            break
+        round_number, kind, payload = codec.decode(data)
+        ops_before = opcounts.snapshot()
+        reply = getattr(node, "on_" + kind)(codec, payload)
+        ops = opcounts.since(ops_before)
+        outbox.put(codec.encode((node_id, round_number, kind, reply, ops)))
+    if hasattr(node, "close"):
+        node.close()
+    outbox.put(codec.encode((node_id, None, "stats", codec.summary(), None)))
+
+
+def split_groups(num_participants: int, num_nodes: int) -> List[Tuple[int, int]]:
+    """Contiguous [start, end) ranges of near-equal size."""
+    num_nodes = max(1, min(num_nodes, num_participants))
+    bounds = [num_participants * i // num_nodes for i in range(num_nodes + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+class NodeCluster:
+    """Node processes plus the coordinator's side of their queues."""
+
+    def __init__(
+        self,
+        node_type: type,
+        num_participants: int,
+        config: dict,
+        processes: Optional[int] = None,
+        timeout: float = ROUND_TIMEOUT,
+    ):
+        self.groups = split_groups(num_participants, processes or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.codec = Codec()
+        self.timeouts = 0
+        self.node_stats: List[dict] = []
+        self.outbox = multiprocessing.Queue()
+        self.inboxes = []
+        self.processes = []
+        for node_id, (start, end) in enumerate(self.groups):
+            inbox = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=node_main,
+                args=(node_type, node_id, start, end, config, inbox, self.outbox),
+                daemon=True,
+            )
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+    def node_of(self, index: int) -> int:
+        for node_id, (start, end) in enumerate(self.groups):
+            if start <= index < end:
+                return node_id
+        raise IndexError(index)
+
+    def request(self, round_number: int, kind: str, payloads: Dict[int, object]):
+        """Send one request per node and collect replies until the deadline."""
+        for node_id, payload in payloads.items():
+            self.inboxes[node_id].put(self.codec.encode((round_number, kind, payload)))
+
+        replies = {}
+        deadline = time.monotonic() + self.timeout
+        while len(replies) < len(payloads):
+            remaining = deadline - time.monotonic()
+            try:
+                data = self.outbox.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                self.timeouts += len(payloads) - len(replies)
+                break
+            node_id, reply_round, reply_kind, reply, ops = self.codec.decode(data)
+            # Late answers to an earlier phase are dropped
+            if (reply_round, reply_kind) != (round_number, kind):
+                continue
+            for operation, amount in ops.items():
+                opcounts.count(operation, amount)
+            replies[node_id] = reply
+        return replies
+
+    def broadcast(self, round_number: int, kind: str, payload):
+        return self.request(
+            round_number,
+            kind,
+            {node_id: payload for node_id in range(len(self.groups))},
+        )
+
+    def close(self) -> None:
+        for inbox in self.inboxes:
+            inbox.put(None)
+        # Each node answers the shutdown with its own codec counters
+        deadline = time.monotonic() + self.timeout
+        while len(self.node_stats) < len(self.processes):
+            try:
+                data = self.outbox.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            _, _, kind, reply, _ = self.codec.decode(data)
+            if kind == "stats":
+                self.node_stats.append(reply)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def summary(self) -> dict:
+        summary = {"nodes": len(self.groups), "timeouts": self.timeouts}
+        for key, value in self.codec.summary().items():
+            summary[f"coordinator_{key}"] = value
+        for key in ("bytes_sent", "encode_s", "decode_s"):
+            summary[f"node_{key}"] = sum(stats[key] for stats in self.node_stats)
+        return summary
+
+
+def pos_round(cluster: NodeCluster, pos, validators, txns, round_number: int):
+    """One PoS slot: the proposer's node builds the block, every node votes.
+
+    Nodes hold validators by their position in `validators`, the start-up
+    order, which the epoch logic's re-sorting of pos.validators leaves alone.
+    """
+    pos.epoch_based_reconfiguration()
+    proposer = pos.select_validator()
+    if proposer is None:
+        return None
+    proposer_index = validators.index(proposer)
+    previous_hash = pos.get_last_block().hash
+
+    replies = cluster.request(
+        round_number,
+        "propose",
+        {
+            cluster.node_of(proposer_index): (
+                proposer_index,
+                previous_hash,
+                txns,
+            )
+        },
+    )
+    if not replies:
+        proposer.consecutive_misses += 1
+        return None
+    block_data = next(iter(replies.values()))
+    opcounts.count(opcounts.MESSAGES)
+
+    active = [validator.is_active for validator in validators]
+    replies = cluster.request(
+        round_number,
+        "vote",
+        {
+            node_id: (block_data, previous_hash, active[start:end])
+            for node_id, (start, end) in enumerate(cluster.groups)
+        },
+    )
+    block = cluster.codec.decode_block(decode_pos_block, block_data)
+    voters = [validators[index] for votes in replies.values() for index in votes]
+    block.votes = tuple((validator, validator.stake) for validator in voters)
+    opcounts.count(opcounts.MESSAGES, len(voters))
+
+    total_votes = sum(stake for _, stake in block.votes)
+    if total_votes / pos.total_stake < pos.consensus_threshold:
+        return None
+    pos.add_block(block)
+    pos.distribute_rewards(proposer, block)
+    proposer.consecutive_misses = 0
+    return block
+
+
+def select_seats(eligible: List, accounts: List, size: int) -> List:
+    """Pad or trim sortition winners to `size`, as Algorand.select_accounts does."""
+    if len(eligible) < size:
+        eligible = eligible + random.choices(
+            accounts, weights=[a.stake for a in accounts], k=size - len(eligible)
+        )
+    if len(eligible) > size:
+        eligible = random.sample(eligible, size)
+    return eligible
+
+
+def algorand_round(cluster: NodeCluster, algorand, accounts, txns, round_number: int):
+    """One Algorand round: sortition, proposals, soft vote and certify vote."""
+    index_of = {id(account): i for i, account in enumerate(accounts)}
+    seed = algorand.round_seed(algorand.get_new_block_index(), algorand.current_round)
+    stakes = [account.stake for account in accounts]
+    total_stake = sum(stakes)
+
+    replies = cluster.request(
+        round_number,
+        "sortition",
+        {
+            node_id: (
+                seed,
+                stakes[start:end],
+                total_stake,
+                algorand.proposer_threshold,
+                algorand.committee_threshold,
+            )
+            for node_id, (start, end) in enumerate(cluster.groups)
+        },
+    )
+    proposers = select_seats(
+        [accounts[i] for reply in replies.values() for i in reply[0]],
+        accounts,
+        algorand.proposers_size,
+    )
+    committee = select_seats(
+        [accounts[i] for reply in replies.values() for i in reply[1]],
+        accounts,
+        algorand.committee_size,
+    )
+
+    # Proposals are built by the nodes that hold the proposers' keys
+    previous_hash = algorand.get_last_block().hash
+    by_node: Dict[int, List[int]] = {}
+    for proposer in proposers:
+        index = index_of[id(proposer)]
+        by_node.setdefault(cluster.node_of(index), []).append(index)
+    replies = cluster.request(
+        round_number,
+        "propose",
+        {
+            node_id: (indices, previous_hash, txns)
+            for node_id, indices in by_node.items()
+        },
+    )
+    proposals = [data for blocks in replies.values() for data in blocks]
+    opcounts.count(opcounts.MESSAGES, len(proposals))
+    algorand.current_round += 1
+    if not proposals:
+        return None
+
+    # Every node checks the proposals; committee seats vote where they live
+    seats: Dict[int, List[int]] = {
+        node_id: [] for node_id in range(len(cluster.groups))
+    }
+    for member in committee:
+        index = index_of[id(member)]
+        seats[cluster.node_of(index)].append(index)
+    replies = cluster.request(
+        round_number,
+        "vote",
+        {node_id: (proposals, previous_hash, seats[node_id]) for node_id in seats},
+    )
+    soft_votes: Dict[bytes, float] = {}
+    for votes in replies.values():
+        for index, block_hash in votes:
+            soft_votes[block_hash] = soft_votes.get(block_hash, 0) + stakes[index]
+    opcounts.count(opcounts.MESSAGES, 2 * len(committee))
+    if not soft_votes:
+        return None
+    winner_hash = max(soft_votes, key=soft_votes.get)
+
+    replies = cluster.request(round_number, "certify", seats)
+    certify_stake = sum(
+        stakes[index] for certified in replies.values() for index in certified
+    )
+    if certify_stake <= sum(member.stake for member in committee) * 2 / 3:
+        return None
+
+    decoded = (
+        cluster.codec.decode_block(decode_algorand_block, data) for data in proposals
+    )
+    winner = next(block for block in decoded if block and block.hash == winner_hash)
+    algorand.add_block(winner)
+    algorand.distribute_rewards(winner, committee)
+    return winner
+
+
+def make_cluster_pos(num_validators: int, processes: Optional[int], seed: int):
+    from app import make_pos
+
+    pos, validators = make_pos(num_validators)
+    config = {
+        "seed": seed,
+        "addresses": [validator.address for validator in validators],
+        "vote_probability": 0.99,
+    }
+    cluster = NodeCluster(PoSNode, num_validators, config, processes)
+    return pos, validators, cluster, pos_round
+
+
+def make_cluster_algorand(num_accounts: int, processes: Optional[int], seed: int):
+    from app import make_algorand
+
+    algorand, accounts = make_algorand(num_accounts)
+    # Sortition runs on the nodes instead of a look-ahead thread
+    algorand.shutdown()
+    config = {
+        "seed": seed,
+        "master_seed": accounts[0].key_store.master_seed,
+        "certify_probability": 0.8,
+    }
+    cluster = NodeCluster(AlgorandNode, num_accounts, config, processes)
+    return algorand, accounts, cluster, algorand_round
+
+
+CLUSTER_FACTORIES = {"pos": make_cluster_pos, "algorand": make_cluster_algorand}
+
+
+async def run_nodes(
+    engine_name: str,
+    num_entities: int,
+    num_blocks: int,
+    processes: Optional[int] = None,
+    progress: bool = True,
+    seed: int = 0,
+):
+    """Like app.run_pos/run_algorand, with participants in node processes.
+
+    Returns the usual run tuple (so app.summarize_run applies) and the
+    cluster's traffic summary.
+    """
+    from app import progress_bar
+
+    engine, participants, cluster, play_round = CLUSTER_FACTORIES[engine_name](
+        num_entities, processes, seed
+    )
+    metrics.set_engine(engine_name)
+    times, tps, op_counts, txn_counts = [], [], [], []
+    pbar = progress_bar(num_blocks, progress)
+    with cluster:
+        for round_number in range(num_blocks):
+            txns = generate_transactions()
+            ops_before = opcounts.snapshot()
+            start = time.time()
+            play_round(cluster, engine, participants, txn_records(txns), round_number)
+            time_consumption = time.time() - start
+
+            times.append(time_consumption)
+            tps.append(len(txns) / time_consumption)
+            txn_counts.append(len(txns))
+            op_counts.append(opcounts.since(ops_before))
+            metrics.record_block(
+                engine_name, len(engine.chain) - 1, time_consumption, len(txns)
+            )
+            pbar.update(1)
+    pbar.close()
+    return (
+        engine_name,
+        times,
+        op_counts,
+        tps,
+        txn_counts,
+        engine,
+        participants,
+    ), cluster.summary()
@@ -0,0 +1,77 @@
+"""Counters for the primitive operations each engine performs.
+
+Unlike wall time these don't depend on how fast Python runs, so the energy
+model in cost_model works from them.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+SHA256 = "sha256"  # SHA-256 invocations
+BYTES_HASHED = "bytes_hashed"  # input bytes fed to SHA-256
+SIGNATURES = "signatures"  # ECDSA signatures produced
+VERIFICATIONS = "verifications"  # ECDSA signatures verified
+MESSAGES = "messages"  # broadcasts sent by participants (proposals, blocks, votes)
+
+OPERATIONS = (SHA256, BYTES_HASHED, SIGNATURES, VERIFICATIONS, MESSAGES)
+
+_counts: Dict[str, int] = dict.fromkeys(OPERATIONS, 0)
+_lock = threading.Lock()  # Algorand's sortition worker counts from its own thread
+_deferred = threading.local()
+
+
+def count(operation: str, amount: int = 1) -> None:
+    counts = getattr(_deferred, "counts", None)
+    if counts is not None:
+        counts[operation] += amount
+        return
+    with _lock:
+        _counts[operation] += amount
+
+
+def count_hash(num_bytes: int) -> None:
+    counts = getattr(_deferred, "counts", None)
+    if counts is not None:
+        counts[SHA256] += 1
+        counts[BYTES_HASHED] += num_bytes
+        return
+    with _lock:
+        _counts[SHA256] += 1
+        _counts[BYTES_HASHED] += num_bytes
+
+
+@contextmanager
+def deferred() -> Iterator[Dict[str, int]]:
+    """Count this thread's operations into the yielded dict, not the totals.
+
+    For work done ahead of time: add() the dict once the work is used.
+    """
+    counts = _deferred.counts = dict.fromkeys(OPERATIONS, 0)
+    try:
+        yield counts
+    finally:
+        _deferred.counts = None
+
+
+def add(counts: Dict[str, int]) -> None:
+    with _lock:
+        for operation, amount in counts.items():
+            _counts[operation] += amount
+
+
+def reset() -> None:
+    with _lock:
+        for operation in OPERATIONS:
+            _counts[operation] = 0
+
+
+def snapshot() -> Dict[str, int]:
+    with _lock:
+        return dict(_counts)
+
+
+def since(before: Dict[str, int]) -> Dict[str, int]:
+    """Operations performed since `before` was taken with snapshot()."""
+    now = snapshot()
+    return {operation: now[operation] - before[operation] for operation in OPERATIONS}
@@ -0,0 +1,173 @@
+"""Pipelined block production.
+
+Three stages run side by side, joined by bounded queues:
+
+- a producer thread prepares upcoming blocks' transactions and their digest;
+- the engine proposes and agrees on block N in the calling thread;
+- a validator thread re-checks block N-1 the way a following node would.
+
+A full queue blocks whichever side is ahead, so the producer stays at most
+`depth` batches ahead and the validator at most `depth` blocks behind.
+Consensus itself is unchanged: blocks are still produced one at a time from
+the same engine state. The other stages only overlap with it. They fit in
+wherever the engine releases the GIL, which mostly means PoW's simulated
+hashing and PoS's slot wait.
+"""
+
+import queue
+import random
+import threading
+import time
+from typing import List, Optional
+
+from block import TransactionBatch, meets_difficulty
+from transaction import generate_transactions
+
+DEFAULT_DEPTH = 2
+STOP_POLL = 0.1  # seconds between the producer's checks for shutdown
+
+
+class Pipeline:
+    def __init__(
+        self,
+        engine_name: str,
+        engine,
+        depth: int = DEFAULT_DEPTH,
+        seed: Optional[int] = None,
+        source=generate_transactions,
+    ):
+        self.engine_name = engine_name
+        self.engine = engine
+        self.depth = depth
+        self.source = source  # called with the producer's rng
+        # The producer draws from its own generator so it never races the
+        # engine for the global one; seeded runs stay reproducible
+        self.rng = random.Random(seed if seed is not None else random.getrandbits(64))
+        self.batches = queue.Queue(maxsize=depth)
+        self.blocks = queue.Queue(maxsize=depth)
+        self.stopping = threading.Event()
+        self.error: Optional[BaseException] = None  # first failure of a stage
+
+        # Validator state: the tip it has checked up to, like a follower's
+        self.tip = engine.get_last_block().hash
+        self.difficulty = None
+        self.validated = 0
+        self.invalid: List[int] = []
+
+        self.submitted = 0
+        self.producer_wait = 0.0  # seconds the engine waited for transactions
+        self.validator_wait = 0.0  # seconds the engine waited for the validator
+        self.started = time.perf_counter()
+        self.threads = [
+            threading.Thread(target=self.produce, name="txn-producer", daemon=True),
+            threading.Thread(target=self.follow, name="validator", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def produce(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                batch = TransactionBatch(self.source(self.rng))
+            except Exception as error:
+                self.fail(error)
+                return
+            while not self.stopping.is_set():
+                try:
+                    self.batches.put(batch, timeout=STOP_POLL)
+                    break
+                except queue.Full:
+                    continue
+
+    def next_transactions(self) -> TransactionBatch:
+        """Transactions for the block about to be produced."""
+        # The rules a block is checked against are those in force when it
+        # was started, before add_block adjusts anything
+        self.difficulty = getattr(self.engine, "difficulty", None)
+        start = time.perf_counter()
+        while True:
+            self.raise_error()
+            try:
+                batch = self.batches.get(timeout=STOP_POLL)
+                break
+            except queue.Empty:
+                continue
+        self.producer_wait += time.perf_counter() - start
+        return batch
+
+    def submit(self, block) -> None:
+        """Hand a produced block to the validator; failed rounds are skipped."""
+        self.raise_error()
+        if block is None or self.engine.get_last_block() is not block:
+            return
+        self.submitted += 1
+        start = time.perf_counter()
+        self.blocks.put((len(self.engine.chain) - 1, block, self.difficulty))
+        self.validator_wait += time.perf_counter() - start
+
+    def follow(self) -> None:
+        while True:
+            item = self.blocks.get()
+            if item is None:
+                return
+            # After a failure keep draining, so submit() and close() never
+            # block on a full queue
+            if self.error is not None:
+                continue
+            height, block, difficulty = item
+            try:
+                valid = self.check(height, block, difficulty)
+            except Exception as error:
+                self.fail(error)
+                continue
+            if not valid:
+                self.invalid.append(height)
+            self.tip = block.hash
+            self.validated += 1
+
+    def fail(self, error: BaseException) -> None:
+        if self.error is None:
+            self.error = error
+        self.stopping.set()
+
+    def raise_error(self) -> None:
+        """Re-raise, in the engine's thread, a failure of the other stages."""
+        if self.error is not None:
+            raise self.error
+
+    def check(self, height: int, block, difficulty) -> bool:
+        if block.previous_hash != self.tip:
+            return False
+        verifier = getattr(self.engine, "verifier", None)
+        if verifier is not None and not verifier.all_valid(block.txns, "validation"):
+            return False
+        if self.engine_name == "pow":
+            return meets_difficulty(block.hash, difficulty)
+        if self.engine_name == "algorand":
+            from Algorand import verify_proof_chunk
+
+            return not verify_proof_chunk(
+                [(height, block.previous_hash, block.vrf_proof, block.proposer_key)]
+            )
+        return True
+
+    def close(self) -> dict:
+        """Drain the validator, stop the producer and summarize the run.
+
+        Raises the first error either stage hit.
+        """
+        self.blocks.put(None)
+        self.threads[1].join()
+        wall_time = time.perf_counter() - self.started
+        self.stopping.set()
+        self.threads[0].join()
+        self.raise_error()
+        return {
+            "depth": self.depth,
+            "wall_time": wall_time,
+            "blocks_per_s": self.submitted / wall_time if wall_time else 0.0,
+            "producer_wait_s": self.producer_wait,
+            "validator_wait_s": self.validator_wait,
+            "validated": self.validated,
+            "invalid": len(self.invalid),
+        }
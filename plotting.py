@@ -1,24 +1,110 @@
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+matplotlib.use("Agg")  # figures are only ever written to files
+
 import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import pandas as pd
 import numpy as np
 
+# Scalar per-run columns; per-block and per-participant series go to long frames
+RUN_COLUMNS = (
+    "consensus",
+    "num_miners",
+    "num_blocks",
+    "total_time",
+    "avg_time",
+    "avg_tps",
+    "total_energy",
+    "avg_energy",
+)
+MAX_LINE_POINTS = 1000  # per series, after downsampling
+DPI = 300
+DRAFT_DPI = 72
+MANIFEST_PATH = ".plot_manifest.json"  # input hash of every rendered figure
+
+# Set per render job; draft mode rasterizes scatter and line layers
+dpi = DPI
+rasterized = False
+
 
 def save_plot(name):
     plt.tight_layout()
-    plt.savefig(f"{name}.png", dpi=300, bbox_inches="tight")
+    plt.savefig(f"{name}.png", dpi=dpi, bbox_inches="tight")
     plt.close()
 
 
-def plot_time_vs_energy(df):
+def tidy_frames(consensus_data):
+    """Split results into a per-run, a per-block and a per-participant frame.
+
+    The per-block and per-participant frames are long format (one row per
+    block or participant, keyed by run), built by concatenating arrays rather
+    than holding Python lists in cells.
+    """
+    runs = pd.DataFrame(
+        {
+            column: [result[column] for result in consensus_data]
+            for column in RUN_COLUMNS
+        }
+    )
+    runs["consensus"] = runs["consensus"].astype("category")
+    runs.index.name = "run"
+
+    def long_frame(columns, length_column):
+        lengths = np.array([len(result[length_column]) for result in consensus_data])
+        frame = pd.DataFrame(
+            {
+                name: np.concatenate(
+                    [
+                        np.asarray(result[column], dtype=np.float64)
+                        for result in consensus_data
+                    ]
+                )
+                for name, column in columns.items()
+            }
+        )
+        frame.insert(0, "run", np.repeat(runs.index.to_numpy(), lengths))
+        frame.insert(1, "consensus", runs["consensus"].to_numpy().repeat(lengths))
+        frame.insert(2, "num_miners", runs["num_miners"].to_numpy().repeat(lengths))
+        return frame
+
+    blocks = long_frame({"time": "times", "tps": "tps", "energy": "energy"}, "times")
+    participants = long_frame({"weight": "weights", "reward": "rewards"}, "weights")
+    return runs, blocks, participants
+
+
+def minmax_downsample(x, y, max_points):
+    """Keep each bucket's lowest and highest point so spikes survive."""
+    n = len(x)
+    buckets = max_points // 2
+    if n <= max_points or buckets < 1:
+        return x, y
+
+    # Sorting by (bucket, y) puts each bucket's min first and max last
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    order = np.lexsort((y, bucket))
+    selected = np.unique(np.r_[0, order[edges[:-1]], order[edges[1:] - 1], n - 1])
+    return x[selected], y[selected]
+
+
+def plot_time_vs_energy(runs):
     plt.figure(figsize=(12, 8))
     sns.scatterplot(
-        data=df,
+        data=runs,
         x="avg_time",
         y="avg_energy",
         hue="consensus",
         size="num_miners",
         sizes=(50, 500),
+        rasterized=rasterized,
     )
     plt.title("Average Time vs Energy Consumption by Consensus Type")
     plt.xlabel("Average Time (s)")
@@ -29,9 +115,9 @@ def plot_time_vs_energy(df):
     save_plot("time_vs_energy_log")
 
 
-def plot_tps_distribution(df):
+def plot_tps_distribution(runs):
     plt.figure(figsize=(12, 8))
-    sns.boxenplot(data=df, x="consensus", y="avg_tps")
+    sns.boxenplot(data=runs, x="consensus", y="avg_tps")
     plt.title("Distribution of Average TPS by Consensus Type")
     plt.xlabel("Consensus Type")
     plt.ylabel("Average Transactions per Second (TPS)")
@@ -40,15 +126,16 @@ def plot_tps_distribution(df):
     save_plot("tps_distribution_log")
 
 
-def plot_miners_vs_time(df):
+def plot_miners_vs_time(runs):
     plt.figure(figsize=(12, 8))
     sns.scatterplot(
-        data=df,
+        data=runs,
         x="num_miners",
         y="total_time",
         hue="consensus",
         size="num_blocks",
         sizes=(50, 500),
+        rasterized=rasterized,
     )
     plt.title("Relationship between Number of Miners and Total Time")
     plt.xlabel("Number of Miners")
@@ -59,9 +146,9 @@ def plot_miners_vs_time(df):
     save_plot("miners_vs_time_log")
 
 
-def plot_energy_distribution(df):
+def plot_energy_distribution(runs):
     plt.figure(figsize=(12, 8))
-    sns.violinplot(data=df, x="consensus", y="total_energy", cut=0)
+    sns.violinplot(data=runs, x="consensus", y="total_energy", cut=0)
     plt.title("Energy Consumption Distribution by Consensus Type")
     plt.xlabel("Consensus Type")
     plt.ylabel("Total Energy Consumption")
@@ -70,10 +157,13 @@ def plot_energy_distribution(df):
     save_plot("energy_distribution_log")
 
 
-def plot_efficiency_comparison(df):
-    df["efficiency"] = df["avg_tps"] / df["avg_energy"]
+def plot_efficiency_comparison(runs):
     plt.figure(figsize=(12, 8))
-    sns.barplot(data=df, x="consensus", y="efficiency")
+    sns.barplot(
+        data=runs.assign(efficiency=runs["avg_tps"] / runs["avg_energy"]),
+        x="consensus",
+        y="efficiency",
+    )
     plt.title("Efficiency Comparison (TPS/Energy) by Consensus Type")
     plt.xlabel("Consensus Type")
     plt.ylabel("Efficiency (TPS/Energy)")
@@ -82,9 +172,15 @@ def plot_efficiency_comparison(df):
     save_plot("efficiency_comparison_log")
 
 
-def plot_scalability(df):
+def plot_scalability(runs):
     plt.figure(figsize=(12, 8))
-    sns.scatterplot(data=df, x="num_miners", y="avg_tps", hue="consensus")
+    sns.scatterplot(
+        data=runs,
+        x="num_miners",
+        y="avg_tps",
+        hue="consensus",
+        rasterized=rasterized,
+    )
     plt.title("Scalability: TPS vs Number of Miners")
     plt.xlabel("Number of Miners")
     plt.ylabel("Average TPS")
@@ -94,23 +190,29 @@ def plot_scalability(df):
     save_plot("scalability_tps_vs_miners_log")
 
 
-def plot_time_energy_tradeoff(df):
+def plot_time_energy_tradeoff(runs):
     plt.figure(figsize=(14, 10))
     sns.scatterplot(
-        data=df,
+        data=runs,
         x="avg_time",
         y="avg_energy",
         hue="consensus",
         size="num_blocks",
         style="consensus",
         sizes=(100, 1000),
+        rasterized=rasterized,
     )
-    for i, row in df.iterrows():
+    # One label per (consensus, miners) cell at its mean position, not per run
+    cells = runs.groupby(["consensus", "num_miners"], observed=True)[
+        ["avg_time", "avg_energy"]
+    ].mean()
+    for num_miners, x, y in zip(
+        cells.index.get_level_values("num_miners"),
+        cells["avg_time"].to_numpy(),
+        cells["avg_energy"].to_numpy(),
+    ):
         plt.annotate(
-            f"Miners: {row['num_miners']}",
-            (row["avg_time"], row["avg_energy"]),
-            xytext=(5, 5),
-            textcoords="offset points",
+            f"Miners: {num_miners}", (x, y), xytext=(5, 5), textcoords="offset points"
         )
     plt.title("Time and Energy Trade-off by Consensus Type")
     plt.xlabel("Average Time (s)")
@@ -121,10 +223,12 @@ def plot_time_energy_tradeoff(df):
     save_plot("time_energy_tradeoff_log")
 
 
-def plot_tps_stability(df):
-    df["tps_stability"] = df["tps"].apply(lambda x: np.std(x) / np.mean(x))
+def plot_tps_stability(runs, blocks):
+    # Coefficient of variation of per-block TPS within each run
+    tps = blocks.groupby("run")["tps"]
+    stability = runs[["consensus"]].assign(tps_stability=tps.std(ddof=0) / tps.mean())
     plt.figure(figsize=(12, 8))
-    sns.barplot(data=df, x="consensus", y="tps_stability")
+    sns.barplot(data=stability, x="consensus", y="tps_stability")
     plt.title("TPS Stability by Consensus Type")
     plt.xlabel("Consensus Type")
     plt.ylabel("TPS Stability (Lower is better)")
@@ -132,14 +236,40 @@ def plot_tps_stability(df):
     save_plot("tps_stability")
 
 
-def plot_energy_efficiency_over_time(df):
+def plot_energy_efficiency_over_time(runs, blocks):
+    by_run = blocks.groupby("run")
+    elapsed = by_run["time"].cumsum().to_numpy()
+    energy = by_run["energy"].cumsum().to_numpy()
+    run_ids = blocks["run"].to_numpy()
+    boundaries = np.flatnonzero(np.diff(run_ids)) + 1
+
+    # One downsampled segment per run, drawn as one collection per consensus
+    # so hundreds of runs cost a handful of artists and legend entries
+    segments = {}
+    for run, x, y in zip(
+        run_ids[np.r_[0, boundaries]],
+        np.split(elapsed, boundaries),
+        np.split(energy, boundaries),
+    ):
+        x, y = minmax_downsample(x, y, MAX_LINE_POINTS)
+        consensus = runs.at[run, "consensus"]
+        segments.setdefault(consensus, []).append(np.column_stack([x, y]))
+
     plt.figure(figsize=(14, 8))
-    for _, row in df.iterrows():
-        plt.plot(
-            row["times"],
-            np.cumsum(row["energy"]),
-            label=f"{row['consensus']} (Miners: {row['num_miners']})",
+    ax = plt.gca()
+    colors = sns.color_palette(n_colors=len(segments))
+    for (consensus, lines), color in zip(sorted(segments.items()), colors):
+        ax.add_collection(
+            LineCollection(
+                lines,
+                colors=[color],
+                linewidths=0.8,
+                alpha=0.6,
+                label=consensus,
+                rasterized=rasterized,
+            )
         )
+    ax.autoscale()
     plt.title("Cumulative Energy Consumption over Time")
     plt.xlabel("Time (s)")
     plt.ylabel("Cumulative Energy Consumption")
@@ -148,37 +278,16 @@ def plot_energy_efficiency_over_time(df):
     save_plot("energy_efficiency_over_time_log")
 
 
-def plot_rewards_vs_hash_rate_stake(df):
+def plot_rewards_vs_hash_rate_stake(participants):
     plt.figure(figsize=(14, 8))
-    for consensus in df["consensus"].unique():
-        subset = df[df["consensus"] == consensus]
-        hash_rates = []
-        stakes = []
-        total_rewards = []
-
-        for users in subset["users"]:
-            for user in users:
-                if consensus == "pow" and user.hash_rate is not None:
-                    hash_rates.append(user.hash_rate)
-                    total_rewards.append(user.total_rewards)
-                elif consensus != "pow" and user.stake is not None:
-                    stakes.append(user.stake)
-                    total_rewards.append(user.total_rewards)
-
-        if consensus == "pow":
-            plt.scatter(
-                hash_rates,
-                total_rewards,
-                label=f"{consensus} (Hash Rate)",
-                alpha=0.7,
-            )
-        else:
-            plt.scatter(
-                stakes,
-                total_rewards,
-                label=f"{consensus} (Stake)",
-                alpha=0.7,
-            )
+    for consensus, subset in participants.groupby("consensus", observed=True):
+        plt.scatter(
+            subset["weight"],
+            subset["reward"],
+            label=f"{consensus} ({'Hash Rate' if consensus == 'pow' else 'Stake'})",
+            alpha=0.7,
+            rasterized=rasterized,
+        )
 
     plt.title("Total Rewards vs Hash Rate/Stake by Consensus Type")
     plt.xlabel("Hash Rate / Stake")
@@ -189,18 +298,98 @@ def plot_rewards_vs_hash_rate_stake(df):
     save_plot("rewards_vs_hash_rate_stake_log")
 
 
-def plot(consensus_data):
-    df = pd.DataFrame(consensus_data)
+# Output name -> (function, frames it reads); output names match save_plot
+FIGURES = {
+    "time_vs_energy_log": (plot_time_vs_energy, ("runs",)),
+    "tps_distribution_log": (plot_tps_distribution, ("runs",)),
+    "miners_vs_time_log": (plot_miners_vs_time, ("runs",)),
+    "energy_distribution_log": (plot_energy_distribution, ("runs",)),
+    "efficiency_comparison_log": (plot_efficiency_comparison, ("runs",)),
+    "scalability_tps_vs_miners_log": (plot_scalability, ("runs",)),
+    "time_energy_tradeoff_log": (plot_time_energy_tradeoff, ("runs",)),
+    "tps_stability": (plot_tps_stability, ("runs", "blocks")),
+    "energy_efficiency_over_time_log": (
+        plot_energy_efficiency_over_time,
+        ("runs", "blocks"),
+    ),
+    "rewards_vs_hash_rate_stake_log": (
+        plot_rewards_vs_hash_rate_stake,
+        ("participants",),
+    ),
+}
+
+
+def frame_digest(frame) -> bytes:
+    hashed = pd.util.hash_pandas_object(frame, index=True).to_numpy()
+    return hashlib.sha256(hashed.tobytes() + ",".join(frame.columns).encode()).digest()
+
+
+def figure_key(name, frame_digests, draft) -> str:
+    """Hash of a figure's input frames, its plotting code and render settings."""
+    function, inputs = FIGURES[name]
+    digest = hashlib.sha256()
+    for source in (inspect.getsource(function), inspect.getsource(save_plot)):
+        digest.update(source.encode())
+    for frame_name in inputs:
+        digest.update(frame_digests[frame_name])
+    digest.update(f"{draft}:{matplotlib.__version__}:{sns.__version__}".encode())
+    return digest.hexdigest()
+
+
+def render_figure(name, frames, draft):
+    """Render one figure; runs in a pool worker."""
+    global dpi, rasterized
+    dpi = DRAFT_DPI if draft else DPI
+    rasterized = draft
     sns.set_style("whitegrid")
     plt.rcParams["figure.figsize"] = (12, 8)
 
-    plot_time_vs_energy(df)
-    plot_tps_distribution(df)
-    plot_miners_vs_time(df)
-    plot_energy_distribution(df)
-    plot_efficiency_comparison(df)
-    plot_scalability(df)
-    plot_time_energy_tradeoff(df)
-    plot_tps_stability(df)
-    plot_energy_efficiency_over_time(df)
-    plot_rewards_vs_hash_rate_stake(df)
+    function, _ = FIGURES[name]
+    function(*frames)
+    return name
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def plot(consensus_data, draft=False, force=False, max_workers=None):
+    """Render every figure whose inputs changed, one figure per pool job.
+
+    Draft mode renders at DRAFT_DPI with rasterized layers; draft and final
+    renders are keyed separately, so switching back re-renders.
+    """
+    runs, blocks, participants = tidy_frames(consensus_data)
+    frames = {"runs": runs, "blocks": blocks, "participants": participants}
+    frame_digests = {name: frame_digest(frame) for name, frame in frames.items()}
+
+    manifest = load_manifest()
+    stale = {}
+    for name in FIGURES:
+        key = figure_key(name, frame_digests, draft)
+        if force or manifest.get(name) != key or not os.path.exists(f"{name}.png"):
+            stale[name] = key
+
+    if not stale:
+        return []
+
+    # Each job gets only the frames its figure reads
+    jobs = [
+        (name, [frames[frame_name] for frame_name in FIGURES[name][1]], draft)
+        for name in stale
+    ]
+    max_workers = min(len(jobs), max_workers or os.cpu_count())
+    if max_workers == 1:
+        rendered = [render_figure(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rendered = list(executor.map(render_figure, *zip(*jobs)))
+
+    manifest.update((name, stale[name]) for name in rendered)
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return rendered
@@ -0,0 +1,126 @@
+import ast
+import hashlib
+import os
+import pickle
+from typing import Iterable, List, Optional
+
+import instrumentation
+import memory_profile
+
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+
+# A sweep job's entry points; every local module they import, directly or
+# not, determines its result
+SOURCE_ROOTS = ("app.py", "sweep.py")
+
+
+def source_files(roots: Iterable[str] = SOURCE_ROOTS) -> List[str]:
+    """The modules in this directory reachable from `roots` by import.
+
+    Imports inside functions count too, so lazily imported engines are found.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        with open(os.path.join(root, name)) as f:
+            tree = ast.parse(f.read(), name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                path = module.split(".")[0] + ".py"
+                if os.path.exists(os.path.join(root, path)):
+                    pending.append(path)
+    return sorted(found)
+
+
+def code_version(files: Optional[Iterable[str]] = None) -> str:
+    """Hash the simulation sources so edits invalidate previously cached runs."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(files if files is not None else source_files()):
+        digest.update(name.encode())
+        with open(os.path.join(root, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def job_key(job, version: str) -> str:
+    return hashlib.sha256(
+        f"{job.engine}:{job.num_entities}:{job.num_blocks}:{job.seed}:{version}".encode()
+    ).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache of job results with least-recently-used eviction."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Instrumented and memory-profiled runs carry extra metrics, so they
+        # are cached separately
+        self.version = code_version()
+        if instrumentation.ENABLED:
+            self.version += ":instrumented"
+        if memory_profile.ENABLED:
+            self.version += ":memory"
+        self.total_bytes: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def get(self, job) -> Optional[dict]:
+        path = self.path(job_key(job, self.version))
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark as recently used
+        os.utime(path)
+        return result
+
+    def put(self, job, result: dict) -> None:
+        path = self.path(job_key(job, self.version))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        # Only walk the cache directory when the running total says we might be over
+        if self.total_bytes is None:
+            self.evict()
+        else:
+            self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".pkl"):
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    entries.append((stat.st_mtime, stat.st_size, dirpath, filename))
+
+        total_bytes = sum(size for _, size, _, _ in entries)
+        for _, size, dirpath, filename in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(os.path.join(dirpath, filename))
+            total_bytes -= size
+
+        self.total_bytes = total_bytes
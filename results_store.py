@@ -0,0 +1,164 @@
+import csv
+import os
+import shutil
+from typing import Iterator, List
+
+import numpy as np
+
+# Per-block series, one value per simulated block
+BLOCK_COLUMNS = ("times", "tps", "txns")
+# Per-participant snapshot, one value per miner/validator/account
+PARTICIPANT_COLUMNS = ("weights", "rewards")
+SUMMARY_COLUMNS = (
+    "run_id",
+    "consensus",
+    "num_miners",
+    "num_blocks",
+    "seed",
+    "total_time",
+    "avg_time",
+    "avg_tps",
+)
+PHASE_COLUMNS = ("run_id", "phase", "count", "total_ns", "p50_ns", "p99_ns", "max_ns")
+MEMORY_COLUMNS = (
+    "run_id",
+    "traced_peak",
+    "traced_steady",
+    "rss_peak",
+    "rss_steady",
+    "chain",
+    "blocks",
+    "txns",
+    "votes",
+    "keys",
+    "participants",
+)
+INT_COLUMNS = {"num_miners", "num_blocks", "seed"}
+FLOAT_COLUMNS = {"total_time", "avg_time", "avg_tps"}
+OPS_PREFIX = "ops_"
+
+
+def run_id(job) -> str:
+    return f"{job.engine}-{job.num_entities}-{job.num_blocks}-{job.seed:016x}"
+
+
+class ResultsStore:
+    """On-disk sweep results: one .npz of columns per run plus a summary CSV.
+
+    Runs are written as soon as they finish, so the sweep itself never holds
+    more than one run's metrics in memory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.runs_directory = os.path.join(directory, "runs")
+        self.summary_path = os.path.join(directory, "summary.csv")
+        self.phases_path = os.path.join(directory, "phases.csv")
+        self.memory_path = os.path.join(directory, "memory.csv")
+        os.makedirs(self.runs_directory, exist_ok=True)
+
+    def reset(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.runs_directory, exist_ok=True)
+
+    def run_path(self, run: str) -> str:
+        return os.path.join(self.runs_directory, f"{run}.npz")
+
+    def append(self, job, result: dict) -> None:
+        run = run_id(job)
+
+        # Write the columns first so every summary row points at a complete file
+        tmp_path = self.run_path(run) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                times=np.asarray(result["times"], dtype=np.float64),
+                tps=np.asarray(result["tps"], dtype=np.float64),
+                txns=np.asarray(result["txns"], dtype=np.int64),
+                weights=np.asarray(result["weights"], dtype=np.float64),
+                rewards=np.asarray(result["rewards"], dtype=np.float64),
+                **{
+                    OPS_PREFIX + operation: np.asarray(counts, dtype=np.int64)
+                    for operation, counts in result["ops"].items()
+                },
+            )
+        os.replace(tmp_path, self.run_path(run))
+
+        row = {column: result.get(column) for column in SUMMARY_COLUMNS}
+        row.update(run_id=run, seed=job.seed)
+
+        self.append_rows(self.summary_path, SUMMARY_COLUMNS, [row])
+
+        if "phases" in result:
+            self.append_rows(
+                self.phases_path,
+                PHASE_COLUMNS,
+                [
+                    {"run_id": run, "phase": name, **stats}
+                    for name, stats in result["phases"].items()
+                ],
+            )
+
+        if "memory" in result:
+            self.append_rows(
+                self.memory_path, MEMORY_COLUMNS, [{"run_id": run, **result["memory"]}]
+            )
+
+    def append_rows(self, path: str, columns, rows: List[dict]) -> None:
+        write_header = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def load_summary(self) -> List[dict]:
+        if not os.path.exists(self.summary_path):
+            return []
+
+        with open(self.summary_path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        for row in rows:
+            for column in INT_COLUMNS:
+                row[column] = int(row[column])
+            for column in FLOAT_COLUMNS:
+                row[column] = float(row[column])
+        return rows
+
+    def load_phases(self) -> List[dict]:
+        return self.load_int_rows(self.phases_path, PHASE_COLUMNS[2:])
+
+    def load_memory(self) -> List[dict]:
+        return self.load_int_rows(self.memory_path, MEMORY_COLUMNS[1:])
+
+    def load_int_rows(self, path: str, int_columns) -> List[dict]:
+        if not os.path.exists(path):
+            return []
+
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        for row in rows:
+            for column in int_columns:
+                row[column] = int(row[column])
+        return rows
+
+    def load_run(self, run: str) -> dict:
+        with np.load(self.run_path(run)) as data:
+            run_data = {
+                column: data[column]
+                for column in data.files
+                if not column.startswith(OPS_PREFIX)
+            }
+            run_data["ops"] = {
+                column[len(OPS_PREFIX) :]: data[column]
+                for column in data.files
+                if column.startswith(OPS_PREFIX)
+            }
+        return run_data
+
+    def iter_results(self) -> Iterator[dict]:
+        """Yield each summary row joined with its per-block and participant columns."""
+        for row in self.load_summary():
+            yield {**row, **self.load_run(row["run_id"])}
@@ -0,0 +1,213 @@
+"""Sharded execution: K engines side by side, tied together by a beacon.
+
+Accounts belong to the shard their address hashes to. Each shard runs its
+own PoS or Algorand engine over its own participants in a node process (see
+nodes), and a transaction goes into its sender's shard. When the receiver
+lives in another shard, the source block that debits the sender emits a
+receipt. The beacon routes the receipt to the receiver's shard, and that
+shard's next block credits it. Every slot the beacon collects the shards'
+block headers and chains their hashes into one beacon block.
+
+Offered load grows with K (one generate_transactions() batch per shard per
+slot), so aggregate TPS shows how far throughput scales horizontally, and
+cross-shard latency (submission to the receipt's inclusion) shows the price.
+
+    python sharding.py --engine pos --shards 1 2 4 8 --entities 10 --slots 10
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from tabulate import tabulate
+
+import opcounts
+from block import GENESIS_HASH
+from load import latency_percentiles
+from nodes import NodeCluster
+from transaction import Transaction, generate_transactions
+
+DEFAULT_SHARD_COUNTS = (1, 2, 4, 8)
+DEFAULT_ENTITIES = 10  # participants per shard
+DEFAULT_SLOTS = 10
+
+
+def shard_of(address: str, num_shards: int) -> int:
+    # Addresses are already SHA-256 hex digests, so their prefix is uniform
+    return int(address[:16], 16) % num_shards
+
+
+class ShardNode:
+    """One shard's engine, with the transactions and receipts it still owes."""
+
+    def __init__(self, start: int, end: int, config: dict):
+        from app import ENGINE_FACTORIES
+
+        self.shard = start
+        self.num_shards = config["num_shards"]
+        self.engine, _ = ENGINE_FACTORIES[config["engine"]](config["entities"])
+        self.pending: List[tuple] = []  # (id, sender, receiver, amount, fee)
+        self.pending_receipts: List[tuple] = []  # (id, sender, receiver, amount)
+
+    def on_block(self, codec, payload):
+        """Produce this slot's block; returns its header and receipts."""
+        txns, receipts = payload
+        self.pending.extend(txns)
+        self.pending_receipts.extend(receipts)
+        # A receipt credits the receiver; the fee was paid at the source
+        batch = [Transaction(*record[1:]) for record in self.pending] + [
+            Transaction(sender, receiver, amount, 0.0)
+            for _, sender, receiver, amount in self.pending_receipts
+        ]
+        block = self.engine.mine_block(batch)
+        if block is None:
+            # Nothing committed; everything waits for the next slot
+            return None, [], [], []
+
+        committed = [record[0] for record in self.pending]
+        outgoing = [
+            (shard_of(receiver, self.num_shards), (txn_id, sender, receiver, amount))
+            for txn_id, sender, receiver, amount, _ in self.pending
+            if shard_of(receiver, self.num_shards) != self.shard
+        ]
+        applied = [receipt[0] for receipt in self.pending_receipts]
+        self.pending, self.pending_receipts = [], []
+        return block.hash, committed, outgoing, applied
+
+    def close(self) -> None:
+        if hasattr(self.engine, "shutdown"):
+            self.engine.shutdown()
+
+
+class Beacon:
+    """Chains each slot's shard headers into one beacon block hash."""
+
+    def __init__(self, num_shards: int):
+        self.num_shards = num_shards
+        self.chain = [GENESIS_HASH]
+
+    def add(self, headers: Dict[int, Optional[bytes]]) -> bytes:
+        # A shard that produced nothing this slot contributes zeros
+        data = self.chain[-1] + b"".join(
+            headers.get(shard) or bytes(32) for shard in range(self.num_shards)
+        )
+        opcounts.count_hash(len(data))
+        self.chain.append(hashlib.sha256(data).digest())
+        return self.chain[-1]
+
+
+def run_sharded(
+    engine_name: str,
+    num_shards: int,
+    entities: int = DEFAULT_ENTITIES,
+    num_slots: int = DEFAULT_SLOTS,
+    seed: int = 0,
+) -> dict:
+    config = {
+        "seed": seed,
+        "engine": engine_name,
+        "entities": entities,
+        "num_shards": num_shards,
+    }
+    beacon = Beacon(num_shards)
+    submitted: Dict[int, float] = {}  # transaction id -> submission time
+    inbound: Dict[int, List[tuple]] = {shard: [] for shard in range(num_shards)}
+    intra_latency, cross_latency = [], []
+    committed_count = cross_count = 0
+    busy_time = 0.0
+    next_id = 0
+
+    with NodeCluster(ShardNode, num_shards, config, processes=num_shards) as cluster:
+        for slot in range(num_slots):
+            batches: Dict[int, List[tuple]] = {s: [] for s in range(num_shards)}
+            for _ in range(num_shards):
+                for tx in generate_transactions():
+                    batches[shard_of(tx.sender, num_shards)].append(
+                        (next_id, tx.sender, tx.receiver, tx.amount, tx.fee)
+                    )
+                    next_id += 1
+
+            start = time.perf_counter()
+            for batch in batches.values():
+                submitted.update((record[0], start) for record in batch)
+            payloads = {
+                shard: (batches[shard], inbound[shard]) for shard in range(num_shards)
+            }
+            inbound = {shard: [] for shard in range(num_shards)}
+            replies = cluster.request(slot, "block", payloads)
+            now = time.perf_counter()
+            busy_time += now - start
+
+            headers: Dict[int, Optional[bytes]] = {}
+            for shard, (block_hash, committed, outgoing, applied) in replies.items():
+                headers[shard] = block_hash
+                crossing = {receipt[0] for _, receipt in outgoing}
+                committed_count += len(committed)
+                cross_count += len(crossing)
+                intra_latency.extend(
+                    now - submitted.pop(txn_id)
+                    for txn_id in committed
+                    if txn_id not in crossing
+                )
+                cross_latency.extend(now - submitted.pop(txn_id) for txn_id in applied)
+                for destination, receipt in outgoing:
+                    inbound[destination].append(receipt)
+            beacon.add(headers)
+
+    return {
+        "shards": num_shards,
+        "entities_per_shard": entities,
+        "slots": num_slots,
+        "beacon_height": len(beacon.chain) - 1,
+        "committed": committed_count,
+        "aggregate_tps": committed_count / busy_time if busy_time else 0.0,
+        "cross_fraction": cross_count / committed_count if committed_count else 0.0,
+        # Cross-shard transfers still waiting for their receipt at the end
+        "receipts_in_flight": sum(len(receipts) for receipts in inbound.values()),
+        **latency_percentiles(intra_latency, "intra_latency"),
+        **latency_percentiles(cross_latency, "cross_latency"),
+    }
+
+
+def scaling(
+    engine_name: str,
+    shard_counts=DEFAULT_SHARD_COUNTS,
+    entities: int = DEFAULT_ENTITIES,
+    num_slots: int = DEFAULT_SLOTS,
+    seed: int = 0,
+) -> List[dict]:
+    results = []
+    for num_shards in shard_counts:
+        random.seed(seed)
+        results.append(run_sharded(engine_name, num_shards, entities, num_slots, seed))
+    return results
+
+
+def print_scaling(results: List[dict]) -> None:
+    columns: Tuple[str, ...] = tuple(results[0]) if results else ()
+    rows = [[result[column] for column in columns] for result in results]
+    print(tabulate(rows, headers=columns, floatfmt=".3f"))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Sharded throughput scaling")
+    parser.add_argument("--engine", choices=("pos", "algorand"), default="pos")
+    parser.add_argument(
+        "--shards", type=int, nargs="+", default=list(DEFAULT_SHARD_COUNTS)
+    )
+    parser.add_argument(
+        "--entities", type=int, default=DEFAULT_ENTITIES, help="per shard"
+    )
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print_scaling(
+        scaling(args.engine, args.shards, args.entities, args.slots, args.seed)
+    )
+
+
+if __name__ == "__main__":
+    main()
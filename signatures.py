@@ -0,0 +1,212 @@
+"""Signed transactions and their verification.
+
+Wallets sign transfers with ECDSA keys from a KeyStore; a sender address is
+the SHA-256 of the sender's public key, so a valid signature proves the
+transfer came from the account it debits.
+
+SignatureVerifier checks transactions wherever a node sees them: on admission
+to the mempool, in a proposal, and when validating a block. Signatures not
+verified before are checked in chunks across a process pool; the ids of
+transactions that passed are kept in a bounded LRU, so a transaction seen
+again at a later stage costs a lookup instead of a verification.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ecdsa import SECP256k1, VerifyingKey
+
+import opcounts
+from keystore import KeyStore
+from transaction import MAX_BLOCK_TXNS, SignedTransaction
+
+DEFAULT_WALLETS = 1000
+DEFAULT_CACHE_SIZE = 100_000  # verified transaction ids
+SIGNATURE_CHUNK_SIZE = 128  # transactions per verification job
+STAGES = ("mempool", "proposal", "validation")
+
+
+def address_of(public_key: bytes) -> str:
+    return hashlib.sha256(public_key).hexdigest()
+
+
+def verify_signature_chunk(
+    records: List[Tuple[str, bytes, bytes, bytes]],
+) -> List[bool]:
+    """Check (sender, public_key, signature, payload) records; one bool each."""
+    results = []
+    for sender, public_key, signature, payload in records:
+        if not signature or address_of(public_key) != sender:
+            results.append(False)
+            continue
+        try:
+            verify_key = VerifyingKey.from_string(public_key, curve=SECP256k1)
+            results.append(
+                verify_key.verify(signature, hashlib.sha256(payload).digest())
+            )
+        except Exception:
+            results.append(False)
+    return results
+
+
+class Wallets:
+    """Accounts that sign the transfers they send."""
+
+    def __init__(self, count: int = DEFAULT_WALLETS, master_seed: bytes = None):
+        self.key_store = KeyStore(master_seed, cache_size=count)
+        self.key_store.allocate_many(count)
+        self.addresses = [
+            address_of(self.key_store.public_key(i)) for i in range(count)
+        ]
+
+    def transaction(self, rng=random) -> SignedTransaction:
+        sender = rng.randrange(len(self.addresses))
+        tx = SignedTransaction(
+            sender=self.addresses[sender],
+            receiver=rng.choice(self.addresses),
+            amount=rng.uniform(1, 1000),
+            fee=rng.uniform(0.01, 0.1),
+            public_key=self.key_store.public_key(sender),
+        )
+        # Signing is the clients' work, not the nodes': it stays out of
+        # opcounts, so no block's measurement includes it, pipelined or not
+        payload = tx.payload()
+        return tx.signed(
+            self.key_store.signing_key(sender).sign_deterministic(
+                hashlib.sha256(payload).digest()
+            )
+        )
+
+    def generate_transactions(self, rng=random) -> List[SignedTransaction]:
+        """Like transaction.generate_transactions, but signed."""
+        return [self.transaction(rng) for _ in range(rng.randint(1, MAX_BLOCK_TXNS))]
+
+
+class VerifiedCache:
+    """Ids of transactions whose signatures checked out, least recent evicted."""
+
+    def __init__(self, capacity: int = DEFAULT_CACHE_SIZE):
+        self.capacity = capacity
+        self.ids: "OrderedDict[bytes, None]" = OrderedDict()
+        # The pipeline's validator thread checks blocks alongside consensus
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, txid: bytes) -> bool:
+        with self.lock:
+            if txid not in self.ids:
+                return False
+            self.ids.move_to_end(txid)
+            return True
+
+    def add(self, txid: bytes) -> None:
+        with self.lock:
+            self.ids[txid] = None
+            self.ids.move_to_end(txid)
+            while len(self.ids) > self.capacity:
+                self.ids.popitem(last=False)
+
+
+class SignatureVerifier:
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        chunk_size: int = SIGNATURE_CHUNK_SIZE,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.cache = VerifiedCache(cache_size)
+        self.pool = None
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, float]] = {
+            stage: {"seen": 0, "cached": 0, "verified": 0, "invalid": 0, "seconds": 0.0}
+            for stage in STAGES
+        }
+
+    def verify(self, txns, stage: str) -> List[bool]:
+        """Whether each transaction is validly signed, noting work under `stage`."""
+        start = time.perf_counter()
+        # Unsigned transactions fail outright, with nothing to verify
+        results = [
+            isinstance(tx, SignedTransaction) and bool(tx.signature) for tx in txns
+        ]
+        signed = sum(results)
+        pending = [
+            i for i, tx in enumerate(txns) if results[i] and tx.txid not in self.cache
+        ]
+        records = [
+            (tx.sender, tx.public_key, tx.signature, tx.payload())
+            for tx in (txns[i] for i in pending)
+        ]
+        for _, _, _, payload in records:
+            opcounts.count_hash(len(payload))
+            opcounts.count(opcounts.VERIFICATIONS)
+
+        chunks = [
+            records[i : i + self.chunk_size]
+            for i in range(0, len(records), self.chunk_size)
+        ]
+        if len(chunks) <= 1 or self.processes == 1:
+            outcomes = map(verify_signature_chunk, chunks)
+        else:
+            outcomes = self.executor().map(verify_signature_chunk, chunks)
+        for i, valid in zip(pending, (ok for chunk in outcomes for ok in chunk)):
+            results[i] = valid
+            if valid:
+                self.cache.add(txns[i].txid)
+
+        invalid = results.count(False)
+        with self.lock:
+            stats = self.stats[stage]
+            stats["seen"] += len(txns)
+            stats["cached"] += signed - len(pending)
+            stats["verified"] += len(pending)
+            stats["invalid"] += invalid
+            stats["seconds"] += time.perf_counter() - start
+        return results
+
+    def admit(self, txns, stage: str):
+        """The validly signed transactions, as given if that's all of them."""
+        results = self.verify(txns, stage)
+        if all(results):
+            return txns
+        return [tx for tx, valid in zip(txns, results) if valid]
+
+    def all_valid(self, txns, stage: str) -> bool:
+        return all(self.verify(txns, stage))
+
+    def executor(self) -> ProcessPoolExecutor:
+        # The pipeline's validator thread verifies alongside the proposal
+        # stage; a pool created twice would leak the one overwritten
+        pool = self.pool
+        if pool is None:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(max_workers=self.processes)
+                pool = self.pool
+        return pool
+
+    def shutdown_pool(self) -> None:
+        """Stop the worker processes; the next verify() starts a new pool."""
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def close(self) -> dict:
+        """Shut the pool down and summarize the work done at each stage."""
+        self.shutdown_pool()
+        summary = {"cache_size": len(self.cache)}
+        for stage, stats in self.stats.items():
+            for name, value in stats.items():
+                summary[f"{stage}_{name}"] = value
+        summary["seconds"] = sum(stats["seconds"] for stats in self.stats.values())
+        return summary
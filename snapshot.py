@@ -0,0 +1,225 @@
+"""Engine snapshots, and copy-on-write branches for what-if runs.
+
+A snapshot holds a whole engine (chain, participants and their stakes or hash
+rates, difficulty, round counters) and the global random state, pickled and
+compressed into one file:
+
+    save_snapshot("pow.snap", pow)
+    pow = load_snapshot("pow.snap")  # random continues where it was saved
+
+A chain kept in a DiskBlockStore isn't copied into the file. The snapshot
+refers to the store's directory and height, and the restored engine reads
+that prefix from disk with its own blocks on top (see OverlayBlockStore), so
+the file stays small and the saved prefix is never rewritten.
+
+fork_branches() explores what-ifs from a live engine instead. Each branch runs
+in a child made by os.fork, which shares the parent's memory copy-on-write,
+so N attack branches start from one honest prefix without rerunning it and
+without touching the parent's chain:
+
+    python snapshot.py --engine pow --entities 10 --blocks 20 --branches 8
+"""
+
+import argparse
+import asyncio
+import os
+import pickle
+import random
+import sys
+import time
+import traceback
+import zlib
+from collections import deque
+from typing import Callable, Optional
+
+from tabulate import tabulate
+
+from block_store import DiskBlockStore, OverlayBlockStore
+
+SNAPSHOT_MAGIC = b"SIMSNAP1"
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+COMPRESS_LEVEL = 6
+DEFAULT_BRANCHES = 8
+
+
+def save_snapshot(path: str, engine) -> int:
+    """Write `engine` and the random state to `path`; returns the file size."""
+    data = zlib.compress(
+        pickle.dumps((engine, random.getstate()), PICKLE_PROTOCOL), COMPRESS_LEVEL
+    )
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(data)
+    return len(SNAPSHOT_MAGIC) + len(data)
+
+
+def load_snapshot(path: str, restore_random: bool = True):
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        engine, random_state = pickle.loads(zlib.decompress(f.read()))
+    if restore_random:
+        random.setstate(random_state)
+    return engine
+
+
+def quiesce(engine) -> None:
+    """Stop the engine's worker threads, which a forked child wouldn't get."""
+    if getattr(engine, "verifier", None) is not None:
+        engine.verifier.shutdown_pool()
+    if hasattr(engine, "before_fork"):
+        engine.before_fork()
+
+
+def detach(engine) -> None:
+    """In a forked child: stop sharing anything the parent still writes to."""
+    # The disk store's index is a shared mapping, so appends would land in
+    # the parent's chain; the child keeps its blocks in memory instead
+    if isinstance(engine.chain, DiskBlockStore):
+        engine.chain = OverlayBlockStore(engine.chain)
+    if hasattr(engine, "after_fork"):
+        engine.after_fork()
+
+
+def run_branch(engine, branch: Callable, index: int, seed: int, write_fd: int):
+    status = 0
+    try:
+        random.seed(seed + index)
+        detach(engine)
+        outcome = (True, branch(engine, index))
+    except BaseException:
+        outcome = (False, traceback.format_exc())
+    try:
+        try:
+            data = pickle.dumps(outcome, PICKLE_PROTOCOL)
+        except Exception:
+            data = pickle.dumps((False, traceback.format_exc()), PICKLE_PROTOCOL)
+        with os.fdopen(write_fd, "wb") as pipe:
+            pipe.write(data)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        status = 1
+    finally:
+        # Skip the parent's atexit handlers and buffered state
+        os._exit(status)
+
+
+def fork_branches(
+    engine, branch: Callable, count: int, max_parallel: Optional[int] = None
+) -> list:
+    """Run branch(engine, i) for i in range(count), each in a forked child.
+
+    Every child starts from the engine as it is now and gets its own random
+    stream, derived from the parent's. Results come back in branch order; a
+    branch that raises fails the whole call once every child has exited.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("fork_branches needs os.fork")
+    max_parallel = max_parallel or os.cpu_count() or 1
+    seed = random.getrandbits(64)
+    # Python still warns on fork if a thread the engine doesn't own (a
+    # caller's pipeline, the metrics server) is running: a child could
+    # inherit a lock that thread holds
+    quiesce(engine)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    outcomes: list = [None] * count
+    running = deque()  # (branch index, pid, read end), oldest first
+    next_branch = 0
+    try:
+        while next_branch < count or running:
+            while next_branch < count and len(running) < max_parallel:
+                read_fd, write_fd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(read_fd)
+                    run_branch(engine, branch, next_branch, seed, write_fd)
+                os.close(write_fd)
+                running.append((next_branch, pid, read_fd))
+                next_branch += 1
+
+            # Read before waiting: a child blocks until its pipe is drained
+            index, pid, read_fd = running.popleft()
+            with os.fdopen(read_fd, "rb") as pipe:
+                data = pipe.read()
+            os.waitpid(pid, 0)
+            outcomes[index] = (
+                pickle.loads(data)
+                if data
+                else (False, "branch exited without a result")
+            )
+    finally:
+        if hasattr(engine, "after_fork"):
+            engine.after_fork()
+
+    for index, (ok, value) in enumerate(outcomes):
+        if not ok:
+            raise RuntimeError(f"branch {index} failed:\n{value}")
+    return [value for _, value in outcomes]
+
+
+def attack_branch(engine, index: int) -> dict:
+    height = len(engine.chain) - 1
+    start = time.perf_counter()
+    succeeded = engine.simulate_attacks()
+    seconds = time.perf_counter() - start
+    return {
+        "branch": index,
+        "succeeded": bool(succeeded),
+        "height_before": height,
+        "height_after": len(engine.chain) - 1,
+        "valid": engine.is_valid(),
+        "seconds": seconds,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Fork attack branches from one honest prefix"
+    )
+    parser.add_argument("--engine", choices=("pow", "pos", "algorand"), default="pow")
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--branches", type=int, default=DEFAULT_BRANCHES)
+    parser.add_argument(
+        "--processes", type=int, help="branches at once (default: one per core)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="FILE", help="snapshot the honest prefix")
+    parser.add_argument(
+        "--load", metavar="FILE", help="start from a snapshot instead of a new run"
+    )
+    args = parser.parse_args(argv)
+
+    if args.load:
+        start = time.perf_counter()
+        engine = load_snapshot(args.load)
+        print(f"Restored {args.load} in {time.perf_counter() - start:.3f}s")
+    else:
+        from app import ENGINES
+
+        random.seed(args.seed)
+        run_result = asyncio.run(
+            ENGINES[args.engine](args.entities, args.blocks, progress=False)
+        )
+        engine = run_result[-2]
+    if args.save:
+        start = time.perf_counter()
+        size = save_snapshot(args.save, engine)
+        print(f"Saved {args.save}: {size} bytes in {time.perf_counter() - start:.3f}s")
+
+    results = fork_branches(engine, attack_branch, args.branches, args.processes)
+    columns = tuple(results[0]) if results else ()
+    print(
+        tabulate(
+            [[result[column] for column in columns] for result in results],
+            headers=columns,
+            floatfmt=".3f",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import instrumentation
+import memory_profile
+import metrics
+from memory_profile import MemoryProfiler, attribute_memory
+from result_cache import ResultCache
+
+
+class SweepJob(NamedTuple):
+    engine: str
+    num_entities: int
+    num_blocks: int
+    seed: int
+
+
+def job_seed(
+    base_seed: int,
+    engine: str,
+    num_entities: int,
+    num_blocks: int,
+    repetition: int = 0,
+) -> int:
+    """Derive a stable per-job seed so results don't depend on scheduling order."""
+    key = f"{base_seed}:{engine}:{num_entities}:{num_blocks}"
+    if repetition:
+        key += f":{repetition}"
+    digest = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def make_jobs(
+    configurations: Iterable[Tuple[int, int]],
+    engines: Iterable[str],
+    base_seed: int = 0,
+) -> List[SweepJob]:
+    # A repeated configuration would be the same job with the same seed: run
+    # twice for nothing and stored twice under one run id
+    configurations = sorted(set(configurations))
+    return [
+        SweepJob(
+            engine,
+            num_entities,
+            num_blocks,
+            job_seed(base_seed, engine, num_entities, num_blocks),
+        )
+        for num_entities, num_blocks in configurations
+        for engine in engines
+    ]
+
+
+def run_job(job: SweepJob) -> dict:
+    # Imported here so app can import this module at top level
+    from app import ENGINES, summarize_run
+
+    random.seed(job.seed)
+    instrumentation.reset()
+    profiler = MemoryProfiler() if memory_profile.ENABLED else nullcontext()
+    with profiler:
+        run_result = asyncio.run(
+            ENGINES[job.engine](job.num_entities, job.num_blocks, progress=False)
+        )
+
+    # Only the compact summary crosses back to the parent, never chains or keys
+    result = summarize_run(run_result, job.num_entities, job.num_blocks)
+    if instrumentation.ENABLED:
+        result["phases"] = instrumentation.summary()
+    if memory_profile.ENABLED:
+        engine, participants = run_result[-2:]
+        result["memory"] = {
+            **profiler.summary,
+            **attribute_memory(engine, participants),
+        }
+    return result
+
+
+def iter_sweep(
+    jobs: List[SweepJob],
+    max_workers: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+) -> Iterator[Tuple[SweepJob, dict]]:
+    """Run every job on a process pool, yielding (job, result) as each finishes.
+
+    With a cache, jobs that already have a result are yielded without being
+    run, and every newly computed result is stored before it is yielded.
+    """
+    max_workers = max_workers or os.cpu_count()
+
+    missing = []
+    for job in jobs:
+        result = cache.get(job) if cache else None
+        if result is None:
+            missing.append(job)
+        else:
+            metrics.SWEEP_JOBS.inc("cache")
+            yield job, result
+
+    if not missing:
+        return
+    remaining = iter(missing)
+
+    # With live metrics on, every worker serves its own endpoint
+    initializer = metrics.start_worker_server if metrics.ENABLED else None
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=initializer
+    ) as executor:
+        # Keep at most two jobs per worker in flight so finished results are
+        # dropped as soon as the caller has consumed them
+        pending = {
+            executor.submit(run_job, job): job
+            for job in itertools.islice(remaining, 2 * max_workers)
+        }
+        while pending:
+            metrics.SWEEP_IN_FLIGHT.set(value=len(pending))
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                for next_job in itertools.islice(remaining, 1):
+                    pending[executor.submit(run_job, next_job)] = next_job
+                result = future.result()
+                if cache:
+                    cache.put(job, result)
+                metrics.SWEEP_JOBS.inc("run")
+                yield job, result
+        metrics.SWEEP_IN_FLIGHT.set(value=0)
+
+
+def run_sweep(
+    jobs: List[SweepJob],
+    max_workers: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+) -> List[dict]:
+    """Run every job and return results in job order."""
+    results = dict(iter_sweep(jobs, max_workers, cache))
+    return [results[job] for job in jobs]
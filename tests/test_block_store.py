@@ -0,0 +1,130 @@
+import pickle
+import random
+
+import pytest
+
+from block import GENESIS_HASH
+from block_store import DiskBlockStore, MemoryBlockStore, OverlayBlockStore
+from PoS import Block
+from transaction import Transaction
+
+
+def make_chain(length, previous_hash=GENESIS_HASH, rng=None):
+    rng = rng or random.Random(0)
+    blocks = []
+    for _ in range(length):
+        txns = [
+            Transaction(f"s{rng.randrange(10)}", f"r{rng.randrange(10)}", 1.0, 0.01)
+            for _ in range(rng.randint(0, 5))
+        ]
+        block = Block(f"v{rng.randrange(10)}", txns, previous_hash)
+        blocks.append(block)
+        previous_hash = block.hash
+    return blocks
+
+
+def assert_same_chain(store, expected):
+    assert len(store) == len(expected)
+    assert [block.hash for block in store] == [block.hash for block in expected]
+    assert list(store.iter_hashes()) == list(expected.iter_hashes())
+    for height in (0, len(expected) // 2, -1):
+        assert store[height].hash == expected[height].hash
+        assert store.hash_at(height) == expected.hash_at(height)
+        assert store.previous_hash_at(height) == expected.previous_hash_at(height)
+    for block in expected:
+        assert store.height_of(block.hash) == expected.height_of(block.hash)
+    assert store.last().hash == expected.last().hash
+    for count in (0, 1, 3):
+        assert [block.hash for block in store.recent(count)] == [
+            block.hash for block in expected.recent(count)
+        ]
+    assert store.total_txns() == expected.total_txns()
+    assert store.total_txns(3) == expected.total_txns(3)
+    assert store.links_valid() and expected.links_valid()
+
+
+@pytest.fixture
+def disk_store(tmp_path):
+    # A small hot cache, so most reads come back from the segment file
+    store = DiskBlockStore(str(tmp_path / "chain"), hot_blocks=2)
+    yield store
+    store.close()
+
+
+def test_append_matches_memory_store(disk_store):
+    memory = MemoryBlockStore()
+    for block in make_chain(50):
+        disk_store.append(block)
+        memory.append(block)
+    assert_same_chain(disk_store, memory)
+    assert disk_store.height_of(bytes(32)) is None
+
+
+def test_grows_past_initial_capacity(tmp_path):
+    memory = MemoryBlockStore(make_chain(1500))
+    with DiskBlockStore(str(tmp_path / "chain"), hot_blocks=2) as store:
+        for block in memory:
+            store.append(block)
+        assert_same_chain(store, memory)
+
+
+def test_reorg_matches_memory_store(disk_store):
+    memory = MemoryBlockStore()
+    for block in make_chain(30):
+        disk_store.append(block)
+        memory.append(block)
+    dropped = memory.hash_at(25)
+    fork = make_chain(12, memory.hash_at(19), random.Random(1))
+
+    disk_store.replace_from(20, fork)
+    memory.replace_from(20, fork)
+    assert_same_chain(disk_store, memory)
+    # Blocks dropped by the reorg are no longer found by hash
+    assert disk_store.height_of(dropped) is None
+
+
+def test_reopen_keeps_chain(tmp_path):
+    directory = str(tmp_path / "chain")
+    memory = MemoryBlockStore(make_chain(40))
+    with DiskBlockStore(directory) as store:
+        for block in memory:
+            store.append(block)
+
+    with DiskBlockStore(directory) as store:
+        assert_same_chain(store, memory)
+        extra = make_chain(5, memory.hash_at(-1), random.Random(2))
+        for block in extra:
+            store.append(block)
+        memory.extend(extra)
+        assert_same_chain(store, memory)
+
+
+def test_pickle_reopens_under_overlay(disk_store):
+    memory = MemoryBlockStore(make_chain(20))
+    for block in memory:
+        disk_store.append(block)
+
+    restored = pickle.loads(pickle.dumps(disk_store))
+    try:
+        assert isinstance(restored, OverlayBlockStore)
+        assert_same_chain(restored, memory)
+
+        # The copy's blocks stay in memory; the directory isn't touched
+        extra = make_chain(3, memory.hash_at(-1), random.Random(3))
+        for block in extra:
+            restored.append(block)
+        assert len(disk_store) == 20
+        memory.extend(extra)
+        assert_same_chain(restored, memory)
+    finally:
+        restored.close()
+
+
+def test_pickle_refuses_rewritten_directory(disk_store):
+    for block in make_chain(10):
+        disk_store.append(block)
+    data = pickle.dumps(disk_store)
+    disk_store.replace_from(5, make_chain(5, disk_store.hash_at(4), random.Random(4)))
+
+    with pytest.raises(ValueError):
+        pickle.loads(data)
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from execution import (
+    ParallelExecutor,
+    account_addresses,
+    contended_transactions,
+    critical_path,
+    execute_serial,
+)
+from transaction import Transaction
+
+
+@pytest.fixture(scope="module")
+def executor():
+    executor = ParallelExecutor(workers=4)
+    yield executor
+    executor.close()
+
+
+@pytest.mark.parametrize("skew", [0.0, 1.0, 2.0])
+@pytest.mark.parametrize("seed", range(5))
+def test_parallel_matches_serial(executor, skew, seed):
+    rng = random.Random(seed)
+    addresses = account_addresses(rng.choice((2, 10, 100)))
+    # Low balances, so some transfers fail and later ones depend on it
+    balances = {address: rng.uniform(0, 2000) for address in addresses}
+    txns = contended_transactions(addresses, 200, skew, rng)
+
+    expected = execute_serial(balances, txns)
+    assert executor.execute(balances, txns) == expected
+    assert not all(expected[1])
+
+
+def test_serial_leaves_balances_alone():
+    balances = {"a": 10.0}
+    state, applied = execute_serial(
+        balances, [Transaction("a", "b", 5.0, 1.0), Transaction("a", "b", 5.0, 1.0)]
+    )
+    assert balances == {"a": 10.0}
+    assert state == {"a": 4.0, "b": 5.0}
+    assert applied == [True, False]
+
+
+def test_self_transfer_only_pays_fee(executor):
+    txns = [Transaction("a", "a", 5.0, 1.0)]
+    assert executor.execute({"a": 10.0}, txns) == ({"a": 9.0}, [True])
+
+
+def test_empty_block(executor):
+    assert executor.execute({"a": 1.0}, []) == ({"a": 1.0}, [])
+
+
+def test_critical_path():
+    txns = [
+        Transaction("a", "b", 1.0, 0.0),
+        Transaction("c", "d", 1.0, 0.0),
+        Transaction("b", "c", 1.0, 0.0),
+        Transaction("e", "f", 1.0, 0.0),
+    ]
+    assert critical_path(txns) == 2
+    assert critical_path([]) == 0
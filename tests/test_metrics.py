@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+import socket
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import metrics
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def scrape(port: int) -> str:
+    url = f"http://127.0.0.1:{port}/metrics"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read().decode()
+
+
+def worker_port(port: int):
+    return os.getpid(), metrics.start_server(port, metrics.MAX_WORKER_PORTS)
+
+
+@pytest.fixture
+def parent_port():
+    port = metrics.start_server(free_port())
+    assert port is not None
+    yield port
+    metrics._server.shutdown()
+    metrics._server.server_close()
+    metrics._server = None
+
+
+def test_forked_worker_serves_its_own_port(parent_port):
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        pid, port = executor.submit(worker_port, parent_port + 1).result()
+        assert pid != os.getpid()
+        assert port is not None and port != parent_port
+        # The worker is still alive, so its endpoint is up
+        assert "consensus_blocks_total" in scrape(port)
+    assert metrics.start_server() == parent_port
+    assert "consensus_blocks_total" in scrape(parent_port)
@@ -0,0 +1,98 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from pipeline import Pipeline
+from transaction import generate_transactions
+
+TIMEOUT = 10  # seconds; a hung pipeline fails the test instead of the suite
+
+
+class BrokenVerifier:
+    def all_valid(self, txns, stage):
+        raise ValueError("verifier pool died")
+
+
+class Engine:
+    def __init__(self, verifier=None):
+        self.chain = [SimpleNamespace(hash=b"0", previous_hash=b"", txns=())]
+        self.verifier = verifier
+
+    def get_last_block(self):
+        return self.chain[-1]
+
+    def add_block(self):
+        block = SimpleNamespace(
+            hash=str(len(self.chain)).encode(),
+            previous_hash=self.chain[-1].hash,
+            txns=(),
+        )
+        self.chain.append(block)
+        return block
+
+
+def finishes(target) -> BaseException:
+    """Run `target` on a thread; the exception it raised, failing on a hang."""
+    outcome = []
+
+    def run():
+        try:
+            target()
+        except BaseException as error:
+            outcome.append(error)
+        else:
+            outcome.append(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "pipeline hung"
+    return outcome[0]
+
+
+def test_validates_submitted_blocks():
+    engine = Engine()
+    pipeline = Pipeline("pos", engine, depth=2)
+    for _ in range(5):
+        pipeline.next_transactions()
+        pipeline.submit(engine.add_block())
+    summary = pipeline.close()
+    assert summary["validated"] == 5 and summary["invalid"] == 0
+
+
+def test_validator_failure_is_raised_not_hung():
+    engine = Engine(BrokenVerifier())
+    pipeline = Pipeline("pos", engine, depth=1)
+
+    def run():
+        # More blocks than the queue holds: a dead validator would block here
+        for _ in range(5):
+            pipeline.submit(engine.add_block())
+        pipeline.close()
+
+    error = finishes(run)
+    assert isinstance(error, ValueError)
+    # close() still drains and stops both stages, then raises again
+    assert isinstance(finishes(pipeline.close), ValueError)
+    assert not any(thread.is_alive() for thread in pipeline.threads)
+
+
+def test_producer_failure_is_raised_not_hung():
+    calls = []
+
+    def source(rng):
+        calls.append(None)
+        if len(calls) > 2:
+            raise ValueError("no more transactions")
+        return generate_transactions(rng)
+
+    pipeline = Pipeline("pos", Engine(), depth=1, source=source)
+
+    def run():
+        for _ in range(5):
+            pipeline.next_transactions()
+
+    assert isinstance(finishes(run), ValueError)
+    with pytest.raises(ValueError):
+        pipeline.close()
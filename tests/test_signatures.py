@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+
+import pytest
+
+import signatures
+from signatures import SignatureVerifier, VerifiedCache, Wallets
+from transaction import SignedTransaction, Transaction
+
+
+@pytest.fixture(scope="module")
+def wallets():
+    return Wallets(20, master_seed=b"test")
+
+
+@pytest.fixture
+def verifier():
+    verifier = SignatureVerifier(processes=1, chunk_size=4)
+    yield verifier
+    verifier.close()
+
+
+def tampered(tx, **fields):
+    """`tx` with some fields changed and its signature kept."""
+    values = dict(
+        sender=tx.sender,
+        receiver=tx.receiver,
+        amount=tx.amount,
+        fee=tx.fee,
+        public_key=tx.public_key,
+        signature=tx.signature,
+    )
+    values.update(fields)
+    return SignedTransaction(**values)
+
+
+def test_accepts_signed_transactions(wallets, verifier):
+    txns = [wallets.transaction(random.Random(i)) for i in range(10)]
+    assert verifier.verify(txns, "mempool") == [True] * 10
+    assert verifier.all_valid(txns, "validation")
+
+
+def test_rejects_bad_signatures(wallets, verifier):
+    rng = random.Random(0)
+    good = wallets.transaction(rng)
+    other = wallets.transaction(rng)
+    while other.sender == good.sender:
+        other = wallets.transaction(rng)
+    txns = [
+        good,
+        tampered(good, amount=good.amount * 2),
+        tampered(good, receiver=other.receiver + "0"),
+        # A valid signature, but by a key the sender address doesn't match
+        tampered(other, sender=good.sender),
+        tampered(good, signature=other.signature),
+        tampered(good, signature=b""),
+        Transaction(good.sender, good.receiver, good.amount, good.fee),
+    ]
+    assert verifier.verify(txns, "mempool") == [True] + [False] * 6
+    assert verifier.admit(txns, "proposal") == [good]
+    assert not verifier.all_valid(txns, "validation")
+
+    stats = verifier.close()
+    assert stats["mempool_invalid"] == 6
+    # Unsigned transactions are rejected without a verification
+    assert stats["mempool_verified"] == 5
+    assert stats["proposal_cached"] == 1
+
+
+def test_tampering_changes_txid(wallets):
+    tx = wallets.transaction(random.Random(0))
+    assert tampered(tx, amount=tx.amount + 1).txid != tx.txid
+    assert tampered(tx).txid == tx.txid
+    with pytest.raises(AttributeError):
+        tx.amount = 1.0
+
+
+def test_cache_skips_verified_transactions(wallets, verifier):
+    txns = [wallets.transaction(random.Random(i)) for i in range(8)]
+    forged = tampered(txns[0], fee=txns[0].fee + 1)
+    verifier.verify(txns + [forged], "mempool")
+    verifier.verify(txns + [forged], "proposal")
+
+    stats = verifier.close()
+    assert stats["mempool_verified"] == 9
+    assert stats["mempool_cached"] == 0
+    # Only the forgery is checked again; it never enters the cache
+    assert stats["proposal_verified"] == 1
+    assert stats["proposal_cached"] == 8
+    assert stats["proposal_invalid"] == 1
+    assert stats["cache_size"] == 8
+
+
+def test_admit_returns_input_when_all_valid(wallets, verifier):
+    txns = [wallets.transaction(random.Random(i)) for i in range(3)]
+    assert verifier.admit(txns, "mempool") is txns
+
+
+def test_process_pool_matches_inline(wallets):
+    txns = [wallets.transaction(random.Random(i)) for i in range(12)]
+    txns[5] = tampered(txns[5], amount=txns[5].amount + 1)
+    verifier = SignatureVerifier(processes=2, chunk_size=3)
+    try:
+        results = verifier.verify(txns, "validation")
+    finally:
+        verifier.close()
+    assert results == [i != 5 for i in range(12)]
+
+
+def test_verified_cache_evicts_least_recent():
+    cache = VerifiedCache(capacity=2)
+    cache.add(b"a")
+    cache.add(b"b")
+    assert b"a" in cache  # now the most recent
+    cache.add(b"c")
+    assert b"b" not in cache
+    assert b"a" in cache and b"c" in cache
+    assert len(cache) == 2
+
+
+def test_executor_is_created_once_across_threads(monkeypatch):
+    created = []
+
+    class SlowPool:
+        def __init__(self, max_workers=None):
+            time.sleep(0.05)  # widen the window between check and assignment
+            created.append(self)
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(signatures, "ProcessPoolExecutor", SlowPool)
+    verifier = SignatureVerifier(processes=2)
+    start = threading.Barrier(4)
+    pools = []
+
+    def get_pool():
+        start.wait()
+        pools.append(verifier.executor())
+
+    threads = [threading.Thread(target=get_pool) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    verifier.close()
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
@@ -0,0 +1,43 @@
+import random
+
+import opcounts
+from Algorand import Account, Algorand
+from keystore import KeyStore
+from transaction import generate_transactions
+
+
+def signatures_per_block(seed_lookback: int, blocks: int = 6) -> list:
+    random.seed(3)
+    key_store = KeyStore(b"sortition", cache_size=64)
+    accounts = [
+        Account(stake=random.randint(1000, 1_000_000), key_store=key_store)
+        for _ in range(30)
+    ]
+    algorand = Algorand(accounts, 1_000_000, 0.02, seed_lookback=seed_lookback)
+    counts = []
+    try:
+        for _ in range(blocks):
+            before = opcounts.snapshot()
+            algorand.mine_block(generate_transactions())
+            counts.append(opcounts.since(before)[opcounts.SIGNATURES])
+    finally:
+        algorand.shutdown()
+    return counts
+
+
+def test_precomputed_sortition_is_charged_to_its_own_round():
+    # Sortition is deterministic in its seed and stakes, so running it ahead
+    # on the worker must cost each block exactly what running it inline does
+    assert signatures_per_block(4) == signatures_per_block(1)
+
+
+def test_deferred_counts_stay_out_of_the_totals():
+    before = opcounts.snapshot()
+    with opcounts.deferred() as counts:
+        opcounts.count_hash(10)
+        opcounts.count(opcounts.SIGNATURES, 2)
+    assert opcounts.since(before) == dict.fromkeys(opcounts.OPERATIONS, 0)
+    opcounts.add(counts)
+    delta = opcounts.since(before)
+    assert delta[opcounts.SHA256] == 1 and delta[opcounts.BYTES_HASHED] == 10
+    assert delta[opcounts.SIGNATURES] == 2
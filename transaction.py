@@ -1,6 +1,8 @@
 import hashlib
 import random
 
+import opcounts
+
 
 class Transaction:
     def __init__(self, sender: str, receiver: str, amount: float, fee: float):
@@ -16,13 +18,69 @@ class Transaction:
         return f"{self.sender} -> {self.receiver}: {self.amount}"
 
 
-def generate_transactions():
-    return [
-        Transaction(
-            sender=hashlib.sha256(f"{random.getrandbits(256)}".encode()).hexdigest(),
-            receiver=hashlib.sha256(f"{random.getrandbits(256)}".encode()).hexdigest(),
-            amount=random.uniform(1, 1000),
-            fee=random.uniform(0.01, 0.1),
+class SignedTransaction(Transaction):
+    """A transaction authorized by the key whose hash is the sender address.
+
+    Immutable once built, so its memoized txid always matches its fields.
+    """
+
+    def __init__(
+        self,
+        sender: str,
+        receiver: str,
+        amount: float,
+        fee: float,
+        public_key: bytes,
+        signature: bytes = b"",
+    ):
+        super().__init__(sender, receiver, amount, fee)
+        self.public_key = public_key
+        self.signature = signature
+        self._txid = None  # set last: from here on the fields are frozen
+
+    def __setattr__(self, name, value):
+        if "_txid" in self.__dict__:
+            raise AttributeError(f"{type(self).__name__} is immutable")
+        super().__setattr__(name, value)
+
+    def signed(self, signature: bytes) -> "SignedTransaction":
+        return SignedTransaction(
+            self.sender,
+            self.receiver,
+            self.amount,
+            self.fee,
+            self.public_key,
+            signature,
         )
-        for _ in range(random.randint(1, 1000))
-    ]
+
+    def payload(self) -> bytes:
+        """What the sender signs: every field but the signature."""
+        return f"{self.sender}->{self.receiver}:{self.amount}:{self.fee}".encode()
+
+    def to_bytes(self):
+        # Covered by the block hash, so a block commits to its signatures
+        return self.payload() + self.public_key + self.signature
+
+    @property
+    def txid(self) -> bytes:
+        if self._txid is None:
+            data = self.payload() + self.public_key + self.signature
+            opcounts.count_hash(len(data))
+            object.__setattr__(self, "_txid", hashlib.sha256(data).digest())
+        return self._txid
+
+
+MAX_BLOCK_TXNS = 1000
+
+
+def random_transaction(rng=random):
+    return Transaction(
+        sender=hashlib.sha256(f"{rng.getrandbits(256)}".encode()).hexdigest(),
+        receiver=hashlib.sha256(f"{rng.getrandbits(256)}".encode()).hexdigest(),
+        amount=rng.uniform(1, 1000),
+        fee=rng.uniform(0.01, 0.1),
+    )
+
+
+def generate_transactions(rng=random):
+    return [random_transaction(rng) for _ in range(rng.randint(1, MAX_BLOCK_TXNS))]